@@ -23,13 +23,9 @@ def check_requirements():
         import pybind11
         print(f"pybind11版本: {pybind11.__version__}")
     except ImportError:
-        print("未安装pybind11，正在安装...")
-        try:
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "pybind11"])
-            print("pybind11安装成功")
-        except subprocess.CalledProcessError:
-            print("pybind11安装失败")
-            return False
+        # 构建依赖见pyproject.toml的[build-system]
+        print("未安装pybind11，请运行: pip install \"pybind11>=2.10\"")
+        return False
 
     # 检查numpy
     try:
@@ -64,16 +60,18 @@ def build_extension():
         cmd = [sys.executable, "setup.py", "build_ext", "--inplace"]
         print(f"执行命令: {' '.join(cmd)}")
 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        # 逐行转发编译输出，编译过程中即可看到进度和错误
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                text=True, bufsize=1)
+        for line in proc.stdout:
+            print(line, end='')
+        returncode = proc.wait()
 
-        if result.returncode == 0:
+        if returncode == 0:
             print("C++扩展编译成功")
-            print(result.stdout)
             return True
         else:
-            print("C++扩展编译失败")
-            print("STDOUT:", result.stdout)
-            print("STDERR:", result.stderr)
+            print(f"C++扩展编译失败 (返回码 {returncode})")
             return False
 
     except Exception as e:
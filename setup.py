@@ -6,22 +6,34 @@ from setuptools.command.build_ext import build_ext
 import sys
 import sysconfig
 import os
+import platform
+import hashlib
+import json
 
-# 检查是否安装了pybind11
-try:
-    import pybind11
-    from pybind11 import get_cmake_dir
-    from pybind11.setup_helpers import Pybind11Extension, build_ext
-except ImportError:
-    print("错误：需要安装pybind11")
-    print("请运行: pip install pybind11")
-    sys.exit(1)
+# pybind11由pyproject.toml的[build-system]声明，构建前端会自动提供
+import pybind11
+from pybind11.setup_helpers import Pybind11Extension, build_ext
+from pybind11.setup_helpers import ParallelCompile, naive_recompile
+
+# 多个源文件并行编译，只重新编译源文件比目标文件新的部分
+# 线程数可用环境变量 NPY_NUM_BUILD_JOBS 指定；如需ccache，设置 CC="ccache gcc" 即可
+ParallelCompile("NPY_NUM_BUILD_JOBS", needs_recompile=naive_recompile,
+                default=os.cpu_count() or 1).install()
+
+# SIMD指令集选项：默认针对本机CPU优化；
+# 设置 PYENHANCE_PORTABLE=1 时（分发wheel）改用通用的AVX2/FMA
+is_x86 = platform.machine().lower() in ('x86_64', 'amd64', 'i386', 'i686')
+if os.environ.get('PYENHANCE_PORTABLE') == '1':
+    gcc_arch_args = ['-mavx2', '-mfma'] if is_x86 else []
+else:
+    gcc_arch_args = ['-march=native']
+msvc_arch_args = ['/arch:AVX2'] if is_x86 else []
 
 # 编译选项
 compile_args = {
-    'msvc': ['/O2', '/openmp', '/std:c++14'],         # Visual Studio
-    'mingw32': ['-O3', '-fopenmp', '-std=c++14'],    # MinGW
-    'unix': ['-O3', '-fopenmp', '-std=c++14'],       # Linux/macOS
+    'msvc': ['/O2', '/openmp', '/std:c++14', '/fp:fast'] + msvc_arch_args,                  # Visual Studio
+    'mingw32': ['-O3', '-fopenmp', '-std=c++14', '-ffast-math', '-funroll-loops'] + gcc_arch_args,  # MinGW
+    'unix': ['-O3', '-fopenmp', '-std=c++14', '-ffast-math', '-funroll-loops'] + gcc_arch_args,     # Linux/macOS
 }
 
 link_args = {
@@ -60,10 +72,68 @@ ext_modules = [
     ),
 ]
 
+# 编译器/OpenMP探测结果缓存（类似 ./configure --config-cache）
+# 探测逻辑或扩展有变化时递增此版本号使缓存失效
+PROBE_CACHE_VERSION = 1
+PROBE_CACHE_FILE = 'openmp_probe.json'
+
+
 # 自定义构建命令
 class CustomBuildExt(build_ext):
     def build_extensions(self):
-        # 检查C++编译器是否可用
+        cache_path = os.path.join(self.build_temp, PROBE_CACHE_FILE)
+        cache_key = self._probe_cache_key()
+        
+        openmp_ok = self._load_probe_cache(cache_path, cache_key)
+        if openmp_ok is None:
+            self._check_compiler()
+            openmp_ok = self._check_openmp()
+            self._save_probe_cache(cache_path, cache_key, openmp_ok)
+        else:
+            print(f"使用缓存的编译器检查结果 (OpenMP: {'可用' if openmp_ok else '不可用'})")
+        
+        if not openmp_ok:
+            print("将使用单线程版本")
+            self._disable_openmp()
+        
+        super().build_extensions()
+    
+    def _probe_cache_key(self):
+        """
+        解释器、编译器命令、平台和编译选项决定探测结果
+        
+        编译器类型统一取模块级compiler_type（编译选项也按它选择）；
+        编译器命令取实际使用的可执行文件，修改CC/CXX后缓存自动失效
+        """
+        compiler_cmds = tuple(
+            tuple(cmd) if isinstance(cmd, (list, tuple)) else cmd
+            for cmd in (getattr(self.compiler, name, None)
+                        for name in ('compiler_so', 'compiler_cxx', 'cc'))
+        )
+        key = (PROBE_CACHE_VERSION, sys.executable, compiler_type, compiler_cmds, sys.platform,
+               tuple(compile_args.get(compiler_type, [])))
+        return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _load_probe_cache(cache_path, cache_key):
+        """返回缓存的OpenMP探测结果，没有有效缓存时返回None"""
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cache.get('key') != cache_key:
+            return None
+        return bool(cache.get('openmp'))
+    
+    @staticmethod
+    def _save_probe_cache(cache_path, cache_key, openmp_ok):
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({'key': cache_key, 'openmp': openmp_ok}, f)
+    
+    def _check_compiler(self):
+        """检查C++编译器是否可用"""
         try:
             self.compiler.compile(['cpp/test_compile.cpp'], output_dir=self.build_temp)
             print("C++编译器检查通过")
@@ -76,8 +146,9 @@ class CustomBuildExt(build_ext):
             else:
                 print("  - GCC 或 Clang")
             raise
-        
-        # 检查OpenMP支持
+    
+    def _check_openmp(self):
+        """检查OpenMP支持"""
         try:
             test_openmp = """
             #include <omp.h>
@@ -90,19 +161,20 @@ class CustomBuildExt(build_ext):
                                 output_dir=self.build_temp,
                                 extra_preargs=compile_args.get(compiler_type, []))
             print("OpenMP支持检查通过")
+            return True
         except Exception as e:
             print(f"OpenMP支持检查失败: {e}")
-            print("将使用单线程版本")
-            # 移除OpenMP相关编译选项
-            for ext in self.extensions:
-                if '/openmp' in ext.extra_compile_args:
-                    ext.extra_compile_args.remove('/openmp')
-                if '-fopenmp' in ext.extra_compile_args:
-                    ext.extra_compile_args.remove('-fopenmp')
-                if '-fopenmp' in ext.extra_link_args:
-                    ext.extra_link_args.remove('-fopenmp')
-        
-        super().build_extensions()
+            return False
+    
+    def _disable_openmp(self):
+        """移除OpenMP相关编译选项"""
+        for ext in self.extensions:
+            if '/openmp' in ext.extra_compile_args:
+                ext.extra_compile_args.remove('/openmp')
+            if '-fopenmp' in ext.extra_compile_args:
+                ext.extra_compile_args.remove('-fopenmp')
+            if '-fopenmp' in ext.extra_link_args:
+                ext.extra_link_args.remove('-fopenmp')
 
 setup(
     ext_modules=ext_modules,
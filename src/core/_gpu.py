@@ -0,0 +1,203 @@
+"""
+CUDA加速路径
+OpenCV带CUDA模块编译且检测到GPU时可用；否则HAS_CUDA为False，调用方走CPU实现。
+另外检测可选的CuPy：有设备时HAS_CUPY为True，论文算法的迭代重建在显存中运行
+"""
+from functools import lru_cache
+from typing import Optional, Callable
+
+import numpy as np
+import cv2
+
+# 检测CUDA设备（pip版OpenCV通常不含CUDA模块或设备数为0）
+try:
+    HAS_CUDA = cv2.cuda.getCudaEnabledDeviceCount() > 0
+except (AttributeError, cv2.error):
+    HAS_CUDA = False
+
+# 检测CuPy（可选依赖，不在项目依赖中声明）
+try:
+    import cupy as cp
+    HAS_CUPY = cp.cuda.runtime.getDeviceCount() > 0
+except Exception:
+    cp = None
+    HAS_CUPY = False
+
+# 超过该像素数才值得上传到GPU
+GPU_MIN_PIXELS = 512 * 512
+
+# CUDA线性滤波器支持的最大核尺寸
+_MAX_CUDA_KSIZE = 31
+
+
+@lru_cache(maxsize=32)
+def _gaussian_filter(sigma: float):
+    """按sigma缓存CUDA高斯滤波器（核尺寸规则与CPU版GaussianBlur一致）"""
+    ksize = int(round(sigma * 8 + 1)) | 1
+    return cv2.cuda.createGaussianFilter(cv2.CV_32FC1, cv2.CV_32FC1, (ksize, ksize), sigma)
+
+
+@lru_cache(maxsize=8)
+def _box_filter(ksize: int):
+    """按窗口大小缓存CUDA盒式滤波器"""
+    return cv2.cuda.createBoxFilter(cv2.CV_32FC1, cv2.CV_32FC1, (ksize, ksize))
+
+
+def _gaussian_blur(gpu_img, sigma: float):
+    """
+    GPU高斯模糊
+
+    大sigma超出CUDA核尺寸上限时，先缩小图像、用等效sigma模糊后再放大，
+    只用于光照估计这类平滑分量
+    """
+    if int(round(sigma * 8 + 1)) | 1 <= _MAX_CUDA_KSIZE:
+        return _gaussian_filter(float(sigma)).apply(gpu_img)
+
+    factor = 2
+    while int(round(sigma / factor * 8 + 1)) | 1 > _MAX_CUDA_KSIZE:
+        factor *= 2
+    width, height = gpu_img.size()
+    small = cv2.cuda.resize(gpu_img, (max(width // factor, 1), max(height // factor, 1)),
+                            interpolation=cv2.INTER_AREA)
+    small = _gaussian_filter(float(sigma / factor)).apply(small)
+    return cv2.cuda.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def _scale(gpu_img, alpha: float, beta: float = 0.0):
+    """alpha * img + beta"""
+    return cv2.cuda.addWeighted(gpu_img, alpha, gpu_img, 0.0, beta)
+
+
+def _clip_unit(gpu_img):
+    """裁剪到0-1范围"""
+    _, gpu_img = cv2.cuda.threshold(gpu_img, 1.0, 1.0, cv2.THRESH_TRUNC)
+    _, gpu_img = cv2.cuda.threshold(gpu_img, 0.0, 0.0, cv2.THRESH_TOZERO)
+    return gpu_img
+
+
+def _scale_to_unit(gpu_img):
+    """除以最大值并裁剪到0-1范围（最大值不为正时置零）"""
+    _, max_val = cv2.cuda.minMax(gpu_img)
+    if max_val <= 0:
+        return _scale(gpu_img, 0.0)
+    return _clip_unit(_scale(gpu_img, 1.0 / max_val))
+
+
+def _local_variance(gpu_img, ksize: int):
+    """盒式窗口局部方差 E[x²] - E[x]²"""
+    box = _box_filter(ksize)
+    mean = box.apply(gpu_img)
+    mean_sq = box.apply(cv2.cuda.sqr(gpu_img))
+    return cv2.cuda.subtract(mean_sq, cv2.cuda.sqr(mean))
+
+
+def _guided_filter(gpu_img, radius: int, eps: float):
+    """自引导滤波（与DicomEnhancer._guided_filter相同公式）"""
+    box = _box_filter(2 * radius + 1)
+    mean_i = box.apply(gpu_img)
+    var_i = cv2.cuda.subtract(box.apply(cv2.cuda.sqr(gpu_img)), cv2.cuda.sqr(mean_i))
+    a = cv2.cuda.divide(var_i, _scale(var_i, 1.0, eps))
+    b = cv2.cuda.subtract(mean_i, cv2.cuda.multiply(a, mean_i))
+    return cv2.cuda.add(cv2.cuda.multiply(box.apply(a), gpu_img), box.apply(b))
+
+
+def super_enhance_gpu(img_norm: np.ndarray, progress_callback: Optional[Callable] = None) -> np.ndarray:
+    """
+    超级增强的CUDA实现，步骤与DicomEnhancer.super_enhance一致
+
+    数据只上传一次，所有中间结果保留在显存中，最后下载一次
+
+    Args:
+        img_norm: 已归一化到0-1的float32图像
+        progress_callback: 进度回调函数
+
+    Returns:
+        增强后的16位图像
+    """
+    gpu_img = cv2.cuda_GpuMat()
+    gpu_img.upload(img_norm)
+
+    # 1. 噪声检测
+    var_map = _scale_to_unit(_local_variance(gpu_img, 3))
+
+    if progress_callback:
+        progress_callback(25)
+
+    # 2. 多尺度高频增强（增量高斯级联）
+    blur = gpu_img
+    detail = _scale(gpu_img, 0.0)
+    prev_sigma = 0.0
+    total_strength = 0.0
+    scales = [0.5, 1.0, 2.0, 4.0]
+    for i, sigma in enumerate(scales):
+        blur = _gaussian_blur(blur, np.sqrt(sigma ** 2 - prev_sigma ** 2))
+        prev_sigma = sigma
+        strength = 0.8 - 0.1 * i
+        detail = cv2.cuda.addWeighted(detail, 1.0, blur, -strength, 0.0)
+        total_strength += strength
+
+        if progress_callback:
+            progress_callback(25 + 15 * (i + 1) / len(scales))
+
+    detail = cv2.cuda.addWeighted(detail, 1.0, gpu_img, total_strength, 0.0)
+    detail = cv2.cuda.multiply(detail, _scale(var_map, 0.7, 0.3))
+    detail = _clip_unit(cv2.cuda.add(detail, gpu_img))
+
+    if progress_callback:
+        progress_callback(50)
+
+    # 3. 光照归一化
+    light_fine = cv2.cuda.divide(detail, _scale(_gaussian_blur(detail, 20), 1.0, 1e-6))
+    light_coarse = cv2.cuda.divide(detail, _scale(_gaussian_blur(detail, 50), 1.0, 1e-6))
+    light_fine = _scale_to_unit(light_fine)
+    light_coarse = _scale_to_unit(light_coarse)
+
+    fused = cv2.cuda.addWeighted(detail, 0.5, light_fine, 0.3, 0.0)
+    fused = _clip_unit(cv2.cuda.addWeighted(fused, 1.0, light_coarse, 0.2, 0.0))
+
+    if progress_callback:
+        progress_callback(70)
+
+    # 4. 保边降噪
+    smooth = _clip_unit(_guided_filter(fused, radius=7, eps=(50 / 255) ** 2))
+    denoised = cv2.cuda.bilateralFilter(smooth, 3, 40 / 255, 3)
+
+    if progress_callback:
+        progress_callback(80)
+
+    # 5. 转16位并CLAHE
+    # 与CPU路径一致：量化为256级再放大到16位，保持CLAHE裁剪效果
+    denoised_8 = cv2.cuda.addWeighted(denoised, 255.0, denoised, 0.0, 0.0, dtype=cv2.CV_8U)
+    denoised_16 = cv2.cuda.addWeighted(denoised_8, 257.0, denoised_8, 0.0, 0.0, dtype=cv2.CV_16U)
+    clahe = cv2.cuda.createCLAHE(clipLimit=0.8, tileGridSize=(16, 16))
+    result = clahe.apply(denoised_16, cv2.cuda.Stream_Null())
+
+    if progress_callback:
+        progress_callback(95)
+
+    return result.download()
+
+
+def window_level_gpu(gpu_data, window_width: float, window_level: float,
+                     invert: bool = False) -> np.ndarray:
+    """
+    窗宽窗位的CUDA实现：16位图像常驻显存，每次调节只做一次线性映射并下载8位结果
+
+    映射与WindowLevelLUT相同：(x - (窗位 - 窗宽/2)) * 255/窗宽，饱和转换到0-255；
+    OpenCV的饱和转换四舍五入，CPU查找表截断，两者最多相差1个灰度级
+
+    Args:
+        gpu_data: 已上传的16位图像（cv2.cuda_GpuMat）
+        window_width: 窗宽值（须为正）
+        window_level: 窗位值
+        invert: 是否反相
+
+    Returns:
+        8位显示图像
+    """
+    scale = 255.0 / window_width
+    offset = -(window_level - window_width / 2) * scale
+    if invert:
+        scale, offset = -scale, 255.0 - offset
+    result = cv2.cuda.addWeighted(gpu_data, scale, gpu_data, 0.0, offset, dtype=cv2.CV_8U)
+    return result.download()
@@ -0,0 +1,127 @@
+"""
+逐像素数值内核
+安装了Numba时提供JIT并行版本；未安装时内核为None，由调用方回退到NumPy实现
+
+Numba是可选依赖，不在项目依赖中声明；两条路径的输出在float32舍入范围内一致
+（fastmath允许重排运算，转16位后最多相差1个灰度级）
+"""
+import numpy as np
+
+# 尝试导入Numba
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def normalize_unit(data, offset, scale, out):
+        """out = (data - offset) * scale，按行并行"""
+        for i in prange(data.shape[0]):
+            for j in range(data.shape[1]):
+                out[i, j] = (data[i, j] - offset) * scale
+        return out
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def fuse_detail(img, hf_small, hf_large, var_map, a0, a1, b0, b1, out):
+        """out = clip(img + (a0 + a1*var) * hf_small + (b0 + b1*var) * hf_large, 0, 1)"""
+        for i in prange(img.shape[0]):
+            for j in range(img.shape[1]):
+                v = var_map[i, j]
+                value = img[i, j] + (a0 + a1 * v) * hf_small[i, j] + (b0 + b1 * v) * hf_large[i, j]
+                out[i, j] = min(1.0, max(0.0, value))
+        return out
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def boost_detail(img, blur, amount, out):
+        """out = clip(img + amount * (img - blur), 0, 1)，out可以与blur共用"""
+        for i in prange(img.shape[0]):
+            for j in range(img.shape[1]):
+                value = img[i, j] + amount * (img[i, j] - blur[i, j])
+                out[i, j] = min(1.0, max(0.0, value))
+        return out
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def sharpen_uint16(img, blur, amount, out):
+        """out = uint16(clip(img + amount * (img - blur), 0, 65535))，截断取整"""
+        for i in prange(img.shape[0]):
+            for j in range(img.shape[1]):
+                value = img[i, j] + amount * (img[i, j] - blur[i, j])
+                out[i, j] = np.uint16(min(65535.0, max(0.0, value)))
+        return out
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def unit_to_uint16(img, out):
+        """把0-1浮点图像截断转换为0-65535的uint16"""
+        for i in prange(img.shape[0]):
+            for j in range(img.shape[1]):
+                out[i, j] = np.uint16(img[i, j] * np.float32(65535.0))
+        return out
+
+    @njit(parallel=True, cache=True, boundscheck=False)
+    def apply_lut_u16(data, lut, out):
+        """out = lut[data]，uint16图像查65536项的表，按行并行"""
+        for i in prange(data.shape[0]):
+            for j in range(data.shape[1]):
+                out[i, j] = lut[data[i, j]]
+        return out
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def block_stats(img, block_size, means, variances, correlations):
+        """
+        不重叠方块的均值、块内方差，以及每个块与下方相邻块的相关系数
+
+        一次遍历，按块行并行；和与平方和用float64累加。
+        correlations形状为(行块数-1, 列块数-1)，任一块为平坦块时为NaN
+        """
+        h_blocks, w_blocks = means.shape
+        n = block_size * block_size
+        for bi in prange(h_blocks):
+            y0 = bi * block_size
+            for bj in range(w_blocks):
+                x0 = bj * block_size
+                s = 0.0
+                ss = 0.0
+                for y in range(y0, y0 + block_size):
+                    for x in range(x0, x0 + block_size):
+                        v = np.float64(img[y, x])
+                        s += v
+                        ss += v * v
+                mean = s / n
+                means[bi, bj] = mean
+                variances[bi, bj] = max(ss / n - mean * mean, 0.0)
+
+                if bi + 1 < h_blocks and bj + 1 < w_blocks:
+                    # 与下方块的Pearson相关系数（中心化后求和，避免相消误差）
+                    s2 = 0.0
+                    for y in range(y0 + block_size, y0 + 2 * block_size):
+                        for x in range(x0, x0 + block_size):
+                            s2 += img[y, x]
+                    mean2 = s2 / n
+                    sxy = 0.0
+                    sxx = 0.0
+                    syy = 0.0
+                    for y in range(block_size):
+                        for x in range(x0, x0 + block_size):
+                            a = img[y0 + y, x] - mean
+                            b = img[y0 + block_size + y, x] - mean2
+                            sxy += a * b
+                            sxx += a * a
+                            syy += b * b
+                    if sxx > 0.0 and syy > 0.0:
+                        correlations[bi, bj] = min(1.0, max(-1.0, sxy / np.sqrt(sxx * syy)))
+                    else:
+                        correlations[bi, bj] = np.nan
+        return means
+
+else:
+    normalize_unit = None
+    fuse_detail = None
+    boost_detail = None
+    sharpen_uint16 = None
+    unit_to_uint16 = None
+    apply_lut_u16 = None
+    block_stats = None
@@ -2,9 +2,23 @@
 DICOM图像增强处理器
 提供4个不同级别的增强算法：普通增强、高级增强、超级增强、一键处理
 """
+import os
+import multiprocessing
+import threading
 import numpy as np
 import cv2
-from typing import Optional, Callable
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Optional, Callable, List
+
+from ._kernels import normalize_unit, fuse_detail, boost_detail, unit_to_uint16
+from ._gpu import HAS_CUDA, GPU_MIN_PIXELS, super_enhance_gpu
+
+# 每个线程独立的CLAHE实例缓存（CLAHE对象在apply期间保存中间状态，不能跨线程共享）
+_clahe_cache = threading.local()
+
+# 可用于批量处理的增强方法
+ENHANCE_METHODS = ('basic_enhance', 'advanced_enhance', 'super_enhance', 'auto_enhance')
 
 
 class DicomEnhancer:
@@ -33,17 +47,14 @@ class DicomEnhancer:
                 progress_callback(30)
             
             # 简单高频增强
-            blur = cv2.GaussianBlur(img_norm, (0, 0), 2.0)
-            high_freq = img_norm - blur
-            img_enhanced = np.clip(img_norm + 0.3 * high_freq, 0, 1)
+            img_enhanced = DicomEnhancer._boost_detail(img_norm, 2.0, 0.3)
             
             if progress_callback:
                 progress_callback(60)
             
             # 基础CLAHE
-            img_16 = (img_enhanced * 65535).astype(np.uint16)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            result = clahe.apply(img_16)
+            img_16 = DicomEnhancer._to_uint16(img_enhanced)
+            result = DicomEnhancer._apply_clahe(img_16, 2.0, (8, 8))
             
             if progress_callback:
                 progress_callback(100)
@@ -77,47 +88,47 @@ class DicomEnhancer:
             
             # 1. 自适应高频增强
             # 局部方差（噪声检测）
-            var_map = cv2.GaussianBlur(img_norm**2, (7, 7), 0) - cv2.GaussianBlur(img_norm, (7, 7), 0)**2
-            var_map = np.clip(var_map / var_map.max(), 0, 1)
+            # 方差图只用作软权重，8位精度足够：缩放与量化一次完成，融合时读取量减为1/4
+            var_map = DicomEnhancer._variance_weight_u8(img_norm, 7)
             
             if progress_callback:
                 progress_callback(30)
             
-            # 多尺度高频
-            blur_small = cv2.GaussianBlur(img_norm, (0, 0), 1)
-            high_freq_small = img_norm - blur_small
-            blur_large = cv2.GaussianBlur(img_norm, (0, 0), 5)
-            high_freq_large = img_norm - blur_large
+            # 多尺度高频（原地相减，不再保留模糊中间图）
+            high_freq_small = cv2.GaussianBlur(img_norm, (0, 0), 1)
+            np.subtract(img_norm, high_freq_small, out=high_freq_small)
+            high_freq_large = cv2.GaussianBlur(img_norm, (0, 0), 5)
+            np.subtract(img_norm, high_freq_large, out=high_freq_large)
             
             # 增强强度随方差变化（平坦区增强少）
-            img_detail = img_norm + (0.5 + 1.0 * var_map) * high_freq_small + (0.3 + 0.5 * var_map) * high_freq_large
-            img_detail = np.clip(img_detail, 0, 1)
+            img_detail = DicomEnhancer._combine_detail(
+                img_norm, high_freq_small, high_freq_large, var_map,
+                0.5, 1.0 / 255, 0.3, 0.5 / 255, out=np.empty_like(img_norm)
+            )
+            del high_freq_small, high_freq_large, var_map
             
             if progress_callback:
                 progress_callback(50)
             
             # 2. 光照归一化
-            illum = cv2.GaussianBlur(img_detail, (0, 0), 30)
-            img_light_norm = img_detail / (illum + 1e-6)
-            img_light_norm = np.clip(img_light_norm / img_light_norm.max(), 0, 1)
+            img_light_norm = DicomEnhancer._light_normalize(img_detail, 30)
             
             # 保留原亮度
-            img_fused = np.clip(0.7 * img_detail + 0.3 * img_light_norm, 0, 1)
+            img_fused = cv2.addWeighted(img_detail, 0.7, img_light_norm, 0.3, 0, dst=img_light_norm)
+            np.clip(img_fused, 0, 1, out=img_fused)
             
             if progress_callback:
                 progress_callback(70)
             
-            # 3. 双边滤波降噪（保边）
-            img_fused_8 = (img_fused * 255).astype(np.uint8)
-            img_denoised_8 = cv2.bilateralFilter(img_fused_8, d=5, sigmaColor=50, sigmaSpace=5)
-            img_denoised = (img_denoised_8.astype(np.float32) / 255.0 * 65535).astype(np.uint16)
+            # 3. 双边滤波降噪（保边），直接在0-1浮点数据上进行，避免8位量化
+            img_denoised = cv2.bilateralFilter(img_fused, d=5, sigmaColor=50 / 255, sigmaSpace=5)
+            img_denoised = DicomEnhancer._to_clahe_levels(img_denoised)
             
             if progress_callback:
                 progress_callback(85)
             
             # 4. CLAHE
-            clahe = cv2.createCLAHE(clipLimit=1.2, tileGridSize=(8, 8))
-            result = clahe.apply(img_denoised)
+            result = DicomEnhancer._apply_clahe(img_denoised, 1.2, (8, 8))
             
             if progress_callback:
                 progress_callback(100)
@@ -149,73 +160,92 @@ class DicomEnhancer:
             if progress_callback:
                 progress_callback(10)
             
+            # 有可用GPU时整条流水线在显存中完成
+            if HAS_CUDA and data.size > GPU_MIN_PIXELS:
+                try:
+                    result = super_enhance_gpu(img_norm, progress_callback)
+                    if progress_callback:
+                        progress_callback(100)
+                    return result
+                except cv2.error as e:
+                    print(f"CUDA超级增强失败，回退到CPU: {e}")
+            
             # 1. 多层次噪声检测
-            var_map_fine = cv2.GaussianBlur(img_norm**2, (3, 3), 0) - cv2.GaussianBlur(img_norm, (3, 3), 0)**2
-            var_map_coarse = cv2.GaussianBlur(img_norm**2, (15, 15), 0) - cv2.GaussianBlur(img_norm, (15, 15), 0)**2
-            var_map_fine = np.clip(var_map_fine / var_map_fine.max(), 0, 1)
-            var_map_coarse = np.clip(var_map_coarse / var_map_coarse.max(), 0, 1)
+            var_map_fine = DicomEnhancer._local_variance(img_norm, 3)
+            DicomEnhancer._scale_to_unit(var_map_fine)
             
             if progress_callback:
                 progress_callback(25)
             
             # 2. 多尺度高频增强
+            # 高斯方差可加：每一级在上一级基础上用小sigma增量模糊，
+            # 而不是对原图分别做4次大核模糊
             scales = [0.5, 1.0, 2.0, 4.0]
-            enhanced_components = []
+            blur = np.empty_like(img_norm)
+            img_detail = np.zeros_like(img_norm)
+            prev_sigma = 0.0
+            total_strength = 0.0
             
             for i, sigma in enumerate(scales):
-                blur = cv2.GaussianBlur(img_norm, (0, 0), sigma)
-                high_freq = img_norm - blur
+                step_sigma = np.sqrt(sigma ** 2 - prev_sigma ** 2)
+                cv2.GaussianBlur(img_norm if i == 0 else blur, (0, 0), step_sigma, dst=blur)
+                prev_sigma = sigma
                 # 自适应增强强度
                 strength = 0.8 - 0.1 * i  # 细节越细，增强越强
-                enhanced_components.append(strength * high_freq)
+                # 累加 strength * (img_norm - blur)，原图部分最后统一加回
+                cv2.scaleAdd(blur, -strength, img_detail, dst=img_detail)
+                total_strength += strength
                 
                 if progress_callback:
                     progress_callback(25 + 15 * (i + 1) / len(scales))
             
-            # 组合多尺度增强
-            img_detail = img_norm
-            for component in enhanced_components:
-                img_detail = img_detail + (0.3 + 0.7 * var_map_fine) * component
-            img_detail = np.clip(img_detail, 0, 1)
+            # 组合多尺度增强：权重与尺度无关，先累加分量再统一加权
+            cv2.scaleAdd(img_norm, total_strength, img_detail, dst=img_detail)
+            del blur
+            np.multiply(var_map_fine, 0.7, out=var_map_fine)
+            np.add(var_map_fine, 0.3, out=var_map_fine)
+            np.multiply(img_detail, var_map_fine, out=img_detail)
+            np.add(img_detail, img_norm, out=img_detail)
+            np.clip(img_detail, 0, 1, out=img_detail)
             
             if progress_callback:
                 progress_callback(50)
             
             # 3. 高级光照归一化
-            illum_fine = cv2.GaussianBlur(img_detail, (0, 0), 20)
-            illum_coarse = cv2.GaussianBlur(img_detail, (0, 0), 50)
-            
-            img_light_fine = img_detail / (illum_fine + 1e-6)
-            img_light_coarse = img_detail / (illum_coarse + 1e-6)
-            
-            img_light_fine = np.clip(img_light_fine / img_light_fine.max(), 0, 1)
-            img_light_coarse = np.clip(img_light_coarse / img_light_coarse.max(), 0, 1)
+            img_light_fine = DicomEnhancer._light_normalize(img_detail, 20)
+            img_light_coarse = DicomEnhancer._light_normalize(img_detail, 50)
             
             # 融合不同尺度的光照归一化
-            img_fused = np.clip(0.5 * img_detail + 0.3 * img_light_fine + 0.2 * img_light_coarse, 0, 1)
+            img_fused = cv2.addWeighted(img_detail, 0.5, img_light_fine, 0.3, 0, dst=img_light_fine)
+            cv2.scaleAdd(img_light_coarse, 0.2, img_fused, dst=img_fused)
+            np.clip(img_fused, 0, 1, out=img_fused)
+            del img_light_coarse
             
             if progress_callback:
                 progress_callback(70)
             
             # 4. 边缘保护的降噪
-            img_fused_8 = (img_fused * 255).astype(np.uint8)
+            # 自引导滤波（盒式滤波实现，耗时与半径无关）替代三次递减参数的双边滤波
+            img_smooth = DicomEnhancer._guided_filter(img_fused, radius=7, eps=(50 / 255) ** 2)
+            np.clip(img_smooth, 0, 1, out=img_smooth)
+            
+            if progress_callback:
+                progress_callback(77)
 
-            # 多次双边滤波，参数递减
-            img_denoised = img_fused_8
-            for i, (d, sigma_color, sigma_space) in enumerate([(7, 80, 7), (5, 60, 5), (3, 40, 3)]):
-                img_denoised = cv2.bilateralFilter(img_denoised, d=d, sigmaColor=sigma_color, sigmaSpace=sigma_space)
-                if progress_callback:
-                    progress_callback(70 + 10 * (i + 1) / 3)
+            # 小核双边滤波做最后修饰
+            img_denoised = cv2.bilateralFilter(img_smooth, d=3, sigmaColor=40 / 255, sigmaSpace=3)
+            
+            if progress_callback:
+                progress_callback(80)
 
-            # 转换回16位
-            img_denoised = (img_denoised.astype(np.float32) / 255.0 * 65535).astype(np.uint16)
+            # 转换到16位
+            img_denoised = DicomEnhancer._to_clahe_levels(img_denoised)
             
             if progress_callback:
                 progress_callback(85)
             
             # 5. 自适应CLAHE
-            clahe = cv2.createCLAHE(clipLimit=0.8, tileGridSize=(16, 16))
-            result = clahe.apply(img_denoised)
+            result = DicomEnhancer._apply_clahe(img_denoised, 0.8, (16, 16))
             
             if progress_callback:
                 progress_callback(100)
@@ -244,10 +274,10 @@ class DicomEnhancer:
             # 分析图像特征
             img_norm = DicomEnhancer._normalize_image(data)
             
-            # 计算图像统计特征
-            mean_val = np.mean(img_norm)
-            std_val = np.std(img_norm)
-            contrast = std_val / (mean_val + 1e-6)
+            # 计算图像统计特征（在缩略图上统计，只用于选择处理分支）
+            thumb = DicomEnhancer._thumbnail(img_norm, 256)
+            mean_val, std_val = cv2.meanStdDev(thumb)
+            contrast = float(std_val[0, 0]) / (float(mean_val[0, 0]) + 1e-6)
             
             if progress_callback:
                 progress_callback(15)
@@ -271,65 +301,287 @@ class DicomEnhancer:
         except Exception as e:
             raise RuntimeError(f"一键处理失败: {str(e)}")
     
+    @staticmethod
+    def _thumbnail(img: np.ndarray, max_side: int) -> np.ndarray:
+        """
+        等间隔抽样缩小到最长边不超过max_side，保持宽高比
+        
+        不做面积平均：平均会压低噪声的标准差，使统计结果偏离原图
+        """
+        step = -(-max(img.shape[:2]) // max_side)
+        if step <= 1:
+            return img
+        return np.ascontiguousarray(img[::step, ::step])
+    
+    @staticmethod
+    def _get_clahe(clip_limit: float, tile_grid_size: tuple) -> cv2.CLAHE:
+        """按参数缓存当前线程的CLAHE实例，避免每次调用重新创建"""
+        cache = getattr(_clahe_cache, 'instances', None)
+        if cache is None:
+            cache = _clahe_cache.instances = {}
+        key = (clip_limit, tile_grid_size)
+        clahe = cache.get(key)
+        if clahe is None:
+            clahe = cache[key] = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+        return clahe
+    
+    @staticmethod
+    def _apply_clahe(img_16: np.ndarray, clip_limit: float, tile_grid_size: tuple) -> np.ndarray:
+        """对16位图像原地执行CLAHE（OpenCV内部已按tile多线程处理）"""
+        clahe = DicomEnhancer._get_clahe(clip_limit, tile_grid_size)
+        return clahe.apply(img_16, dst=img_16)
+    
+    @staticmethod
+    def enhance_series(volumes: List[np.ndarray], method: str = 'advanced_enhance',
+                       workers: Optional[int] = None) -> List[np.ndarray]:
+        """
+        多进程批量增强DICOM序列中的切片
+        
+        Args:
+            volumes: 切片图像列表
+            method: 增强方法名，见ENHANCE_METHODS
+            workers: 进程数，默认为CPU核数
+            
+        Returns:
+            与输入顺序一致的增强结果列表
+            
+        Note:
+            子进程以spawn方式启动，脚本调用时需放在 if __name__ == "__main__": 之下
+        """
+        if method not in ENHANCE_METHODS:
+            raise ValueError(f"未知的增强方法: {method}")
+        
+        workers = min(workers or os.cpu_count() or 1, len(volumes))
+        if workers <= 1:
+            enhance = getattr(DicomEnhancer, method)
+            return [enhance(volume) for volume in volumes]
+        
+        chunksize = max(1, len(volumes) // (workers * 4))
+        # 使用spawn：父进程中Numba/OpenCV的线程池在fork后不安全，子进程可能卡死
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_series_worker) as executor:
+            return list(executor.map(_enhance_series_item, repeat(method), volumes,
+                                     chunksize=chunksize))
+    
     @staticmethod
     def _normalize_image(data: np.ndarray) -> np.ndarray:
-        """归一化图像到0-1范围"""
-        data_float = data.astype(np.float32)
-        return (data_float - data_float.min()) / (data_float.max() - data_float.min())
+        """归一化图像到0-1范围（类型转换与减法合并为一次遍历）"""
+        data_min = data.min()
+        data_range = float(data.max()) - float(data_min)
+        out = np.empty(data.shape, dtype=np.float32)
+        
+        if data_range == 0:
+            out.fill(0)
+            return out
+        
+        scale = 1.0 / data_range
+        # Numba内核只接受本机字节序的连续数组（如'>u2'会报错），其余情况走NumPy
+        if (normalize_unit is not None and data.ndim == 2 and data.dtype.isnative
+                and data.flags.c_contiguous):
+            return normalize_unit(data, float(data_min), scale, out)
+        
+        np.subtract(data, data_min, out=out, dtype=np.float32)
+        np.multiply(out, scale, out=out)
+        return out
+    
+    @staticmethod
+    def _local_variance(img: np.ndarray, ksize: int) -> np.ndarray:
+        """
+        盒式窗口局部方差 E[x²] - E[x]²
+        
+        boxFilter按积分方式累加，耗时与窗口大小无关；结果只用作权重图
+        """
+        mean = cv2.boxFilter(img, cv2.CV_32F, (ksize, ksize))
+        var = cv2.sqrBoxFilter(img, cv2.CV_32F, (ksize, ksize))
+        cv2.multiply(mean, mean, dst=mean)
+        cv2.subtract(var, mean, dst=var)
+        return var
+    
+    @staticmethod
+    def _variance_weight_u8(img: np.ndarray, ksize: int) -> np.ndarray:
+        """
+        局部方差按最大值缩放并量化为uint8权重图（0-255对应0-1）
+        
+        代替 _local_variance + _scale_to_unit：缩放、舍入和类型转换在
+        cv2.convertScaleAbs中一次完成，输出只有float32的1/4大小
+        """
+        var = DicomEnhancer._local_variance(img, ksize)
+        max_val = float(var.max())
+        if max_val <= 0:
+            return np.zeros(var.shape, dtype=np.uint8)
+        # E[x²]-E[x]²的舍入误差可能产生极小的负值，取绝对值后舍入为0
+        return cv2.convertScaleAbs(var, alpha=255.0 / max_val)
+    
+    @staticmethod
+    def _boost_detail(img: np.ndarray, sigma: float, amount: float) -> np.ndarray:
+        """
+        单尺度高频增强：clip(img + amount * (img - GaussianBlur(img, sigma)), 0, 1)
+        
+        结果直接写入模糊图缓冲区，不产生额外的中间数组
+        """
+        out = cv2.GaussianBlur(img, (0, 0), sigma)
+        if boost_detail is not None and img.ndim == 2:
+            return boost_detail(img, out, amount, out)
+        
+        np.subtract(img, out, out=out)
+        np.multiply(out, amount, out=out)
+        np.add(out, img, out=out)
+        np.clip(out, 0, 1, out=out)
+        return out
+    
+    @staticmethod
+    def _combine_detail(img: np.ndarray, hf_small: np.ndarray, hf_large: np.ndarray,
+                        var_map: np.ndarray, a0: float, a1: float, b0: float, b1: float,
+                        out: np.ndarray) -> np.ndarray:
+        """
+        按方差自适应组合两个尺度的高频分量：
+        out = clip(img + (a0 + a1*var) * hf_small + (b0 + b1*var) * hf_large, 0, 1)
+        
+        var_map可以是float32或uint8权重图（此时a1、b1需除以255）。
+        Numba不可用时使用原地NumPy运算，会改写float32的var_map
+        """
+        if fuse_detail is not None:
+            return fuse_detail(img, hf_small, hf_large, var_map, a0, a1, b0, b1, out)
+        
+        if var_map.dtype != np.float32:
+            var_map = var_map.astype(np.float32)
+        np.multiply(var_map, a1, out=out)
+        np.add(out, a0, out=out)
+        np.multiply(out, hf_small, out=out)
+        np.multiply(var_map, b1, out=var_map)
+        np.add(var_map, b0, out=var_map)
+        np.multiply(var_map, hf_large, out=var_map)
+        np.add(out, var_map, out=out)
+        np.add(out, img, out=out)
+        np.clip(out, 0, 1, out=out)
+        return out
+    
+    @staticmethod
+    def _to_uint16(img: np.ndarray) -> np.ndarray:
+        """0-1浮点图像转换为16位（CLAHE输入）"""
+        if unit_to_uint16 is not None and img.ndim == 2:
+            return unit_to_uint16(img, np.empty(img.shape, dtype=np.uint16))
+        return (img * 65535).astype(np.uint16)
+    
+    @staticmethod
+    def _to_clahe_levels(img: np.ndarray) -> np.ndarray:
+        """
+        降噪后的0-1浮点图像量化为256级再放大到16位（CLAHE输入）
+        
+        16位CLAHE的直方图有65536个bin，连续灰度下每个bin的计数远低于裁剪阈值，
+        裁剪不起作用，平坦区域的噪声会被完全均衡放大；各方法的clipLimit
+        是按256级输入调好的，因此保留这一量化
+        """
+        img_8 = (img * 255).astype(np.uint8)
+        return np.multiply(img_8, 257, dtype=np.uint16)
+    
+    @staticmethod
+    def _guided_filter(img: np.ndarray, radius: int, eps: float) -> np.ndarray:
+        """
+        自引导滤波（He et al.），保边平滑，复杂度O(N)
+        
+        Args:
+            img: 0-1范围的float32图像，同时作为引导图
+            radius: 窗口半径
+            eps: 正则项，越大越平滑
+            
+        Returns:
+            滤波后的float32图像
+        """
+        ksize = (2 * radius + 1, 2 * radius + 1)
+        mean_i = cv2.boxFilter(img, cv2.CV_32F, ksize)
+        var_i = cv2.sqrBoxFilter(img, cv2.CV_32F, ksize)
+        tmp = cv2.multiply(mean_i, mean_i)
+        cv2.subtract(var_i, tmp, dst=var_i)
+        
+        # a = var / (var + eps), b = mean - a * mean
+        a = cv2.divide(var_i, cv2.add(var_i, eps), dst=var_i)
+        b = cv2.multiply(a, mean_i, dst=tmp)
+        cv2.subtract(mean_i, b, dst=b)
+        
+        cv2.boxFilter(a, cv2.CV_32F, ksize, dst=a)
+        cv2.boxFilter(b, cv2.CV_32F, ksize, dst=b)
+        cv2.multiply(a, img, dst=a)
+        cv2.add(a, b, dst=a)
+        return a
+    
+    @staticmethod
+    def _light_normalize(img: np.ndarray, sigma: float) -> np.ndarray:
+        """
+        光照归一化：img / (illum + 1e-6)，再除以最大值裁剪到0-1
+        
+        除法改为先求倒数再相乘，中间结果复用光照图缓冲区
+        """
+        illum = cv2.GaussianBlur(img, (0, 0), sigma)
+        np.add(illum, 1e-6, out=illum)
+        np.reciprocal(illum, out=illum)
+        np.multiply(img, illum, out=illum)
+        return DicomEnhancer._scale_to_unit(illum)
+    
+    @staticmethod
+    def _scale_to_unit(data: np.ndarray) -> np.ndarray:
+        """原地除以最大值并裁剪到0-1范围（最大值不为正时置零，避免1/0产生NaN）"""
+        max_val = float(data.max())
+        if max_val <= 0:
+            data.fill(0)
+            return data
+        np.multiply(data, 1.0 / max_val, out=data)
+        np.clip(data, 0, 1, out=data)
+        return data
     
     @staticmethod
     def _enhance_low_contrast(img_norm: np.ndarray, progress_callback: Optional[Callable] = None) -> np.ndarray:
         """低对比度图像增强"""
         # 强CLAHE + 高频增强
-        blur = cv2.GaussianBlur(img_norm, (0, 0), 1.5)
-        high_freq = img_norm - blur
-        img_enhanced = np.clip(img_norm + 0.8 * high_freq, 0, 1)
+        img_enhanced = DicomEnhancer._boost_detail(img_norm, 1.5, 0.8)
         
         if progress_callback:
             progress_callback(60)
         
-        img_16 = (img_enhanced * 65535).astype(np.uint16)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        return clahe.apply(img_16)
+        img_16 = DicomEnhancer._to_uint16(img_enhanced)
+        return DicomEnhancer._apply_clahe(img_16, 3.0, (8, 8))
     
     @staticmethod
     def _enhance_high_contrast(img_norm: np.ndarray, progress_callback: Optional[Callable] = None) -> np.ndarray:
         """高对比度图像增强"""
         # 轻微增强 + 降噪
-        blur = cv2.GaussianBlur(img_norm, (0, 0), 2.0)
-        high_freq = img_norm - blur
-        img_enhanced = np.clip(img_norm + 0.2 * high_freq, 0, 1)
+        img_enhanced = DicomEnhancer._boost_detail(img_norm, 2.0, 0.2)
         
         if progress_callback:
             progress_callback(50)
         
-        img_8 = (img_enhanced * 255).astype(np.uint8)
-        img_denoised_8 = cv2.bilateralFilter(img_8, d=5, sigmaColor=30, sigmaSpace=5)
-        img_denoised = (img_denoised_8.astype(np.float32) / 255.0 * 65535).astype(np.uint16)
+        img_denoised = cv2.bilateralFilter(img_enhanced, d=5, sigmaColor=30 / 255, sigmaSpace=5)
+        img_denoised = DicomEnhancer._to_clahe_levels(img_denoised)
         
         if progress_callback:
             progress_callback(80)
         
-        clahe = cv2.createCLAHE(clipLimit=1.0, tileGridSize=(8, 8))
-        return clahe.apply(img_denoised)
+        return DicomEnhancer._apply_clahe(img_denoised, 1.0, (8, 8))
     
     @staticmethod
     def _enhance_normal_contrast(img_norm: np.ndarray, progress_callback: Optional[Callable] = None) -> np.ndarray:
         """中等对比度图像增强"""
         # 使用高级增强的简化版本
-        blur = cv2.GaussianBlur(img_norm, (0, 0), 1.5)
-        high_freq = img_norm - blur
-        img_enhanced = np.clip(img_norm + 0.5 * high_freq, 0, 1)
+        img_enhanced = DicomEnhancer._boost_detail(img_norm, 1.5, 0.5)
         
         if progress_callback:
             progress_callback(60)
         
-        img_8 = (img_enhanced * 255).astype(np.uint8)
-        img_denoised_8 = cv2.bilateralFilter(img_8, d=5, sigmaColor=50, sigmaSpace=5)
-        img_denoised = (img_denoised_8.astype(np.float32) / 255.0 * 65535).astype(np.uint16)
+        img_denoised = cv2.bilateralFilter(img_enhanced, d=5, sigmaColor=50 / 255, sigmaSpace=5)
+        img_denoised = DicomEnhancer._to_clahe_levels(img_denoised)
         
         if progress_callback:
             progress_callback(80)
         
-        clahe = cv2.createCLAHE(clipLimit=1.5, tileGridSize=(8, 8))
-        return clahe.apply(img_denoised)
+        return DicomEnhancer._apply_clahe(img_denoised, 1.5, (8, 8))
+
+
+def _init_series_worker():
+    """批量处理子进程初始化：进程间已经并行，OpenCV内部只用单线程避免过度订阅"""
+    cv2.setNumThreads(1)
+
+
+def _enhance_series_item(method: str, data: np.ndarray) -> np.ndarray:
+    """子进程中处理单张切片（模块级函数才能被pickle）"""
+    return getattr(DicomEnhancer, method)(data)
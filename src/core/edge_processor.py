@@ -2,9 +2,17 @@
 边缘检测处理器模块
 """
 import numpy as np
-from skimage import feature, filters
+import cv2
+from skimage import feature
 from typing import Tuple, Optional
 
+# Roberts交叉算子，预先乘以1/sqrt(2)使幅值与skimage.filters.roberts一致
+_ROBERTS_PD_KERNEL = np.array([[1, 0], [0, -1]], dtype=np.float32) / np.float32(np.sqrt(2))
+_ROBERTS_ND_KERNEL = np.array([[0, 1], [-1, 0]], dtype=np.float32) / np.float32(np.sqrt(2))
+
+# Canny预计算梯度缩放到的最大绝对值
+_CANNY_GRAD_RANGE = 16384.0
+
 class EdgeProcessor:
     """边缘检测算法集合"""
     
@@ -22,25 +30,21 @@ class EdgeProcessor:
         # 转换为float32以提高精度
         data_float = data.astype(np.float32)
         
-        # Sobel算子检测水平和垂直边缘
-        sobel_h = filters.sobel_h(data_float)
-        sobel_v = filters.sobel_v(data_float)
+        # Sobel算子检测水平和垂直边缘（scale=1/4与skimage的归一化核一致）
+        sobel_h = cv2.Sobel(data_float, cv2.CV_32F, 0, 1, ksize=3, scale=0.25,
+                            borderType=cv2.BORDER_REFLECT)
+        sobel_v = cv2.Sobel(data_float, cv2.CV_32F, 1, 0, ksize=3, scale=0.25,
+                            borderType=cv2.BORDER_REFLECT)
         
         # 计算梯度幅值
-        sobel_magnitude = np.sqrt(sobel_h**2 + sobel_v**2)
-        
-        if normalize:
-            # 归一化到原始数据范围
-            result_min, result_max = sobel_magnitude.min(), sobel_magnitude.max()
-            if result_max > result_min:
-                sobel_magnitude = (sobel_magnitude - result_min) / (result_max - result_min)
-                sobel_magnitude = sobel_magnitude * (data.max() - data.min()) + data.min()
+        sobel_magnitude = cv2.magnitude(sobel_h, sobel_v)
         
-        return np.clip(sobel_magnitude, 0, 65535).astype(np.uint16)
+        return EdgeProcessor._to_uint16(sobel_magnitude, data, normalize)
     
     @staticmethod
     def canny_edge(data: np.ndarray, sigma: float = 1.0, 
-                   low_threshold: float = 0.1, high_threshold: float = 0.2) -> np.ndarray:
+                   low_threshold: float = 0.1, high_threshold: float = 0.2,
+                   engine: str = 'opencv') -> np.ndarray:
         """Canny边缘检测
         
         Args:
@@ -48,6 +52,7 @@ class EdgeProcessor:
             sigma: 高斯滤波标准差
             low_threshold: 低阈值
             high_threshold: 高阈值
+            engine: 'opencv'（默认，C++实现）或 'skimage'（原实现，用于对比验证）
             
         Returns:
             np.ndarray: 边缘检测结果
@@ -63,15 +68,50 @@ class EdgeProcessor:
         # 归一化到0-1范围进行Canny检测
         data_normalized = data.astype(np.float32) / 65535.0
         
-        # Canny边缘检测
-        edges = feature.canny(data_normalized, sigma=sigma, 
-                             low_threshold=low_threshold, 
-                             high_threshold=high_threshold)
+        if engine == 'skimage':
+            # Canny边缘检测
+            edges = feature.canny(data_normalized, sigma=sigma, 
+                                 low_threshold=low_threshold, 
+                                 high_threshold=high_threshold)
+            
+            # 转换为16位图像
+            return edges.astype(np.uint16) * 65535
+        
+        edges = EdgeProcessor.canny_mask(data_normalized, sigma, low_threshold, high_threshold)
+        
+        # 边缘为255，乘257得到65535
+        return edges.astype(np.uint16) * 257
+    
+    @staticmethod
+    def canny_mask(img: np.ndarray, sigma: float, low_threshold: float,
+                   high_threshold: float) -> np.ndarray:
+        """OpenCV Canny，阈值含义与skimage.feature.canny一致
+        
+        Args:
+            img: float32图像（通常为0-1范围）
+            sigma: 高斯滤波标准差
+            low_threshold: 低阈值（未归一化的Sobel梯度幅值）
+            high_threshold: 高阈值
+            
+        Returns:
+            np.ndarray: uint8边缘图，边缘为255
+        """
+        # 浮点高斯平滑和Sobel梯度，与skimage一样在浮点数据上计算
+        smoothed = cv2.GaussianBlur(img, (0, 0), sigma)
+        grad_x = cv2.Sobel(smoothed, cv2.CV_32F, 1, 0, ksize=3)
+        grad_y = cv2.Sobel(smoothed, cv2.CV_32F, 0, 1, ksize=3)
         
-        # 转换为16位图像
-        result = edges.astype(np.uint16) * 65535
+        max_grad = max(float(np.abs(grad_x).max()), float(np.abs(grad_y).max()))
+        if max_grad == 0:
+            return np.zeros(img.shape, dtype=np.uint8)
         
-        return result
+        # cv2.Canny接受预先计算的16位梯度：按同一比例缩放梯度和阈值，保留浮点精度，
+        # 上限取2^14使L2幅值的平方不溢出int32
+        scale = _CANNY_GRAD_RANGE / max_grad
+        grad_x = (grad_x * scale).astype(np.int16)
+        grad_y = (grad_y * scale).astype(np.int16)
+        return cv2.Canny(grad_x, grad_y, low_threshold * scale, high_threshold * scale,
+                         L2gradient=True)
     
     @staticmethod
     def laplacian_edge(data: np.ndarray, normalize: bool = True) -> np.ndarray:
@@ -88,19 +128,13 @@ class EdgeProcessor:
         data_float = data.astype(np.float32)
         
         # Laplacian算子
-        laplacian = filters.laplace(data_float)
+        laplacian = cv2.Laplacian(data_float, cv2.CV_32F, ksize=1,
+                                  borderType=cv2.BORDER_REFLECT)
         
-        # 取绝对值
-        laplacian_abs = np.abs(laplacian)
+        # 取绝对值（保持float32，convertScaleAbs会截断到8位）
+        laplacian_abs = np.abs(laplacian, out=laplacian)
         
-        if normalize:
-            # 归一化到原始数据范围
-            result_min, result_max = laplacian_abs.min(), laplacian_abs.max()
-            if result_max > result_min:
-                laplacian_abs = (laplacian_abs - result_min) / (result_max - result_min)
-                laplacian_abs = laplacian_abs * (data.max() - data.min()) + data.min()
-        
-        return np.clip(laplacian_abs, 0, 65535).astype(np.uint16)
+        return EdgeProcessor._to_uint16(laplacian_abs, data, normalize)
     
     @staticmethod
     def edge_enhancement(data: np.ndarray, edge_strength: float = 1.0, 
@@ -138,7 +172,8 @@ class EdgeProcessor:
         data_float = data.astype(np.float32)
         enhanced = data_float + edge_strength * edges_normalized * data_float.max() * 0.1
         
-        return np.clip(enhanced, 0, 65535).astype(np.uint16)
+        np.clip(enhanced, 0, 65535, out=enhanced)
+        return enhanced.astype(np.uint16)
     
     @staticmethod
     def roberts_edge(data: np.ndarray, normalize: bool = True) -> np.ndarray:
@@ -155,16 +190,34 @@ class EdgeProcessor:
         data_float = data.astype(np.float32)
         
         # Roberts算子
-        roberts = filters.roberts(data_float)
+        roberts_pd = cv2.filter2D(data_float, cv2.CV_32F, _ROBERTS_PD_KERNEL,
+                                  anchor=(0, 0), borderType=cv2.BORDER_REFLECT)
+        roberts_nd = cv2.filter2D(data_float, cv2.CV_32F, _ROBERTS_ND_KERNEL,
+                                  anchor=(0, 0), borderType=cv2.BORDER_REFLECT)
+        roberts = cv2.magnitude(roberts_pd, roberts_nd)
+        
+        return EdgeProcessor._to_uint16(roberts, data, normalize)
+    
+    @staticmethod
+    def _to_uint16(edges: np.ndarray, data: np.ndarray, normalize: bool) -> np.ndarray:
+        """
+        边缘响应转换为16位结果
         
-        if normalize:
-            # 归一化到原始数据范围
-            result_min, result_max = roberts.min(), roberts.max()
-            if result_max > result_min:
-                roberts = (roberts - result_min) / (result_max - result_min)
-                roberts = roberts * (data.max() - data.min()) + data.min()
+        Args:
+            edges: float32边缘响应（非负），可被原地修改
+            data: 原始图像数据
+            normalize: 是否线性拉伸到原始数据的[min, max]范围
+            
+        Returns:
+            np.ndarray: uint16结果
+        """
+        if normalize and edges.max() > edges.min():
+            # 拉伸、舍入和类型转换在cv2.normalize中一次完成
+            return cv2.normalize(edges, None, alpha=float(data.min()), beta=float(data.max()),
+                                 norm_type=cv2.NORM_MINMAX, dtype=cv2.CV_16U)
         
-        return np.clip(roberts, 0, 65535).astype(np.uint16)
+        np.clip(edges, 0, 65535, out=edges)
+        return edges.astype(np.uint16)
     
     @staticmethod
     def get_algorithm_info() -> dict:
@@ -1,56 +1,206 @@
 """
 频域增强处理器模块
 """
+import os
+import threading
+from functools import lru_cache
 import numpy as np
-from typing import Tuple, Optional
+import cv2
+from scipy import fft
+from typing import List, Tuple, Optional
+
+# FFT后端：默认scipy自带的pocketfft；设置 PYENHANCE_FFT_BACKEND=pyfftw 且已安装pyFFTW时
+# 改用FFTW，每个线程按图像尺寸保留FFTW_MEASURE计划和对齐缓冲区（首次规划大图需数秒）
+pyfftw = None
+if os.environ.get('PYENHANCE_FFT_BACKEND') == 'pyfftw':
+    try:
+        import pyfftw
+    except ImportError:
+        print("未安装pyFFTW，使用scipy.fft")
+
+# 每个线程的FFT工作区（缓冲区不能跨线程共享）
+_fft_contexts = threading.local()
+
+
+class _FFTContext:
+    """
+    单一图像尺寸的rfft2/irfft2工作区
+    
+    持有float32实数缓冲区和频谱乘积缓冲区，同尺寸的连续调用直接复用；
+    使用pyFFTW时还持有对齐缓冲区上的正/逆变换计划
+    """
+    
+    def __init__(self, shape: Tuple[int, int]):
+        rows, cols = shape
+        half_shape = (rows, cols // 2 + 1)
+        if pyfftw is not None:
+            self.real = pyfftw.empty_aligned(shape, dtype='float32')
+            self.spectrum = pyfftw.empty_aligned(half_shape, dtype='complex64')
+            self.product = pyfftw.empty_aligned(half_shape, dtype='complex64')
+            threads = os.cpu_count() or 1
+            # FFTW_MEASURE规划时会改写缓冲区，必须在填数据之前建立计划
+            self._forward = pyfftw.FFTW(self.real, self.spectrum, axes=(0, 1), threads=threads,
+                                        flags=('FFTW_MEASURE', 'FFTW_DESTROY_INPUT'))
+            self._inverse = pyfftw.FFTW(self.product, self.real, axes=(0, 1),
+                                        direction='FFTW_BACKWARD', threads=threads,
+                                        flags=('FFTW_MEASURE', 'FFTW_DESTROY_INPUT'))
+        else:
+            self.real = np.empty(shape, dtype=np.float32)
+            self.product = np.empty(half_shape, dtype=np.complex64)
+    
+    def forward(self, data: np.ndarray) -> np.ndarray:
+        """
+        转换为float32后做rfft2，只计算一半频谱
+        
+        顺便在float32副本上一次遍历求出原始数据范围，供逆变换后恢复范围使用
+        （变换会破坏该缓冲区）
+        """
+        np.copyto(self.real, data, casting='unsafe')
+        self.data_range = cv2.minMaxLoc(self.real)[:2]
+        if pyfftw is not None:
+            return self._forward()
+        return fft.rfft2(self.real, workers=-1)
+    
+    def inverse(self) -> np.ndarray:
+        """对product做irfft2，product会被覆盖；返回的float32结果在下次调用前有效"""
+        if pyfftw is not None:
+            return self._inverse()
+        return fft.irfft2(self.product, s=self.real.shape, workers=-1, overwrite_x=True)
+
+
+def _fft_context(shape: Tuple[int, int]) -> _FFTContext:
+    """取当前线程的FFT工作区，尺寸变化时重建（只保留最近一个尺寸，限制常驻内存）"""
+    context = getattr(_fft_contexts, 'context', None)
+    if context is None or context.real.shape != shape:
+        context = _FFTContext(shape)
+        _fft_contexts.context = context
+    return context
+
+
+@lru_cache(maxsize=8)
+def _radial_distance(rows: int, cols: int, layout: str = 'centered') -> np.ndarray:
+    """
+    按形状缓存的频率平面到零频的距离矩阵（只读）
+    
+    'centered'为零频位于(rows//2, cols//2)的全平面，与fftshift后的频谱对应；
+    'rfft'为DC在[0, 0]的未移位半平面 (rows, cols//2+1)，与rfft2输出对应。
+    频域滤波和图像质量分析的频带划分共用
+    """
+    # 各行/列到零频的频率偏移
+    fy = np.arange(rows) - rows // 2
+    if layout == 'rfft':
+        # 列只保留rfft2输出的非负频率，与rfft2结果直接相乘，不需要fftshift/ifftshift
+        fy = np.fft.ifftshift(fy)
+        fx = np.arange(cols // 2 + 1)
+    elif layout == 'centered':
+        fx = np.arange(cols) - cols // 2
+    else:
+        raise ValueError(f"未知的滤波器布局: {layout}")
+    
+    # 保持float64：理想滤波器按截止距离做阈值比较，float32舍入会让边界上的频率点翻转
+    distance = np.hypot(fy[:, np.newaxis], fx[np.newaxis, :])
+    distance.setflags(write=False)
+    return distance
+
+
+@lru_cache(maxsize=4)
+def _frequency_filter(rows: int, cols: int, cutoff_ratio: float, filter_type: str,
+                      layout: str) -> np.ndarray:
+    """
+    按参数缓存的频域滤波器
+    
+    结果设为只读，调用方只拿它做乘法，可以安全共享；
+    大图的单个滤波器有数十MB，缓存容量保持较小
+    """
+    crow, ccol = rows // 2, cols // 2
+    
+    # 各行/列到零频的频率偏移
+    fy = np.arange(rows) - crow
+    if layout == 'rfft':
+        fy = np.fft.ifftshift(fy)
+        fx = np.arange(cols // 2 + 1)
+    elif layout == 'centered':
+        fx = np.arange(cols) - ccol
+    else:
+        raise ValueError(f"未知的滤波器布局: {layout}")
+    
+    # 计算截止频率
+    max_distance = np.sqrt(crow**2 + ccol**2)
+    cutoff_frequency = cutoff_ratio * max_distance
+    
+    if filter_type in ('ideal_low', 'ideal_high'):
+        # 距离矩阵按形状缓存，调节截止频率时不重复计算
+        distance = _radial_distance(rows, cols, layout)
+        
+        if filter_type == 'ideal_low':
+            # 理想低通滤波器
+            filter_mask = (distance <= cutoff_frequency).astype(np.float32)
+        else:
+            # 理想高通滤波器
+            filter_mask = (distance > cutoff_frequency).astype(np.float32)
+    
+    elif filter_type in ('gaussian_low', 'gaussian_high'):
+        # 高斯核可分离：exp(-(dx²+dy²)/2σ²) = exp(-dx²/2σ²) · exp(-dy²/2σ²)，
+        # 只需H+W次exp，再做一次外积
+        denom = 2 * cutoff_frequency**2
+        gy = np.exp(-(fy**2) / denom).astype(np.float32)
+        gx = np.exp(-(fx**2) / denom).astype(np.float32)
+        # 高斯低通滤波器
+        filter_mask = np.multiply.outer(gy, gx)
+        
+        if filter_type == 'gaussian_high':
+            # 高斯高通滤波器
+            np.subtract(1, filter_mask, out=filter_mask)
+    
+    else:
+        raise ValueError(f"未知的滤波器类型: {filter_type}")
+    
+    filter_mask.setflags(write=False)
+    return filter_mask
+
 
 class FrequencyProcessor:
     """频域增强算法集合"""
     
     @staticmethod
     def _create_frequency_filter(shape: Tuple[int, int], cutoff_ratio: float, 
-                                filter_type: str) -> np.ndarray:
+                                filter_type: str, layout: str = 'centered') -> np.ndarray:
         """创建频域滤波器
         
+        相同参数的滤波器直接取缓存（界面调参时常重复应用同一滤波器）
+        
         Args:
             shape: 图像形状 (rows, cols)
             cutoff_ratio: 截止频率比例 (0.01-0.5)
             filter_type: 滤波器类型 ('ideal_low', 'ideal_high', 'gaussian_low', 'gaussian_high')
+            layout: 'centered'为零频居中的全平面（用于显示），
+                    'rfft'为与rfft2输出对应的未移位半平面 (rows, cols//2+1)
             
         Returns:
-            np.ndarray: 频域滤波器
+            np.ndarray: 频域滤波器（只读）
         """
         rows, cols = shape
-        crow, ccol = rows // 2, cols // 2
-        
-        # 创建距离矩阵
-        y, x = np.ogrid[:rows, :cols]
-        distance = np.sqrt((x - ccol)**2 + (y - crow)**2)
-        
-        # 计算截止频率
-        max_distance = np.sqrt(crow**2 + ccol**2)
-        cutoff_frequency = cutoff_ratio * max_distance
+        return _frequency_filter(rows, cols, float(cutoff_ratio), filter_type, layout)
+    
+    @staticmethod
+    def _restore_range(result: np.ndarray, data: np.ndarray,
+                       data_range: Tuple[float, float]) -> np.ndarray:
+        """把逆变换结果取模并线性拉伸到原始数据范围 [data_min, data_max]，result会被覆盖"""
+        # 滤波器中心对称，逆变换结果为实数；取绝对值与原复数取模一致
+        result = np.abs(result, out=result)
         
-        if filter_type == 'ideal_low':
-            # 理想低通滤波器
-            filter_mask = (distance <= cutoff_frequency).astype(np.float32)
-            
-        elif filter_type == 'ideal_high':
-            # 理想高通滤波器
-            filter_mask = (distance > cutoff_frequency).astype(np.float32)
-            
-        elif filter_type == 'gaussian_low':
-            # 高斯低通滤波器
-            filter_mask = np.exp(-(distance**2) / (2 * cutoff_frequency**2))
-            
-        elif filter_type == 'gaussian_high':
-            # 高斯高通滤波器
-            filter_mask = 1 - np.exp(-(distance**2) / (2 * cutoff_frequency**2))
-            
-        else:
-            raise ValueError(f"未知的滤波器类型: {filter_type}")
+        # 结果的最小/最大值一次遍历求出，拉伸、舍入和类型转换在一次addWeighted中完成
+        # （与cv2.normalize(NORM_MINMAX)的结果逐像素相同，省去其内部再求一遍极值）
+        result_min, result_max = cv2.minMaxLoc(result)[:2]
+        if result_max > result_min:
+            data_min, data_max = data_range
+            scale = (data_max - data_min) / (result_max - result_min)
+            return cv2.addWeighted(result, scale, result, 0.0, data_min - result_min * scale,
+                                   dtype=cv2.CV_16U)
         
-        return filter_mask
+        if data.dtype == np.uint16:
+            return data.copy()
+        return np.clip(data, 0, 65535).astype(np.uint16)
     
     @staticmethod
     def _apply_frequency_filter(data: np.ndarray, filter_mask: np.ndarray) -> np.ndarray:
@@ -58,37 +208,48 @@ class FrequencyProcessor:
         
         Args:
             data: 输入图像数据
-            filter_mask: 频域滤波器
+            filter_mask: rfft半平面布局的频域滤波器
             
         Returns:
             np.ndarray: 滤波后的图像
         """
-        # 转换为float32以提高精度
-        data_float = data.astype(np.float32)
+        context = _fft_context(data.shape)
+        f_transform = context.forward(data)
         
-        # 傅里叶变换
-        f_transform = np.fft.fft2(data_float)
-        f_shift = np.fft.fftshift(f_transform)
+        # 滤波器为rfft半平面布局，直接相乘
+        np.multiply(f_transform, filter_mask, out=context.product)
         
-        # 应用滤波器
-        filtered_shift = f_shift * filter_mask
+        return FrequencyProcessor._restore_range(context.inverse(), data, context.data_range)
+    
+    @staticmethod
+    def apply_filters(data: np.ndarray, specs: List[Tuple[str, float]]) -> List[np.ndarray]:
+        """对同一图像应用多个频域滤波器
         
-        # 逆傅里叶变换
-        f_ishift = np.fft.ifftshift(filtered_shift)
-        filtered_data = np.fft.ifft2(f_ishift)
+        只做一次正向FFT，各滤波器与同一频谱相乘后分别逆变换，
+        结果与逐个调用对应滤波方法一致
         
-        # 取实部并转换回原始数据类型
-        result = np.abs(filtered_data)
+        Args:
+            data: 输入图像数据
+            specs: [(filter_type, cutoff_ratio), ...]，filter_type为
+                   'ideal_low', 'ideal_high', 'gaussian_low', 'gaussian_high'
+            
+        Returns:
+            List[np.ndarray]: 按specs顺序的滤波结果
+        """
+        context = _fft_context(data.shape)
+        f_transform = context.forward(data)
         
-        # 归一化到原始数据范围
-        result_min, result_max = result.min(), result.max()
-        if result_max > result_min:
-            result = (result - result_min) / (result_max - result_min)
-            result = result * (data.max() - data.min()) + data.min()
-        else:
-            result = data.astype(np.float32)
+        results = []
+        for filter_type, cutoff_ratio in specs:
+            if cutoff_ratio <= 0 or cutoff_ratio >= 1:
+                cutoff_ratio = 0.1
+            filter_mask = FrequencyProcessor._create_frequency_filter(
+                data.shape, cutoff_ratio, filter_type, layout='rfft')
+            np.multiply(f_transform, filter_mask, out=context.product)
+            results.append(FrequencyProcessor._restore_range(context.inverse(), data,
+                                                             context.data_range))
         
-        return np.clip(result, 0, 65535).astype(np.uint16)
+        return results
     
     @staticmethod
     def ideal_low_pass(data: np.ndarray, cutoff_ratio: float = 0.1) -> np.ndarray:
@@ -105,7 +266,7 @@ class FrequencyProcessor:
             cutoff_ratio = 0.1
             
         filter_mask = FrequencyProcessor._create_frequency_filter(
-            data.shape, cutoff_ratio, 'ideal_low')
+            data.shape, cutoff_ratio, 'ideal_low', layout='rfft')
         
         return FrequencyProcessor._apply_frequency_filter(data, filter_mask)
     
@@ -124,7 +285,7 @@ class FrequencyProcessor:
             cutoff_ratio = 0.1
             
         filter_mask = FrequencyProcessor._create_frequency_filter(
-            data.shape, cutoff_ratio, 'ideal_high')
+            data.shape, cutoff_ratio, 'ideal_high', layout='rfft')
         
         return FrequencyProcessor._apply_frequency_filter(data, filter_mask)
     
@@ -143,7 +304,7 @@ class FrequencyProcessor:
             cutoff_ratio = 0.1
             
         filter_mask = FrequencyProcessor._create_frequency_filter(
-            data.shape, cutoff_ratio, 'gaussian_low')
+            data.shape, cutoff_ratio, 'gaussian_low', layout='rfft')
         
         return FrequencyProcessor._apply_frequency_filter(data, filter_mask)
     
@@ -162,7 +323,7 @@ class FrequencyProcessor:
             cutoff_ratio = 0.1
             
         filter_mask = FrequencyProcessor._create_frequency_filter(
-            data.shape, cutoff_ratio, 'gaussian_high')
+            data.shape, cutoff_ratio, 'gaussian_high', layout='rfft')
         
         return FrequencyProcessor._apply_frequency_filter(data, filter_mask)
     
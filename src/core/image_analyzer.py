@@ -1,13 +1,44 @@
 """
 图像质量分析模块 - 专门检测马赛克效应和图像质量变化
 """
+import os
 import numpy as np
+import cv2
 from scipy import ndimage, fft
-from skimage import filters, feature, measure
+from skimage import filters, measure
 import functools
 import time
 from typing import Dict, Any, Tuple, Optional
 
+from ._kernels import block_stats
+from .edge_processor import EdgeProcessor
+from .frequency_processor import _radial_distance
+
+# 半径为2的圆盘结构元素（与skimage.morphology.disk(2)相同）
+_DISK_2 = np.array([[0, 0, 1, 0, 0],
+                    [0, 1, 1, 1, 0],
+                    [1, 1, 1, 1, 1],
+                    [0, 1, 1, 1, 0],
+                    [0, 0, 1, 0, 0]], dtype=np.uint8)
+
+
+@functools.lru_cache(maxsize=8)
+def _radial_bins(h: int, w: int) -> np.ndarray:
+    """
+    按到频谱中心的距离把fftshift后的频率平面分为三个频带
+    
+    距离不超过max_dist*0.1为低频(0)，不超过max_dist*0.5为中频(1)，其余为高频(2)。
+    返回展平的只读索引数组，按形状缓存
+    """
+    center_h, center_w = h // 2, w // 2
+    dist_from_center = _radial_distance(h, w)
+    
+    max_dist = min(center_h, center_w)
+    bin_idx = np.digitize(dist_from_center, [max_dist * 0.1, max_dist * 0.5], right=True)
+    bin_idx = bin_idx.astype(np.intp).ravel()
+    bin_idx.flags.writeable = False
+    return bin_idx
+
 
 class ImageQualityAnalyzer:
     """图像质量分析器 - 检测马赛克效应、纹理变化等"""
@@ -37,24 +68,22 @@ class ImageQualityAnalyzer:
             new_h = int(image.shape[0] * scale)
             new_w = int(image.shape[1] * scale)
 
-            # 使用OpenCV进行高质量下采样
-            from skimage import transform
-            img_resized = transform.resize(image, (new_h, new_w), anti_aliasing=True, preserve_range=True)
-            img = img_resized.astype(np.float32)
+            # 使用OpenCV面积平均下采样（自带抗混叠，单次遍历）
+            img = cv2.resize(image.astype(np.float32, copy=False), (new_w, new_h),
+                             interpolation=cv2.INTER_AREA)
             print(f"      下采样: {original_shape} → {img.shape}")
         else:
-            # 确保是浮点数
-            if image.dtype != np.float32:
-                img = image.astype(np.float32)
-            else:
-                img = image.copy()
+            # 不复制：后续分析只读取图像，类型转换合并到下面的归一化中
+            img = image
 
-        # 归一化到[0,1]以便统一分析
+        # 归一化到[0,1]以便统一分析（类型转换、减法和缩放写入同一个float32缓冲区）
         img_min, img_max = img.min(), img.max()
+        img_norm = np.empty(img.shape, dtype=np.float32)
         if img_max > img_min:
-            img_norm = (img - img_min) / (img_max - img_min)
+            np.subtract(img, img_min, out=img_norm, dtype=np.float32)
+            np.multiply(img_norm, np.float32(1.0 / (float(img_max) - float(img_min))), out=img_norm)
         else:
-            img_norm = img.copy()
+            img_norm[...] = img
         
         analysis = {
             'name': name,
@@ -66,11 +95,15 @@ class ImageQualityAnalyzer:
         # 1. 基础统计
         analysis.update(ImageQualityAnalyzer._basic_statistics(img_norm))
         
+        # Sobel梯度只计算一次，纹理和边缘分析共用
+        grad = ImageQualityAnalyzer._sobel_gradients(img_norm)
+        
         # 2. 纹理复杂度分析（马赛克的关键指标）
-        analysis.update(ImageQualityAnalyzer._texture_complexity(img_norm))
+        analysis.update(ImageQualityAnalyzer._texture_complexity(img_norm, grad))
         
         # 3. 边缘质量分析
-        analysis.update(ImageQualityAnalyzer._edge_quality(img_norm))
+        analysis.update(ImageQualityAnalyzer._edge_quality(img_norm, grad))
+        del grad
         
         # 4. 频域分析
         analysis.update(ImageQualityAnalyzer._frequency_analysis(img_norm))
@@ -115,15 +148,40 @@ class ImageQualityAnalyzer:
         }
     
     @staticmethod
-    def _texture_complexity(img: np.ndarray) -> Dict[str, float]:
-        """纹理复杂度分析 - 马赛克会导致纹理异常复杂"""
+    def _sobel_gradients(img: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """水平和垂直方向的Sobel梯度 (gx, gy)"""
+        return ndimage.sobel(img, axis=1), ndimage.sobel(img, axis=0)
+    
+    @staticmethod
+    def _local_variance(img: np.ndarray, size: int) -> np.ndarray:
+        """
+        局部窗口方差 E[x²] - E[x]²
+        
+        两次可分离的均值滤波，等价于 generic_filter(img, np.var, size)（边界同为reflect），
+        但不再逐像素回调Python函数
+        """
+        mean = ndimage.uniform_filter(img, size=size)
+        mean_sq = ndimage.uniform_filter(img * img, size=size)
+        local_var = mean_sq - mean * mean
+        # 舍入误差可能产生极小的负值
+        np.maximum(local_var, 0, out=local_var)
+        return local_var
+    
+    @staticmethod
+    def _texture_complexity(img: np.ndarray,
+                            grad: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Dict[str, float]:
+        """纹理复杂度分析 - 马赛克会导致纹理异常复杂
+        
+        Args:
+            img: 归一化图像
+            grad: 预先计算的Sobel梯度 (gx, gy)，为None时在此计算
+        """
         # 局部方差（窗口大小5x5）
-        local_var = ndimage.generic_filter(img, np.var, size=5)
+        local_var = ImageQualityAnalyzer._local_variance(img, 5)
         
         # 梯度幅值
-        gx = ndimage.sobel(img, axis=1)
-        gy = ndimage.sobel(img, axis=0)
-        grad_mag = np.sqrt(gx*gx + gy*gy)
+        gx, gy = grad if grad is not None else ImageQualityAnalyzer._sobel_gradients(img)
+        grad_mag = np.hypot(gx, gy)
         
         # 纹理能量（灰度共生矩阵的简化版本）
         # 计算水平和垂直方向的纹理变化
@@ -142,20 +200,25 @@ class ImageQualityAnalyzer:
         }
     
     @staticmethod
-    def _edge_quality(img: np.ndarray) -> Dict[str, float]:
-        """边缘质量分析"""
-        # Canny边缘检测
-        edges = feature.canny(img, sigma=1.0)
-        edge_density = np.sum(edges) / edges.size
+    def _edge_quality(img: np.ndarray,
+                      grad: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Dict[str, float]:
+        """边缘质量分析
+        
+        Args:
+            img: 归一化图像
+            grad: 预先计算的Sobel梯度 (gx, gy)，为None时在此计算
+        """
+        # Canny边缘检测（OpenCV实现，阈值与skimage.feature.canny默认值一致）
+        edges = EdgeProcessor.canny_mask(img.astype(np.float32, copy=False), 1.0, 0.1, 0.2)
+        edge_count = cv2.countNonZero(edges)
+        edge_density = edge_count / edges.size
         
-        # 边缘连续性（通过形态学操作评估）
-        from skimage import morphology
-        edge_dilated = morphology.dilation(edges, morphology.disk(2))
-        edge_continuity = np.sum(edge_dilated) / np.sum(edges) if np.sum(edges) > 0 else 0
+        # 边缘连续性（通过形态学膨胀评估，结构元素与skimage.morphology.disk(2)相同）
+        edge_dilated = cv2.dilate(edges, _DISK_2)
+        edge_continuity = cv2.countNonZero(edge_dilated) / edge_count if edge_count > 0 else 0
         
         # 梯度方向一致性
-        gx = ndimage.sobel(img, axis=1)
-        gy = ndimage.sobel(img, axis=0)
+        gx, gy = grad if grad is not None else ImageQualityAnalyzer._sobel_gradients(img)
         grad_angle = np.arctan2(gy, gx)
         
         # 计算梯度方向的局部一致性
@@ -173,37 +236,25 @@ class ImageQualityAnalyzer:
         """频域分析 - 马赛克会产生异常的高频成分"""
         # 对于大图像，进一步下采样以加速FFT
         if img.size > 500000:  # 500K像素以上再次下采样
-            from skimage import transform
             scale = np.sqrt(500000 / img.size)
             new_h = max(64, int(img.shape[0] * scale))  # 最小64像素
             new_w = max(64, int(img.shape[1] * scale))
-            img_small = transform.resize(img, (new_h, new_w), anti_aliasing=True, preserve_range=True)
+            img_small = cv2.resize(img.astype(np.float32, copy=False), (new_w, new_h),
+                                   interpolation=cv2.INTER_AREA)
         else:
             img_small = img
 
         # 2D FFT
         f_transform = fft.fft2(img_small)
         f_shift = fft.fftshift(f_transform)
-        magnitude = np.abs(f_shift)
-        
-        # 计算频域能量分布
-        h, w = img_small.shape
-        center_h, center_w = h // 2, w // 2
-        
-        # 创建频率掩码
-        y, x = np.ogrid[:h, :w]
-        dist_from_center = np.sqrt((x - center_w)**2 + (y - center_h)**2)
+        # 只需要能量，直接用实部和虚部的平方和，省去求模的开方
+        power = f_shift.real * f_shift.real
+        power += f_shift.imag * f_shift.imag
         
-        # 低频、中频、高频区域
-        max_dist = min(center_h, center_w)
-        low_freq_mask = dist_from_center <= max_dist * 0.1
-        mid_freq_mask = (dist_from_center > max_dist * 0.1) & (dist_from_center <= max_dist * 0.5)
-        high_freq_mask = dist_from_center > max_dist * 0.5
-        
-        total_energy = np.sum(magnitude**2)
-        low_freq_energy = np.sum(magnitude[low_freq_mask]**2) / total_energy
-        mid_freq_energy = np.sum(magnitude[mid_freq_mask]**2) / total_energy
-        high_freq_energy = np.sum(magnitude[high_freq_mask]**2) / total_energy
+        # 计算频域能量分布：按径向频带一次性累加（0低频、1中频、2高频）
+        bin_idx = _radial_bins(*img_small.shape)
+        sums = np.bincount(bin_idx, weights=power.ravel(), minlength=3)
+        low_freq_energy, mid_freq_energy, high_freq_energy = sums / sums.sum()
         
         return {
             'low_freq_energy': float(low_freq_energy),
@@ -212,33 +263,93 @@ class ImageQualityAnalyzer:
             'freq_energy_ratio': float(high_freq_energy / (low_freq_energy + 1e-8)),
         }
     
+    @staticmethod
+    def _split_blocks(img: np.ndarray, block_size: int) -> np.ndarray:
+        """
+        把图像切成不重叠的方块，返回形状为 (行块数, 列块数, block_size, block_size) 的视图
+        
+        不足一个整块的右侧和下侧边缘被丢弃
+        """
+        h_blocks = img.shape[0] // block_size
+        w_blocks = img.shape[1] // block_size
+        cropped = img[:h_blocks * block_size, :w_blocks * block_size]
+        return cropped.reshape(h_blocks, block_size, w_blocks, block_size).swapaxes(1, 2)
+    
+    @staticmethod
+    def _block_statistics(img: np.ndarray, block_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        不重叠方块的统计量
+        
+        Returns:
+            (块均值, 块内方差, 与下方相邻块的相关系数)；相关系数不含最后一行和最后一列块，
+            平坦块为NaN
+        """
+        h_blocks = img.shape[0] // block_size
+        w_blocks = img.shape[1] // block_size
+        
+        if block_stats is not None and img.ndim == 2:
+            # Numba内核：一次遍历算出全部统计量
+            means = np.empty((h_blocks, w_blocks))
+            variances = np.empty((h_blocks, w_blocks))
+            correlations = np.empty((max(h_blocks - 1, 0), max(w_blocks - 1, 0)))
+            block_stats(img, block_size, means, variances, correlations)
+            return means, variances, correlations
+        
+        blocks = ImageQualityAnalyzer._split_blocks(img, block_size)
+        means = blocks.mean(axis=(2, 3), dtype=np.float64)
+        variances = blocks.var(axis=(2, 3), dtype=np.float64)
+        
+        # 所有相邻块对的Pearson相关系数一次向量化计算
+        blocks = blocks.astype(np.float64)
+        upper = blocks[:-1, :-1]
+        lower = blocks[1:, :-1]
+        upper = upper - upper.mean(axis=(2, 3), keepdims=True)
+        lower = lower - lower.mean(axis=(2, 3), keepdims=True)
+        
+        cov = (upper * lower).sum(axis=(2, 3))
+        denom = np.sqrt((upper * upper).sum(axis=(2, 3)) * (lower * lower).sum(axis=(2, 3)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlations = np.clip(cov / denom, -1, 1)
+        return means, variances, correlations
+    
+    @staticmethod
+    def _pearson(a: np.ndarray, b: np.ndarray) -> float:
+        """
+        两个同形状二维视图的Pearson相关系数，等价于 np.corrcoef(a.flatten(), b.flatten())[0, 1]
+        
+        直接在视图上用einsum求和，不展平复制，也不构造2x2协方差矩阵；
+        任一方差为0时返回NaN
+        """
+        n = a.size
+        mean_a, mean_b = a.mean(), b.mean()
+        s_ab = np.einsum('ij,ij->', a, b) - n * mean_a * mean_b
+        s_aa = np.einsum('ij,ij->', a, a) - n * mean_a * mean_a
+        s_bb = np.einsum('ij,ij->', b, b) - n * mean_b * mean_b
+        if s_aa <= 0 or s_bb <= 0:
+            return np.nan
+        return float(s_ab / np.sqrt(s_aa * s_bb))
+    
     @staticmethod
     def _spatial_correlation(img: np.ndarray) -> Dict[str, float]:
         """空间相关性分析 - 检测块状效应"""
+        # 减去全局均值的float64副本，四组平移对共用（提高和式精度）
+        centered = img - np.float64(img.mean())
+        
         # 水平和垂直方向的自相关
-        h_corr = np.corrcoef(img[:-1].flatten(), img[1:].flatten())[0, 1]
-        v_corr = np.corrcoef(img[:, :-1].flatten(), img[:, 1:].flatten())[0, 1]
+        h_corr = ImageQualityAnalyzer._pearson(centered[:-1], centered[1:])
+        v_corr = ImageQualityAnalyzer._pearson(centered[:, :-1], centered[:, 1:])
         
         # 对角线相关性
-        d1_corr = np.corrcoef(img[:-1, :-1].flatten(), img[1:, 1:].flatten())[0, 1]
-        d2_corr = np.corrcoef(img[:-1, 1:].flatten(), img[1:, :-1].flatten())[0, 1]
-        
-        # 局部相关性变化（检测块状效应）
-        block_size = 8
-        h_blocks = img.shape[0] // block_size
-        w_blocks = img.shape[1] // block_size
+        d1_corr = ImageQualityAnalyzer._pearson(centered[:-1, :-1], centered[1:, 1:])
+        d2_corr = ImageQualityAnalyzer._pearson(centered[:-1, 1:], centered[1:, :-1])
+        del centered
         
-        block_correlations = []
-        for i in range(h_blocks - 1):
-            for j in range(w_blocks - 1):
-                block1 = img[i*block_size:(i+1)*block_size, j*block_size:(j+1)*block_size]
-                block2 = img[(i+1)*block_size:(i+2)*block_size, j*block_size:(j+1)*block_size]
-                if block1.size > 0 and block2.size > 0:
-                    corr = np.corrcoef(block1.flatten(), block2.flatten())[0, 1]
-                    if not np.isnan(corr):
-                        block_correlations.append(corr)
+        # 局部相关性变化（检测块状效应）：每个块与下方相邻块的相关系数
+        _, _, block_correlations = ImageQualityAnalyzer._block_statistics(img, 8)
+        # 平坦块的相关系数无定义，与原实现一样跳过
+        block_correlations = block_correlations[~np.isnan(block_correlations)]
         
-        block_corr_std = np.std(block_correlations) if block_correlations else 0
+        block_corr_std = np.std(block_correlations) if block_correlations.size else 0
         
         return {
             'horizontal_correlation': float(h_corr) if not np.isnan(h_corr) else 0.0,
@@ -252,24 +363,9 @@ class ImageQualityAnalyzer:
     def _mosaic_detection(img: np.ndarray) -> Dict[str, float]:
         """马赛克效应检测"""
         # 块状效应检测：计算8x8块的内部方差vs块间方差
-        block_size = 8
-        h_blocks = img.shape[0] // block_size
-        w_blocks = img.shape[1] // block_size
-        
-        intra_block_vars = []  # 块内方差
-        inter_block_vars = []  # 块间方差
-        
-        block_means = np.zeros((h_blocks, w_blocks))
-        
-        # 计算每个块的均值和内部方差
-        for i in range(h_blocks):
-            for j in range(w_blocks):
-                block = img[i*block_size:(i+1)*block_size, j*block_size:(j+1)*block_size]
-                block_mean = np.mean(block)
-                block_var = np.var(block)
-                
-                block_means[i, j] = block_mean
-                intra_block_vars.append(block_var)
+        # 一次计算所有块的均值和内部方差
+        block_means, intra_block_vars, _ = ImageQualityAnalyzer._block_statistics(img, 8)
+        h_blocks, w_blocks = block_means.shape
         
         # 计算块间方差
         if h_blocks > 1 and w_blocks > 1:
@@ -283,7 +379,7 @@ class ImageQualityAnalyzer:
         mosaic_index = avg_intra_var * (1 + inter_block_var)
         
         # 纹理不规律性：局部方差的方差
-        local_var = ndimage.generic_filter(img, np.var, size=3)
+        local_var = ImageQualityAnalyzer._local_variance(img, 3)
         texture_irregularity = np.var(local_var)
         
         return {
@@ -310,12 +406,22 @@ class ImageQualityAnalyzer:
             print(f"   ⚠️  检测到纹理异常不规律！")
 
 
+# 处理前后的质量分析只在调试时需要，通过环境变量启用
+ANALYSIS_ENABLED = os.environ.get('PYENHANCE_ANALYZE', '0') == '1'
+
+
 def image_analysis_decorator(func):
     """
     图像分析装饰器 - 自动分析处理前后的图像质量
+    
+    分析本身要跑数秒且处理前后各一次，默认关闭；
+    设置 PYENHANCE_ANALYZE=1 时启用，关闭时直接调用原函数
     """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        if not ANALYSIS_ENABLED:
+            return func(*args, **kwargs)
+        
         # 假设第一个参数是图像数据
         if len(args) > 0:
             input_image = args[0]
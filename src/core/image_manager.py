@@ -4,36 +4,77 @@
 import numpy as np
 import pydicom
 import os
+import time
 import warnings
-import uuid
-from typing import Optional, Tuple, List, Dict, Any
-from dataclasses import dataclass
+import itertools
+import weakref
+import cv2
+from types import MappingProxyType
+from typing import Optional, Tuple, List, Dict, Any, Mapping
+from dataclasses import dataclass, field
 from enum import Enum
-from .window_level_lut import get_global_lut
+from .window_level_lut import WindowLevelLUT, get_global_lut
+from ._gpu import HAS_CUDA, GPU_MIN_PIXELS, window_level_gpu
 
 # 过滤DICOM字符编码警告
 warnings.filterwarnings('ignore', category=UserWarning, message='Incorrect value for Specific Character Set')
 
+# cv2.minMaxLoc原生支持的类型（64位整数等会被错误转换）
+_MINMAX_DTYPES = (np.uint8, np.int8, np.uint16, np.int16, np.int32, np.float32, np.float64)
+
+
+def _min_max(data: np.ndarray) -> Tuple[float, float]:
+    """一次遍历求最小/最大值（OpenCV不支持的形状和类型用NumPy两次归约）"""
+    if data.ndim == 2 and data.dtype in _MINMAX_DTYPES:
+        return cv2.minMaxLoc(data)[:2]
+    return data.min(), data.max()
+
+
+# 提取为元数据的DICOM标签及其在元数据中的键名
+_META_KEYS = (
+    ('PatientName', 'patient_name'),
+    ('StudyDescription', 'study_description'),
+    ('SeriesDescription', 'series_description'),
+    ('ImageComments', 'image_comments'),
+)
+
+
 class ImageDataType(Enum):
     """图像数据类型"""
     ORIGINAL = "original"
     CURRENT = "current"
     PROCESSED = "processed"
 
-@dataclass
+@dataclass(slots=True)
 class ImageData:
-    """图像数据结构"""
+    """图像数据结构（使用__slots__，序列中保存大量切片时不为每个实例分配__dict__）"""
     data: np.ndarray  # 16位图像数据
-    metadata: Dict[str, Any]  # DICOM元数据
+    metadata: Mapping[str, Any]  # DICOM元数据（只读，各图像共用）
     window_width: float = 400.0
     window_level: float = 40.0
     name: str = "未命名图像"
     description: str = ""
-    id: str = ""  # 唯一标识符，用于比较对象
+    id: int = 0  # 唯一标识符，用于比较对象（0表示未分配）
+    
+    # 最小/最大值缓存，弱引用记录计算时的数组，data被替换后自动失效
+    _range_source: Optional[weakref.ref] = field(default=None, init=False, repr=False, compare=False)
+    _data_range: Tuple[int, int] = field(default=(0, 0), init=False, repr=False, compare=False)
+    
+    @property
+    def data_range(self) -> Tuple[int, int]:
+        """数据的最小/最大值，一次遍历同时求出并缓存"""
+        if self._range_source is None or self._range_source() is not self.data:
+            min_val, max_val = _min_max(self.data)
+            self._data_range = (int(min_val), int(max_val))
+            self._range_source = weakref.ref(self.data)
+        return self._data_range
 
 class ImageManager:
     """图像数据管理器"""
     
+    # 图像ID只用于相等比较，进程内递增计数即可保证唯一
+    _next_id = itertools.count(1)
+    
     def __init__(self):
         self.original_image: Optional[ImageData] = None
         self.current_image: Optional[ImageData] = None
@@ -42,63 +83,49 @@ class ImageManager:
         # 显示缓存 - 优化窗宽窗位调节性能
         self.original_display_cache: Optional[np.ndarray] = None
         self.current_display_cache: Optional[np.ndarray] = None
-        self.last_window_settings: Tuple[float, float] = (400.0, 40.0)
+        # 各显示缓存对应的 (窗宽, 窗位, 反相)
+        self._original_display_settings: Optional[Tuple[float, float, bool]] = None
+        self._current_display_settings: Optional[Tuple[float, float, bool]] = None
         
-        # 图像ID映射
-        self.original_image_id: Optional[str] = None
-        self.current_image_id: Optional[str] = None
+        # 已上传到显存的图像 {图像ID: (源数组, GpuMat)}，每张图只上传一次
+        self._gpu_images: Dict[int, Tuple[np.ndarray, Any]] = {}
         
     def load_dicom(self, file_path: str) -> bool:
         """加载DICOM文件"""
         try:
-            ds = pydicom.dcmread(file_path)
+            # 先只读元数据；未压缩的像素数据直接从文件读入数组
+            with open(file_path, 'rb') as f:
+                ds = pydicom.dcmread(f, stop_before_pixels=True)
+                pixel_array = self._read_native_pixels(f, ds)
+            
+            if pixel_array is None:
+                # 压缩传输语法、多帧等情况交给pydicom完整解码
+                ds = pydicom.dcmread(file_path)
+                if 'PixelData' in ds:
+                    pixel_array = ds.pixel_array
             
             # 获取像素数据
-            if hasattr(ds, 'pixel_array'):
-                pixel_array = ds.pixel_array
+            if pixel_array is not None:
                 
                 # 确保数据是16位的
-                if pixel_array.dtype != np.uint16:
+                if pixel_array.dtype == np.uint8:
+                    # 8位数据范围已知，转换后原地左移8位（等价于乘256），不需要先求最大值
+                    pixel_array = pixel_array.astype(np.uint16)
+                    pixel_array <<= 8
+                elif pixel_array.dtype != np.uint16:
                     if pixel_array.max() <= 255:
                         pixel_array = (pixel_array * 256).astype(np.uint16)
                     else:
                         pixel_array = pixel_array.astype(np.uint16)
                 
-                # 提取元数据
-                metadata = {}
-                if hasattr(ds, 'PatientName'):
-                    metadata['patient_name'] = str(ds.PatientName)
-                if hasattr(ds, 'StudyDescription'):
-                    metadata['study_description'] = str(ds.StudyDescription)
-                if hasattr(ds, 'SeriesDescription'):
-                    metadata['series_description'] = str(ds.SeriesDescription)
-                if hasattr(ds, 'ImageComments'):
-                    metadata['image_comments'] = str(ds.ImageComments)
-                
-                # 读取窗宽窗位信息
-                window_width = 400.0
-                window_level = 40.0
-                
-                # 尝试从DICOM文件中读取窗宽窗位
-                if hasattr(ds, 'WindowWidth') and hasattr(ds, 'WindowCenter'):
-                    try:
-                        # 处理多个窗宽窗位值的情况
-                        if isinstance(ds.WindowWidth, (list, tuple, np.ndarray)):
-                            window_width = float(ds.WindowWidth[0])
-                        else:
-                            window_width = float(ds.WindowWidth)
-                        
-                        if isinstance(ds.WindowCenter, (list, tuple, np.ndarray)):
-                            window_level = float(ds.WindowCenter[0])
-                        else:
-                            window_level = float(ds.WindowCenter)
-                    except (IndexError, ValueError, TypeError):
-                        # 如果读取失败，使用自动计算的值
-                        pass
+                # 提取元数据和文件中的窗宽窗位
+                metadata = self._extract_metadata(ds)
+                window_width = metadata['window_width']
+                window_level = metadata['window_level']
                 
                 # 如果没有有效的窗宽窗位，根据数据范围自动计算
                 if window_width <= 0 or window_level <= 0:
-                    data_min, data_max = pixel_array.min(), pixel_array.max()
+                    data_min, data_max = _min_max(pixel_array)
                     window_width = data_max - data_min
                     window_level = (data_min + data_max) / 2
                 
@@ -110,8 +137,14 @@ class ImageManager:
                 metadata['window_width'] = window_width
                 metadata['window_level'] = window_level
                 
+                # 元数据填好后不再修改，冻结为只读视图，原始图像和当前图像共用
+                metadata = MappingProxyType(metadata)
+                
+                # 原始图像和当前图像共用同一只读数组：当前图像在处理后整体替换，
+                # 从不原地修改（提交给处理线程的任务数据同样只读），不需要加载时再复制一份
+                pixel_array.setflags(write=False)
+                
                 # 创建图像数据对象
-                image_id = str(uuid.uuid4())
                 image_data = ImageData(
                     data=pixel_array,
                     metadata=metadata,
@@ -119,30 +152,26 @@ class ImageManager:
                     window_level=window_level,
                     name=os.path.basename(file_path),
                     description=f"从 {file_path} 加载的DICOM图像",
-                    id=image_id
+                    id=next(self._next_id)
                 )
                 
                 # 设置原始图像和当前图像
                 self.original_image = image_data
-                self.original_image_id = image_id
-                
-                current_image_id = str(uuid.uuid4())
                 self.current_image = ImageData(
-                    data=pixel_array.copy(),
-                    metadata=metadata.copy(),
+                    data=pixel_array,
+                    metadata=metadata,
                     window_width=image_data.window_width,
                     window_level=image_data.window_level,
                     name=image_data.name,
                     description=image_data.description,
-                    id=current_image_id
+                    id=next(self._next_id)
                 )
-                self.current_image_id = current_image_id
                 
                 # 清空处理历史
                 self.processing_history = []
                 
-                # 初始化显示缓存
-                self._refresh_display_cache()
+                # 清空显示缓存，首次显示时再计算
+                self._invalidate_display_cache()
                 
                 return True
                 
@@ -150,24 +179,135 @@ class ImageManager:
             print(f"加载DICOM文件失败: {e}")
             return False
     
+    @staticmethod
+    def load_dicom_metadata(file_path: str) -> Optional[Dict[str, Any]]:
+        """只读取DICOM元数据，不读取和解码像素数据
+        
+        用于文件列表、窗宽窗位初始化等只需要元数据的场合，比load_dicom快一到两个数量级。
+        文件中没有有效窗宽窗位时返回默认值；按数据范围自动计算需要像素数据，由load_dicom完成
+        
+        Args:
+            file_path: DICOM文件路径
+            
+        Returns:
+            Optional[Dict[str, Any]]: 元数据（含window_width、window_level），读取失败时为None
+        """
+        try:
+            ds = pydicom.dcmread(file_path, stop_before_pixels=True)
+        except Exception as e:
+            print(f"读取DICOM元数据失败: {e}")
+            return None
+        return ImageManager._extract_metadata(ds)
+    
+    @staticmethod
+    def _extract_metadata(ds) -> Dict[str, Any]:
+        """提取描述信息和文件中的窗宽窗位（缺失或无法解析时为默认值400/40）"""
+        # 提取元数据（ds.get每个标签只查找一次）
+        metadata = {}
+        for keyword, key in _META_KEYS:
+            value = ds.get(keyword)
+            if value is not None:
+                metadata[key] = str(value)
+        
+        # 读取窗宽窗位信息
+        window_width = 400.0
+        window_level = 40.0
+        
+        # 尝试从DICOM文件中读取窗宽窗位
+        ds_width = ds.get('WindowWidth')
+        ds_center = ds.get('WindowCenter')
+        if ds_width is not None and ds_center is not None:
+            try:
+                # 处理多个窗宽窗位值的情况
+                if isinstance(ds_width, (list, tuple, np.ndarray)):
+                    window_width = float(ds_width[0])
+                else:
+                    window_width = float(ds_width)
+                
+                if isinstance(ds_center, (list, tuple, np.ndarray)):
+                    window_level = float(ds_center[0])
+                else:
+                    window_level = float(ds_center)
+            except (IndexError, ValueError, TypeError):
+                # 如果读取失败，使用自动计算的值
+                pass
+        
+        metadata['window_width'] = window_width
+        metadata['window_level'] = window_level
+        return metadata
+    
+    @staticmethod
+    def _read_native_pixels(f, ds) -> Optional[np.ndarray]:
+        """直接读取未压缩的单帧灰度像素数据
+        
+        从dcmread(stop_before_pixels=True)停下的位置解析PixelData元素头，
+        用np.fromfile读入一个数组，省去pydicom先读出字节串再转换为数组的额外拷贝。
+        结果与ds.pixel_array一致（未用高位的处理方式相同）
+        
+        Args:
+            f: 已定位到PixelData元素的文件对象
+            ds: 只含元数据的数据集
+            
+        Returns:
+            Optional[np.ndarray]: 像素数组；不适用时返回None，由调用方走pydicom解码
+        """
+        transfer_syntax = ds.file_meta.get('TransferSyntaxUID')
+        if transfer_syntax not in (pydicom.uid.ExplicitVRLittleEndian,
+                                   pydicom.uid.ImplicitVRLittleEndian):
+            return None
+        bits_allocated = ds.get('BitsAllocated')
+        if (bits_allocated not in (8, 16) or ds.get('SamplesPerPixel', 1) != 1
+                or int(ds.get('NumberOfFrames', 1) or 1) != 1):
+            return None
+        
+        # PixelData元素头：隐式VR为tag+长度(8字节)，显式VR的OB/OW为tag+VR+保留+长度(12字节)
+        explicit_vr = transfer_syntax == pydicom.uid.ExplicitVRLittleEndian
+        header = f.read(12 if explicit_vr else 8)
+        if len(header) < 8 or header[:4] != b'\xe0\x7f\x10\x00':
+            return None
+        length = int.from_bytes(header[-4:], 'little')
+        
+        rows, columns = int(ds.Rows), int(ds.Columns)
+        signed = ds.get('PixelRepresentation', 0) == 1
+        dtype = np.dtype(('<i' if signed else '<u') + str(bits_allocated // 8))
+        count = rows * columns
+        # 长度未定义(0xFFFFFFFF)为封装数据；8位奇数长度末尾有填充字节
+        if length == 0xFFFFFFFF or length < count * dtype.itemsize:
+            return None
+        
+        pixel_array = np.fromfile(f, dtype=dtype, count=count)
+        if pixel_array.size != count:
+            return None
+        pixel_array = pixel_array.reshape(rows, columns)
+        
+        # 与pydicom一致：无符号数据屏蔽未用高位，有符号数据按BitsStored符号扩展
+        bits_stored = int(ds.get('BitsStored', bits_allocated))
+        if bits_stored < bits_allocated:
+            if signed:
+                shift = bits_allocated - bits_stored
+                pixel_array <<= shift
+                pixel_array >>= shift
+            else:
+                pixel_array &= (1 << bits_stored) - 1
+        
+        return pixel_array
+    
     def reset_to_original(self):
         """重置为原始图像"""
         if self.original_image:
-            current_image_id = str(uuid.uuid4())
             self.current_image = ImageData(
-                data=self.original_image.data.copy(),
-                metadata=self.original_image.metadata.copy(),
+                data=self.original_image.data,
+                metadata=self.original_image.metadata,
                 window_width=self.original_image.window_width,
                 window_level=self.original_image.window_level,
                 name=self.original_image.name,
                 description=self.original_image.description,
-                id=current_image_id
+                id=next(self._next_id)
             )
-            self.current_image_id = current_image_id
             self.processing_history = []
             
-            # 重置显示缓存
-            self._refresh_display_cache()
+            # 清空显示缓存
+            self._invalidate_display_cache()
     
     def apply_processing(self, algorithm_name: str, parameters: Dict[str, Any], 
                         processed_data: np.ndarray, description: str = ""):
@@ -183,11 +323,11 @@ class ImageManager:
         # 清除当前图像的显示缓存（数据已改变）
         self.current_display_cache = None
         
-        # 添加到处理历史
+        # 添加到处理历史（时间戳为纳秒整数，显示时再用datetime.fromtimestamp转换）
         self.processing_history.append({
             'algorithm': algorithm_name,
             'parameters': parameters,
-            'timestamp': np.datetime64('now'),
+            'timestamp': time.time_ns(),
             'description': description
         })
         
@@ -203,28 +343,35 @@ class ImageManager:
         if image_data is None:
             return np.zeros((100, 100), dtype=np.uint8)
 
-        # 检查是否使用缓存（包括反相状态）
-        current_settings = (image_data.window_width, image_data.window_level, invert)
-        if current_settings == self.last_window_settings:
-            # 返回缓存的显示数据
-            if image_data.id == self.original_image_id and self.original_display_cache is not None:
-                return self.original_display_cache
-            elif image_data.id == self.current_image_id and self.current_display_cache is not None:
-                return self.current_display_cache
-
-        # 重新计算显示数据
-        display_data = self._calculate_windowed_display(image_data, invert)
-
-        # 更新缓存（不需要copy，显示数据是只读的）
-        if image_data.id == self.original_image_id:
-            self.original_display_cache = display_data
-        elif image_data.id == self.current_image_id:
-            self.current_display_cache = display_data
-
-        # 更新最后使用的窗宽窗位设置
-        self.last_window_settings = current_settings
-
-        return display_data
+        # 原始图像和当前图像各自缓存显示数据，按对象身份和各自的显示设置判断是否命中；
+        # 设置按查找表缓存键量化，拖动滑块时落在同一张查找表上的微小变化不重新计算
+        settings = WindowLevelLUT.cache_key(image_data.window_width, image_data.window_level, invert)
+        if image_data is self.original_image:
+            if self.original_display_cache is None or self._original_display_settings != settings:
+                self.original_display_cache = self._windowed_display_shared(
+                    image_data, settings, self.current_image, self.current_display_cache,
+                    self._current_display_settings)
+                self._original_display_settings = settings
+            return self.original_display_cache
+        
+        if image_data is self.current_image:
+            if self.current_display_cache is None or self._current_display_settings != settings:
+                self.current_display_cache = self._windowed_display_shared(
+                    image_data, settings, self.original_image, self.original_display_cache,
+                    self._original_display_settings)
+                self._current_display_settings = settings
+            return self.current_display_cache
+        
+        return self._calculate_windowed_display(image_data, invert)
+    
+    def _windowed_display_shared(self, image_data: ImageData, settings: tuple,
+                                 other: Optional[ImageData], other_cache: Optional[np.ndarray],
+                                 other_settings: Optional[tuple]) -> np.ndarray:
+        """计算显示数据；另一幅图像共用同一数组且设置相同时直接复用其缓存（显示数据只读）"""
+        if (other is not None and other.data is image_data.data
+                and other_cache is not None and other_settings == settings):
+            return other_cache
+        return self._calculate_windowed_display(image_data, settings[2])
     
     def _calculate_windowed_display(self, image_data: ImageData, invert: bool = False) -> np.ndarray:
         """计算窗宽窗位显示数据 - 使用LUT优化
@@ -237,15 +384,40 @@ class ImageManager:
         window_width = image_data.window_width
         window_level = image_data.window_level
 
-        # 使用LUT优化的窗宽窗位计算
-        lut = get_global_lut()
-        windowed_data = lut.apply_lut(data, window_width, window_level)
-
-        # 如果启用反相，对显示数据进行反相
-        if invert:
-            windowed_data = 255 - windowed_data
+        # 有可用GPU时大图在显存中加窗，只下载8位结果
+        if (HAS_CUDA and data.dtype == np.uint16 and data.ndim == 2
+                and data.size > GPU_MIN_PIXELS and window_width > 0):
+            try:
+                return window_level_gpu(self._get_gpu_image(image_data),
+                                        window_width, window_level, invert)
+            except cv2.error as e:
+                print(f"CUDA窗宽窗位失败，回退到CPU: {e}")
 
-        return windowed_data
+        # 使用LUT优化的窗宽窗位计算，反相已做进查找表，只需一次查表
+        lut = get_global_lut()
+        return lut.apply_lut(data, window_width, window_level, invert)
+
+    def _get_gpu_image(self, image_data: ImageData):
+        """取图像在显存中的副本，数据数组被替换后重新上传"""
+        cached = self._gpu_images.get(image_data.id)
+        if cached is not None and cached[0] is image_data.data:
+            return cached[1]
+
+        # 原始图像和当前图像共用数组时复用同一份显存副本
+        for source, gpu_data in self._gpu_images.values():
+            if source is image_data.data:
+                self._gpu_images[image_data.id] = (source, gpu_data)
+                return gpu_data
+
+        gpu_data = cv2.cuda_GpuMat()
+        gpu_data.upload(image_data.data)
+
+        # 只保留原始图像和当前图像的显存副本
+        keep_ids = {image.id for image in (self.original_image, self.current_image) if image is not None}
+        self._gpu_images = {image_id: entry for image_id, entry in self._gpu_images.items()
+                            if image_id in keep_ids}
+        self._gpu_images[image_data.id] = (image_data.data, gpu_data)
+        return gpu_data
 
     def calculate_smart_slider_ranges(self, image_data: ImageData) -> tuple:
         """计算智能滑块范围
@@ -267,7 +439,7 @@ class ImageManager:
         effective_min, effective_max = self._detect_effective_range(data)
 
         print(f"🎯 智能范围计算:")
-        print(f"   原始数据范围: {data.min()} - {data.max()}")
+        print(f"   原始数据范围: {image_data.data_range[0]} - {image_data.data_range[1]}")
         print(f"   有效数据范围: {effective_min:.1f} - {effective_max:.1f}")
         print(f"   当前窗宽窗位: {current_ww:.1f}, {current_wl:.1f}")
 
@@ -325,12 +497,22 @@ class ImageManager:
         Returns:
             tuple: (effective_min, effective_max)
         """
-        data_min = int(data.min())
-        data_max = int(data.max())
         total_pixels = data.size
 
         # 计算直方图
-        hist, bins = np.histogram(data.flatten(), bins=65536, range=(data_min, data_max))
+        if data.dtype in (np.uint8, np.uint16):
+            # 整数数据先按灰度值计数（一次线性遍历），再把出现过的灰度值按计数加权分箱：
+            # 分箱规则与直接对全图做np.histogram完全相同，但只处理最多65536个值
+            counts = np.bincount(data.ravel())
+            values = np.flatnonzero(counts)
+            data_min = int(values[0])
+            data_max = int(values[-1])
+            hist, bins = np.histogram(values, bins=65536, range=(data_min, data_max),
+                                      weights=counts[values])
+        else:
+            data_min = int(data.min())
+            data_max = int(data.max())
+            hist, bins = np.histogram(data.ravel(), bins=65536, range=(data_min, data_max))
         bin_centers = 0.5 * (bins[:-1] + bins[1:])
 
         # 检测过曝峰值（与自动优化算法相同的逻辑）
@@ -384,25 +566,24 @@ class ImageManager:
 
         return effective_min, effective_max
 
-    def _refresh_display_cache(self):
-        """刷新显示缓存"""
-        if self.original_image:
-            self.original_display_cache = self._calculate_windowed_display(self.original_image)
-        if self.current_image:
-            self.current_display_cache = self._calculate_windowed_display(self.current_image)
+    def _invalidate_display_cache(self):
+        """清空显示缓存
+
+        不预先计算：界面加载后立即按自己的反相状态请求显示数据，随后自动窗宽窗位
+        又会改变设置，预先按默认设置算出的显示数据多半用不上
+        """
+        self.original_display_cache = None
+        self.current_display_cache = None
     
     def update_window_settings(self, window_width: float, window_level: float):
-        """更新窗宽窗位设置 - 优化版本，只更新必要的缓存"""
+        """更新窗宽窗位设置
+
+        显示缓存按量化后的设置判断是否命中，这里不清除缓存：
+        设置落在同一张查找表上时get_windowed_image直接复用缓存
+        """
         if self.current_image:
-            # 只有当窗宽窗位真的改变时才更新
-            if (self.current_image.window_width != window_width or 
-                self.current_image.window_level != window_level):
-                
-                self.current_image.window_width = window_width
-                self.current_image.window_level = window_level
-                
-                # 清除当前图像的显示缓存（强制重新计算）
-                self.current_display_cache = None
+            self.current_image.window_width = window_width
+            self.current_image.window_level = window_level
     
     def get_current_state(self) -> Dict[str, Any]:
         """获取当前状态信息"""
@@ -7,7 +7,8 @@
 
 import numpy as np
 import time
-import uuid
+from collections import deque
+from itertools import count
 from typing import Dict, Any, Optional, Callable
 from PyQt6.QtCore import QThread, QMutex, QWaitCondition, pyqtSignal, QObject
 from dataclasses import dataclass
@@ -43,7 +44,7 @@ class ProcessingTask:
     
     def __post_init__(self):
         if self.created_time == 0.0:
-            self.created_time = time.time()
+            self.created_time = time.monotonic()
 
 
 class ImageProcessingThread(QThread):
@@ -54,7 +55,7 @@ class ImageProcessingThread(QThread):
     
     # 信号定义
     task_started = pyqtSignal(str)  # task_id
-    task_progress = pyqtSignal(str, float)  # task_id, progress
+    task_progress = pyqtSignal(str, float)  # task_id, progress（已不再逐次发出，界面改用get_progress_snapshot轮询）
     task_completed = pyqtSignal(str, object, str)  # task_id, result_data, description
     task_failed = pyqtSignal(str, str)  # task_id, error_message
     queue_status_changed = pyqtSignal(int, int)  # pending_count, total_count
@@ -71,10 +72,18 @@ class ImageProcessingThread(QThread):
         self.is_running = True
         self.is_paused = False
         
-        # 任务队列和同步
-        self.task_queue = []
-        self.completed_tasks = []
+        # 任务队列和同步（有界双端队列：超出长度时自动丢弃最旧的任务）
+        self.max_queue_size = 100  # 最大队列长度
+        self.task_queue = deque(maxlen=self.max_queue_size)
+        self.completed_tasks = deque(maxlen=50)
+        # 待处理任务按ID索引：取消时只做标记，已取消的任务出队时跳过
+        self.pending_tasks: Dict[str, ProcessingTask] = {}
         self.current_task: Optional[ProcessingTask] = None
+        # 任务ID只在本进程内使用，递增计数即可保证唯一（next在GIL下是原子的）
+        self._task_counter = count(1)
+        # 运行中任务的最新进度：回调只覆盖写入，界面定时器按固定频率读取，
+        # 算法回调再频繁也不会产生跨线程信号
+        self._latest_progress: Dict[str, float] = {}
         self.mutex = QMutex()
         self.condition = QWaitCondition()
         
@@ -84,7 +93,29 @@ class ImageProcessingThread(QThread):
         # 性能统计
         self.total_tasks_processed = 0
         self.total_processing_time = 0.0
-        self.max_queue_size = 100  # 最大队列长度
+        
+        # 算法分派表：算法名 -> (处理方法, 依次传入的参数名, 是否自己汇报进度)
+        processor = self.processor
+        self.algorithms = {
+            'gamma_correction': (processor.gamma_correction, ('gamma',), False),
+            'histogram_equalization': (processor.histogram_equalization, ('method',), False),
+            'gaussian_filter': (processor.gaussian_filter, ('sigma',), False),
+            'median_filter': (processor.median_filter, ('disk_size',), False),
+            'unsharp_mask': (processor.unsharp_mask, ('radius', 'amount'), False),
+            'morphological_operation': (processor.morphological_operation, ('operation', 'disk_size'), False),
+            'dicom_basic_enhance': (processor.dicom_basic_enhance, (), False),
+            'dicom_advanced_enhance': (processor.dicom_advanced_enhance, (), False),
+            'dicom_super_enhance': (processor.dicom_super_enhance, (), False),
+            'dicom_auto_enhance': (processor.dicom_auto_enhance, (), False),
+            'window_based_enhance': (processor.window_based_enhance, ('window_width', 'window_level'), False),
+            'paper_enhance': (processor.paper_enhance, (), True),
+            'paper_enhance_cpp': (processor.paper_enhance_cpp, (), True),
+        }
+        
+        # 任务未提供时使用的参数
+        self.default_parameters = {
+            'window_based_enhance': {'window_width': 1500, 'window_level': 2500},
+        }
         
         # 进度回调映射
         self.progress_callbacks = {
@@ -103,46 +134,56 @@ class ImageProcessingThread(QThread):
         }
     
     def add_task(self, algorithm_name: str, parameters: Dict[str, Any], 
-                 image_data: np.ndarray, description: str = "") -> str:
+                 image_data: np.ndarray, description: str = "", own: bool = True) -> str:
         """添加处理任务到队列
         
+        默认由任务接管image_data：数组被设为只读后直接引用，不再复制，
+        提交后调用方不能再原地修改它（图像管理器的数据本来就只整体替换）
+        
         Args:
             algorithm_name: 算法名称
             parameters: 算法参数
             image_data: 图像数据
             description: 任务描述
+            own: 为False时复制一份数据，调用方之后还要原地修改数组时使用
             
         Returns:
-            str: 任务ID
+            str: 任务ID（形如"t1"，本线程对象内唯一）
         """
-        task_id = str(uuid.uuid4())
+        task_id = f"t{next(self._task_counter)}"
+        
+        if own:
+            # 只读标记让算法误写输入时立即报错，而不是悄悄改坏界面显示的图像
+            image_data.setflags(write=False)
+        else:
+            image_data = image_data.copy()
         
         task = ProcessingTask(
             task_id=task_id,
             algorithm_name=algorithm_name,
             parameters=parameters,
-            image_data=image_data.copy(),  # 复制数据避免并发问题
+            image_data=image_data,
             description=description
         )
         
         self.mutex.lock()
         try:
-            # 检查队列大小限制
-            if len(self.task_queue) >= self.max_queue_size:
-                # 移除最旧的待处理任务
-                self.task_queue.pop(0)
-            
+            # 队列已满时append自动移除最旧的任务，同时从索引中去掉
+            if len(self.task_queue) == self.task_queue.maxlen:
+                self.pending_tasks.pop(self.task_queue[0].task_id, None)
             self.task_queue.append(task)
+            self.pending_tasks[task_id] = task
             self.condition.wakeOne()  # 唤醒处理线程
             
-            # 发出队列状态变化信号
-            pending_count = len(self.task_queue)
+            pending_count = len(self.pending_tasks)
             total_count = pending_count + len(self.completed_tasks)
-            self.queue_status_changed.emit(pending_count, total_count)
             
         finally:
             self.mutex.unlock()
         
+        # 解锁后再发出队列状态变化信号（同线程的槽函数会直接执行，可能再次查询队列状态）
+        self.queue_status_changed.emit(pending_count, total_count)
+        
         return task_id
     
     def cancel_task(self, task_id: str) -> bool:
@@ -156,12 +197,11 @@ class ImageProcessingThread(QThread):
         """
         self.mutex.lock()
         try:
-            # 查找并移除待处理任务
-            for i, task in enumerate(self.task_queue):
-                if task.task_id == task_id:
-                    task.status = TaskStatus.CANCELLED
-                    self.task_queue.pop(i)
-                    return True
+            # 待处理任务只做标记，出队时跳过
+            task = self.pending_tasks.pop(task_id, None)
+            if task is not None:
+                task.status = TaskStatus.CANCELLED
+                return True
             
             # 检查是否是当前正在处理的任务
             if self.current_task and self.current_task.task_id == task_id:
@@ -180,12 +220,14 @@ class ImageProcessingThread(QThread):
             for task in self.task_queue:
                 task.status = TaskStatus.CANCELLED
             self.task_queue.clear()
-            
-            # 发出队列状态变化信号
-            self.queue_status_changed.emit(0, len(self.completed_tasks))
+            self.pending_tasks.clear()
+            completed_count = len(self.completed_tasks)
             
         finally:
             self.mutex.unlock()
+        
+        # 发出队列状态变化信号
+        self.queue_status_changed.emit(0, completed_count)
     
     def pause_processing(self):
         """暂停处理"""
@@ -214,7 +256,7 @@ class ImageProcessingThread(QThread):
         self.mutex.lock()
         try:
             return {
-                'pending_tasks': len(self.task_queue),
+                'pending_tasks': len(self.pending_tasks),
                 'completed_tasks': len(self.completed_tasks),
                 'current_task': self.current_task.task_id if self.current_task else None,
                 'is_running': self.is_running,
@@ -226,24 +268,39 @@ class ImageProcessingThread(QThread):
         finally:
             self.mutex.unlock()
     
+    def get_progress_snapshot(self) -> Dict[str, float]:
+        """获取运行中任务的最新进度
+        
+        Returns:
+            Dict: 任务ID -> 进度(0-1)
+        """
+        self.mutex.lock()
+        try:
+            return dict(self._latest_progress)
+        finally:
+            self.mutex.unlock()
+    
     def run(self):
         """线程主循环"""
         while self.is_running:
             # 等待任务或暂停状态
             self.mutex.lock()
             
-            while (len(self.task_queue) == 0 or self.is_paused) and self.is_running:
+            while (len(self.pending_tasks) == 0 or self.is_paused) and self.is_running:
                 self.condition.wait(self.mutex, 100)  # 100ms超时
             
             if not self.is_running:
                 self.mutex.unlock()
                 break
             
-            # 获取下一个任务
-            if len(self.task_queue) > 0:
-                self.current_task = self.task_queue.pop(0)
-            else:
-                self.current_task = None
+            # 获取下一个未取消的任务
+            self.current_task = None
+            while self.task_queue:
+                task = self.task_queue.popleft()
+                if self.pending_tasks.pop(task.task_id, None) is not None:
+                    self.current_task = task
+                    break
+            if self.current_task is None:
                 self.mutex.unlock()
                 continue
             
@@ -255,20 +312,18 @@ class ImageProcessingThread(QThread):
                 
                 # 移动到完成列表
                 self.mutex.lock()
+                self._latest_progress.pop(self.current_task.task_id, None)
+                # 完成列表最多保留50个，超出时自动丢弃最旧的
                 self.completed_tasks.append(self.current_task)
                 
-                # 限制完成任务列表大小
-                if len(self.completed_tasks) > 50:
-                    self.completed_tasks.pop(0)
-                
                 self.current_task = None
                 
-                # 发出队列状态变化信号
-                pending_count = len(self.task_queue)
+                pending_count = len(self.pending_tasks)
                 total_count = pending_count + len(self.completed_tasks)
-                self.queue_status_changed.emit(pending_count, total_count)
-                
                 self.mutex.unlock()
+                
+                # 发出队列状态变化信号
+                self.queue_status_changed.emit(pending_count, total_count)
     
     def _process_task(self, task: ProcessingTask):
         """处理单个任务
@@ -278,7 +333,7 @@ class ImageProcessingThread(QThread):
         """
         try:
             task.status = TaskStatus.RUNNING
-            task.start_time = time.time()
+            task.start_time = time.monotonic()
             
             # 发出任务开始信号
             self.task_started.emit(task.task_id)
@@ -291,12 +346,14 @@ class ImageProcessingThread(QThread):
             
             task.result = result
             task.status = TaskStatus.COMPLETED
-            task.end_time = time.time()
+            task.end_time = time.monotonic()
             
-            # 更新统计信息
+            # 更新统计信息（get_queue_status在界面线程读取，只在累加时短暂加锁）
             processing_time = task.end_time - task.start_time
+            self.mutex.lock()
             self.total_processing_time += processing_time
             self.total_tasks_processed += 1
+            self.mutex.unlock()
             
             # 发出完成信号
             self.task_completed.emit(task.task_id, result, task.description)
@@ -304,7 +361,7 @@ class ImageProcessingThread(QThread):
         except Exception as e:
             task.status = TaskStatus.FAILED
             task.error_message = str(e)
-            task.end_time = time.time()
+            task.end_time = time.monotonic()
             
             # 发出失败信号
             self.task_failed.emit(task.task_id, str(e))
@@ -319,99 +376,33 @@ class ImageProcessingThread(QThread):
             np.ndarray: 处理结果
         """
         algorithm_name = task.algorithm_name
-        parameters = task.parameters
-        data = task.image_data
+        entry = self.algorithms.get(algorithm_name)
+        if entry is None:
+            raise ValueError(f"未知算法: {algorithm_name}")
+        method, parameter_names, reports_progress = entry
+        
+        # 任务参数覆盖默认参数，按参数名依次取出
+        parameters = {**self.default_parameters.get(algorithm_name, {}), **task.parameters}
+        args = [parameters[name] for name in parameter_names]
         
         # 获取进度回调
         progress_callback = self.progress_callbacks.get(algorithm_name, self._default_progress)
         
         # 执行算法
-        if algorithm_name == 'gamma_correction':
-            return self._execute_with_progress(
-                lambda: self.processor.gamma_correction(data, parameters['gamma']),
-                task, progress_callback
-            )
-        elif algorithm_name == 'histogram_equalization':
-            return self._execute_with_progress(
-                lambda: self.processor.histogram_equalization(data, parameters['method']),
-                task, progress_callback
-            )
-        elif algorithm_name == 'gaussian_filter':
-            return self._execute_with_progress(
-                lambda: self.processor.gaussian_filter(data, parameters['sigma']),
-                task, progress_callback
-            )
-        elif algorithm_name == 'median_filter':
-            return self._execute_with_progress(
-                lambda: self.processor.median_filter(data, parameters['disk_size']),
-                task, progress_callback
-            )
-        elif algorithm_name == 'unsharp_mask':
-            return self._execute_with_progress(
-                lambda: self.processor.unsharp_mask(data, parameters['radius'], parameters['amount']),
-                task, progress_callback
-            )
-        elif algorithm_name == 'morphological_operation':
-            return self._execute_with_progress(
-                lambda: self.processor.morphological_operation(
-                    data, parameters['operation'], parameters['disk_size']),
-                task, progress_callback
-            )
-        elif algorithm_name == 'dicom_basic_enhance':
-            return self._execute_with_progress(
-                lambda: self.processor.dicom_basic_enhance(data),
-                task, progress_callback
-            )
-        elif algorithm_name == 'dicom_advanced_enhance':
-            return self._execute_with_progress(
-                lambda: self.processor.dicom_advanced_enhance(data),
-                task, progress_callback
-            )
-        elif algorithm_name == 'dicom_super_enhance':
-            return self._execute_with_progress(
-                lambda: self.processor.dicom_super_enhance(data),
-                task, progress_callback
-            )
-        elif algorithm_name == 'dicom_auto_enhance':
-            return self._execute_with_progress(
-                lambda: self.processor.dicom_auto_enhance(data),
-                task, progress_callback
-            )
-        elif algorithm_name == 'window_based_enhance':
-            # 从参数中获取窗宽窗位设置
-            window_width = parameters.get('window_width', 1500)
-            window_level = parameters.get('window_level', 2500)
-            return self._execute_with_progress(
-                lambda: self.processor.window_based_enhance(data, window_width, window_level),
-                task, progress_callback
-            )
-        elif algorithm_name == 'paper_enhance':
-            # 为论文算法提供进度回调支持
-            def paper_enhance_with_progress():
-                def progress_wrapper(progress):
-                    progress_callback(task, progress)
-                return self.processor.paper_enhance(data, progress_wrapper)
-
-            return paper_enhance_with_progress()
-        elif algorithm_name == 'paper_enhance_cpp':
-            # 为C++加速论文算法提供进度回调支持
-            def paper_enhance_cpp_with_progress():
-                def progress_wrapper(progress):
-                    progress_callback(task, progress)
-                return self.processor.paper_enhance_cpp(data, progress_wrapper)
-
-            return paper_enhance_cpp_with_progress()
-        else:
-            raise ValueError(f"未知算法: {algorithm_name}")
+        if reports_progress:
+            # 论文算法自己汇报进度
+            return method(task.image_data, *args, lambda progress: progress_callback(task, progress))
+        return self._execute_with_progress(method, task, progress_callback, task.image_data, *args)
     
     def _execute_with_progress(self, algorithm_func: Callable, task: ProcessingTask, 
-                              progress_callback: Callable) -> np.ndarray:
+                              progress_callback: Callable, *args) -> np.ndarray:
         """带进度反馈的算法执行
         
         Args:
             algorithm_func: 算法函数
             task: 处理任务
             progress_callback: 进度回调函数
+            *args: 传给算法函数的参数
             
         Returns:
             np.ndarray: 处理结果
@@ -420,7 +411,7 @@ class ImageProcessingThread(QThread):
         progress_callback(task, 0.0)
         
         # 执行算法
-        result = algorithm_func()
+        result = algorithm_func(*args)
         
         # 检查是否被取消
         if task.status == TaskStatus.CANCELLED:
@@ -431,9 +422,9 @@ class ImageProcessingThread(QThread):
     
     # 进度回调函数
     def _default_progress(self, task: ProcessingTask, progress: float):
-        """默认进度回调"""
+        """默认进度回调（只记录最新值，由界面定时读取）"""
         task.progress = progress
-        self.task_progress.emit(task.task_id, progress)
+        self._latest_progress[task.task_id] = progress
     
     def _gamma_progress(self, task: ProcessingTask, progress: float):
         """Gamma校正进度回调"""
@@ -1,17 +1,89 @@
 """
 图像处理算法模块
 """
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
-from skimage import exposure, filters, morphology, restoration
+import cv2
+from scipy import ndimage
+from skimage import exposure, morphology, restoration
 from typing import Dict, Any, Tuple, Optional
 
 # 导入新的处理器模块
-from .frequency_processor import FrequencyProcessor
+from .frequency_processor import FrequencyProcessor, _fft_context
 from .edge_processor import EdgeProcessor
 from .dicom_enhancer import DicomEnhancer
 from .window_based_enhancer import WindowBasedEnhancer
 from .paper_enhance import enhance_xray_poisson_nlm_strict, enhance_xray_poisson_nlm_strict_tiled_cpp
 from .image_analyzer import image_analysis_decorator
+from ._kernels import apply_lut_u16, sharpen_uint16
+
+# 超过该像素数才按行条带多线程处理
+PARALLEL_MIN_PIXELS = 1024 * 1024
+
+# 高斯低通/高通的等效空间sigma在此范围内时直接做空间域卷积：sigma过小时离散采样的
+# 空间核与频域高斯相差明显，过大时卷积核太长，反而不如FFT快
+_SPATIAL_SIGMA_RANGE = (1.5, 8.0)
+
+# cv2.minMaxLoc支持的数据类型
+_MIN_MAX_DTYPES = (np.uint8, np.int8, np.uint16, np.int16, np.int32, np.float32, np.float64)
+
+
+@lru_cache(maxsize=32)
+def _disk(radius: int) -> np.ndarray:
+    """按半径缓存的圆形结构元素（只读）"""
+    selem = morphology.disk(radius)
+    selem.setflags(write=False)
+    return selem
+
+
+def _min_max(data: np.ndarray) -> Tuple[float, float]:
+    """一次遍历求最小/最大值（cv2.minMaxLoc按二维处理，多维数组先展平成二维）"""
+    if data.dtype in _MIN_MAX_DTYPES:
+        return cv2.minMaxLoc(data.reshape(data.shape[0], -1))[:2]
+    return float(data.min()), float(data.max())
+
+
+def _map_row_strips(func, data: np.ndarray, halo: int, workers: int) -> np.ndarray:
+    """
+    把图像按行切成带重叠边的条带，在线程池中分别处理后拼回
+    
+    每个条带上下各多取halo行，结果只写回条带本身，与整幅处理逐像素一致
+    （func须是半径不超过halo的邻域运算，且在C代码中释放GIL）
+    """
+    rows = data.shape[0]
+    bounds = np.linspace(0, rows, workers + 1).astype(int)
+    out = np.empty(data.shape, dtype=np.uint16)
+    
+    def process(i):
+        y0, y1 = bounds[i], bounds[i + 1]
+        top, bottom = max(0, y0 - halo), min(rows, y1 + halo)
+        out[y0:y1] = func(data[top:bottom])[y0 - top:y1 - top]
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(process, range(workers)))
+    return out
+
+
+@lru_cache(maxsize=4)
+def _gaussian_frequency_mask(rows: int, cols: int, cutoff_frequency: float, highpass: bool) -> np.ndarray:
+    """
+    按参数缓存的高斯低通/高通滤波器（只读）
+    
+    布局与rfft2输出一致 (rows, cols//2+1)，零频在[0, 0]；界面调参时常重复应用同一滤波器，
+    大图的单个滤波器有十几MB，缓存容量保持较小
+    """
+    # 高斯核可分离，只需H+W次exp，再做一次外积
+    denom = 2 * (cutoff_frequency * min(rows, cols)) ** 2
+    gy = np.exp(-(np.fft.fftfreq(rows, 1 / rows) ** 2) / denom).astype(np.float32)
+    gx = np.exp(-(np.fft.rfftfreq(cols, 1 / cols) ** 2) / denom).astype(np.float32)
+    mask = np.multiply.outer(gy, gx)
+    if highpass:
+        np.subtract(1, mask, out=mask)
+    mask.setflags(write=False)
+    return mask
+
 
 class ImageProcessor:
     """图像处理算法集合"""
@@ -22,15 +94,35 @@ class ImageProcessor:
         if gamma <= 0:
             gamma = 0.1
         
-        # 归一化到0-1范围
-        normalized = data.astype(np.float32)
-        normalized = (normalized - normalized.min()) / (normalized.max() - normalized.min())
+        if data.dtype == np.uint16:
+            # 16位图像在查找表上做同样的float32运算，图像本身只查一次表；
+            # 只有[min, max]范围内的表项会被查到，其余表项留为0
+            data_min, data_max = map(int, _min_max(data))
+            values = np.arange(data_min, data_max + 1, dtype=np.float32)
+            values -= np.float32(data_min)
+            values /= np.float32(max(data_max - data_min, 1))
+            np.power(values, gamma, out=values)
+            values *= np.float32(data_max - data_min)
+            values += np.float32(data_min)
+            lut = np.zeros(65536, dtype=np.uint16)
+            lut[data_min:data_max + 1] = values
+            if apply_lut_u16 is not None and data.ndim == 2:
+                return apply_lut_u16(data, lut, np.empty(data.shape, dtype=np.uint16))
+            return lut[data]
+        
+        # 归一化到0-1范围（最小/最大值只求一次，归一化和恢复共用）；
+        # 各步都在同一个float32副本上原地完成，不再每步分配整幅临时数组
+        data_min, data_max = _min_max(data)
+        corrected = data.astype(np.float32)
+        corrected -= data_min
+        corrected /= data_max - data_min
         
         # 应用Gamma校正
-        corrected = np.power(normalized, gamma)
+        np.power(corrected, gamma, out=corrected)
         
         # 恢复到原始范围
-        corrected = corrected * (data.max() - data.min()) + data.min()
+        corrected *= data_max - data_min
+        corrected += data_min
         
         return corrected.astype(np.uint16)
     
@@ -39,6 +131,16 @@ class ImageProcessor:
         """直方图均衡化"""
         if method == 'global':
             # 全局直方图均衡化
+            if data.dtype in (np.uint8, np.uint16):
+                # 整数图像按每个灰度值计数，累计直方图直接作为查找表，只查一次表
+                hist = np.bincount(data.ravel(), minlength=65536)
+                cdf = np.cumsum(hist)
+                # 最小灰度的累计计数就是直方图第一个非零项，不必再遍历图像
+                cdf_min = hist[np.flatnonzero(hist)[0]]
+                lut = ((cdf - cdf_min) * 65535 // max(cdf[-1] - cdf_min, 1)).astype(np.uint16)
+                if apply_lut_u16 is not None and data.ndim == 2:
+                    return apply_lut_u16(data, lut, np.empty(data.shape, dtype=np.uint16))
+                return lut[data]
             return exposure.equalize_hist(data) * 65535
         elif method == 'adaptive':
             # 自适应直方图均衡化（CLAHE）
@@ -47,30 +149,79 @@ class ImageProcessor:
             return data
     
     @staticmethod
-    def gaussian_filter(data: np.ndarray, sigma: float = 1.0) -> np.ndarray:
-        """高斯滤波"""
+    def _rescale_to_range(result: np.ndarray, data: np.ndarray) -> np.ndarray:
+        """把浮点滤波结果线性拉伸到输入数据的 [min, max] 并转为uint16
+        
+        结果和输入的最小/最大值各用一次遍历求出，拉伸、舍入和类型转换在一次
+        addWeighted中完成（与逐步NumPy运算相比，四舍五入代替截断，最多相差1个灰度级）。
+        结果为常数时返回输入数据本身
+        """
+        # OpenCV按二维处理，多维数组展平成二维后再恢复形状
+        result_2d = result.reshape(result.shape[0], -1)
+        result_min, result_max = _min_max(result_2d)
+        if result_max > result_min:
+            data_min, data_max = _min_max(data)
+            scale = (data_max - data_min) / (result_max - result_min)
+            rescaled = cv2.addWeighted(result_2d, scale, result_2d, 0.0, data_min - result_min * scale,
+                                       dtype=cv2.CV_16U)
+            return rescaled.reshape(result.shape)
+        
+        if data.dtype == np.uint16:
+            return data.copy()
+        return np.clip(data, 0, 65535).astype(np.uint16)
+    
+    @staticmethod
+    def gaussian_filter(data: np.ndarray, sigma: float = 1.0, preserve_range: bool = False) -> np.ndarray:
+        """高斯滤波
+        
+        Args:
+            data: 输入图像
+            sigma: 高斯核标准差
+            preserve_range: 是否把结果拉伸回输入的 [min, max]（旧版行为）
+        """
         if sigma <= 0:
             sigma = 0.1
         
-        # 转换为float类型进行处理
-        filtered = filters.gaussian(data.astype(np.float32), sigma=sigma)
-        
-        # 恢复到原始范围和类型
-        filtered = (filtered - filtered.min()) / (filtered.max() - filtered.min())
-        filtered = filtered * (data.max() - data.min()) + data.min()
+        # 16位图像直接做可分离高斯卷积并四舍五入回uint16，不再分配整幅float32副本；
+        # 边缘复制填充，与skimage的'nearest'模式一致
+        source = data if data.dtype == np.uint16 else data.astype(np.float32)
+        filtered = cv2.GaussianBlur(source, (0, 0), sigma, borderType=cv2.BORDER_REPLICATE)
         
+        if preserve_range:
+            return ImageProcessor._rescale_to_range(filtered, data)
+        if filtered.dtype == np.uint16:
+            return filtered
+        np.clip(filtered, 0, 65535, out=filtered)
         return filtered.astype(np.uint16)
     
     @staticmethod
-    def median_filter(data: np.ndarray, disk_size: int = 3) -> np.ndarray:
-        """中值滤波"""
+    def median_filter(data: np.ndarray, disk_size: int = 3, workers: Optional[int] = None) -> np.ndarray:
+        """中值滤波
+        
+        Args:
+            data: 输入图像
+            disk_size: 圆形结构元素半径
+            workers: 线程数，默认为CPU核数；大图按行条带并行处理
+        """
         if disk_size < 1:
             disk_size = 1
         
-        # 使用圆形结构元素
-        selem = morphology.disk(disk_size)
-        filtered = filters.median(data, selem)
+        # 使用圆形结构元素；skimage的median内部就是ndimage.median_filter，直接调用，
+        # 16位输入的结果已是uint16，不再复制一次
+        selem = _disk(disk_size)
+        
+        def median(block):
+            return ndimage.median_filter(block, footprint=selem, mode='nearest')
+        
+        # ndimage的中值滤波是单线程的（但释放GIL），大图按行条带分给多个线程
+        workers = min(workers or os.cpu_count() or 1, data.shape[0] // (4 * disk_size + 1))
+        if workers > 1 and data.ndim == 2 and data.size > PARALLEL_MIN_PIXELS:
+            return _map_row_strips(median, data, disk_size, workers)
         
+        filtered = median(data)
+        
+        if filtered.dtype == np.uint16:
+            return filtered
         return filtered.astype(np.uint16)
     
     @staticmethod
@@ -84,21 +235,19 @@ class ImageProcessor:
         # 转换为float类型进行处理
         data_float = data.astype(np.float32)
         
-        # 应用非锐化掩模
-        sharpened = filters.unsharp_mask(data_float, radius=radius, amount=amount)
+        # 高斯模糊（边缘复制填充，与skimage的ndimage 'nearest'模式一致）
+        blurred = cv2.GaussianBlur(data_float, (0, 0), radius, borderType=cv2.BORDER_REPLICATE)
         
-        # 恢复到原始范围和类型（避免除零错误）
-        sharpened_min = sharpened.min()
-        sharpened_max = sharpened.max()
-
-        if sharpened_max > sharpened_min:
-            sharpened = (sharpened - sharpened_min) / (sharpened_max - sharpened_min)
-            sharpened = sharpened * (data.max() - data.min()) + data.min()
-        else:
-            # 如果图像是常数，直接返回原图像
-            sharpened = data.astype(np.float64)
-
-        return np.clip(sharpened, 0, 65535).astype(np.uint16)
+        # img + amount * (img - blur)，直接截断到16位范围：不再做最小/最大值拉伸，
+        # 拉伸会把锐化产生的过冲压回去，抵消增强的对比度
+        if sharpen_uint16 is not None and data.ndim == 2:
+            return sharpen_uint16(data_float, blurred, float(amount), np.empty(data.shape, dtype=np.uint16))
+        
+        np.subtract(data_float, blurred, out=blurred)
+        np.multiply(blurred, amount, out=blurred)
+        np.add(blurred, data_float, out=blurred)
+        np.clip(blurred, 0, 65535, out=blurred)
+        return blurred.astype(np.uint16)
     
     @staticmethod
     def morphological_operation(data: np.ndarray, operation: str, disk_size: int = 3) -> np.ndarray:
@@ -107,85 +256,67 @@ class ImageProcessor:
             disk_size = 1
         
         # 创建结构元素
-        selem = morphology.disk(disk_size)
+        selem = _disk(disk_size)
         
-        # 根据操作类型处理
-        if operation == 'erosion':
-            result = morphology.erosion(data, selem)
-        elif operation == 'dilation':
-            result = morphology.dilation(data, selem)
-        elif operation == 'opening':
-            result = morphology.opening(data, selem)
-        elif operation == 'closing':
-            result = morphology.closing(data, selem)
+        # 根据操作类型处理：OpenCV的morphologyEx一次调用完成开/闭运算，
+        # 用同一个圆盘作核、BORDER_REFLECT边界时与skimage的结果逐像素一致
+        operations = {
+            'erosion': cv2.MORPH_ERODE,
+            'dilation': cv2.MORPH_DILATE,
+            'opening': cv2.MORPH_OPEN,
+            'closing': cv2.MORPH_CLOSE,
+        }
+        if operation in operations:
+            result = cv2.morphologyEx(data, operations[operation], selem, borderType=cv2.BORDER_REFLECT)
         else:
             result = data
         
         return result.astype(np.uint16)
     
     @staticmethod
-    def low_pass_filter(data: np.ndarray, cutoff_frequency: float = 0.1) -> np.ndarray:
-        """低通滤波（频域）"""
-        # 转换为float类型
-        data_float = data.astype(np.float32)
-        
-        # 傅里叶变换
-        f_transform = np.fft.fft2(data_float)
-        f_transform_shifted = np.fft.fftshift(f_transform)
+    def _gaussian_frequency_filter(data: np.ndarray, cutoff_frequency: float, highpass: bool) -> np.ndarray:
+        """高斯低通/高通滤波的公共实现
         
-        # 创建低通滤波器
+        频域高斯 exp(-k²/(2(c·min(H,W))²)) 等价于空间域sigma = 边长/(2π·c·min(H,W))
+        （两轴分别计算）。sigma适中时直接做可分离高斯卷积（边缘复制填充），
+        高通取原图减低通；否则在频域相乘（循环边界），与FrequencyProcessor共用
+        每个线程按尺寸保留的FFT工作区，启用pyFFTW时还复用已规划的变换
+        """
         rows, cols = data.shape
-        crow, ccol = rows // 2, cols // 2
+        scale = 2 * np.pi * float(cutoff_frequency) * min(rows, cols)
+        if scale > 0:
+            sigma_y, sigma_x = rows / scale, cols / scale
+            if (_SPATIAL_SIGMA_RANGE[0] <= min(sigma_x, sigma_y)
+                    and max(sigma_x, sigma_y) <= _SPATIAL_SIGMA_RANGE[1]):
+                data_float = data.astype(np.float32)
+                filtered = cv2.GaussianBlur(data_float, (0, 0), sigmaX=sigma_x, sigmaY=sigma_y,
+                                            borderType=cv2.BORDER_REPLICATE)
+                if highpass:
+                    np.subtract(data_float, filtered, out=filtered)
+                return ImageProcessor._rescale_to_range(filtered, data)
         
-        # 创建高斯低通滤波器
-        y, x = np.ogrid[:rows, :cols]
-        mask = np.exp(-((x - ccol) ** 2 + (y - crow) ** 2) / (2 * (cutoff_frequency * min(rows, cols)) ** 2))
-        
-        # 应用滤波器
-        filtered = f_transform_shifted * mask
+        # 实数输入只需计算一半频谱（多线程rfft2），零频在[0, 0]，不需要fftshift
+        context = _fft_context(data.shape)
+        f_transform = context.forward(data)
         
-        # 逆变换
-        filtered_shifted = np.fft.ifftshift(filtered)
-        filtered_result = np.fft.ifft2(filtered_shifted)
-        filtered_result = np.real(filtered_result)
+        # 高斯滤波器（按形状和截止频率缓存）
+        mask = _gaussian_frequency_mask(rows, cols, float(cutoff_frequency), highpass)
         
-        # 恢复到原始范围和类型
-        filtered_result = (filtered_result - filtered_result.min()) / (filtered_result.max() - filtered_result.min())
-        filtered_result = filtered_result * (data.max() - data.min()) + data.min()
+        # 应用滤波器
+        np.multiply(f_transform, mask, out=context.product)
         
-        return filtered_result.astype(np.uint16)
+        # 逆变换（结果为实数），恢复到原始范围和类型
+        return ImageProcessor._rescale_to_range(context.inverse(), data)
+    
+    @staticmethod
+    def low_pass_filter(data: np.ndarray, cutoff_frequency: float = 0.1) -> np.ndarray:
+        """高斯低通滤波"""
+        return ImageProcessor._gaussian_frequency_filter(data, cutoff_frequency, False)
     
     @staticmethod
     def high_pass_filter(data: np.ndarray, cutoff_frequency: float = 0.1) -> np.ndarray:
-        """高通滤波（频域）"""
-        # 转换为float类型
-        data_float = data.astype(np.float32)
-        
-        # 傅里叶变换
-        f_transform = np.fft.fft2(data_float)
-        f_transform_shifted = np.fft.fftshift(f_transform)
-        
-        # 创建高通滤波器
-        rows, cols = data.shape
-        crow, ccol = rows // 2, cols // 2
-        
-        # 创建高斯高通滤波器
-        y, x = np.ogrid[:rows, :cols]
-        mask = 1 - np.exp(-((x - ccol) ** 2 + (y - crow) ** 2) / (2 * (cutoff_frequency * min(rows, cols)) ** 2))
-        
-        # 应用滤波器
-        filtered = f_transform_shifted * mask
-        
-        # 逆变换
-        filtered_shifted = np.fft.ifftshift(filtered)
-        filtered_result = np.fft.ifft2(filtered_shifted)
-        filtered_result = np.real(filtered_result)
-        
-        # 恢复到原始范围和类型
-        filtered_result = (filtered_result - filtered_result.min()) / (filtered_result.max() - filtered_result.min())
-        filtered_result = filtered_result * (data.max() - data.min()) + data.min()
-        
-        return filtered_result.astype(np.uint16)
+        """高斯高通滤波"""
+        return ImageProcessor._gaussian_frequency_filter(data, cutoff_frequency, True)
     
     @staticmethod
     def get_algorithm_info() -> Dict[str, Dict[str, Any]]:
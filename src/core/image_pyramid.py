@@ -58,6 +58,7 @@ class ImagePyramid(QObject):
         self.pyramid_levels: OrderedDict[int, PyramidLevel] = OrderedDict()
         self.original_image: Optional[np.ndarray] = None
         self.original_size: Tuple[int, int] = (0, 0)
+        self.deepest_level = 0  # 尺寸和内存限制允许的最深级别
         
         # 缓存统计
         self.cache_hits = 0
@@ -86,11 +87,13 @@ class ImagePyramid(QObject):
             # 清除现有金字塔
             self.clear_pyramid()
             
-            # 保存原始图像引用（不拷贝，节省内存）
-            self.original_image = image_data
+            # 保存原始图像引用（不拷贝，节省内存）；非C连续时才拷贝一次，
+            # 因为QImage按行跨度读取缓冲区。通过只读视图保存，防止经金字塔
+            # 修改调用方数据，调用方自己的数组仍可写
+            self.original_image = self._read_only(np.ascontiguousarray(image_data))
             self.original_size = image_data.shape
             
-            # 生成金字塔
+            # 只放入级别0，其余级别在首次访问时生成
             self._generate_pyramid()
             
             # 发出信号
@@ -122,23 +125,21 @@ class ImagePyramid(QObject):
         else:
             # 缩小时计算最优级别
             target_level = int(np.log2(1.0 / scale_factor))
-            target_level = min(target_level, max(self.pyramid_levels.keys()))
+            target_level = min(target_level, self.deepest_level)
         
-        # 获取最接近的可用级别
-        available_levels = list(self.pyramid_levels.keys())
-        best_level = min(available_levels, key=lambda x: abs(x - target_level))
+        # 命中时移到队尾（最近使用），未命中时按需生成
+        if target_level in self.pyramid_levels:
+            self.pyramid_levels.move_to_end(target_level)
+            self.cache_hits += 1
+        else:
+            self._ensure_level(target_level)
+            self.cache_misses += 1
         
         # 更新访问统计
-        pyramid_level = self.pyramid_levels[best_level]
+        pyramid_level = self.pyramid_levels[target_level]
         pyramid_level.access_count += 1
         pyramid_level.last_access_time = time.time()
         
-        # 更新缓存统计
-        if best_level == target_level:
-            self.cache_hits += 1
-        else:
-            self.cache_misses += 1
-        
         return pyramid_level
     
     def get_pixmap_for_scale(self, scale_factor: float) -> Optional[QPixmap]:
@@ -161,12 +162,10 @@ class ImagePyramid(QObject):
         return pyramid_level.pixmap
     
     def _generate_pyramid(self):
-        """生成图像金字塔"""
+        """放入级别0并计算可生成的最深级别（不做下采样）"""
         if self.original_image is None:
             return
         
-        start_time = time.time()
-        
         # 添加原始图像（级别0）- 直接引用，不拷贝
         level_0 = PyramidLevel(
             level=0,
@@ -175,42 +174,52 @@ class ImagePyramid(QObject):
         )
         self.pyramid_levels[0] = level_0
         
-        # 生成下采样级别
-        current_image = self.original_image
-        current_level = 1
-        
-        while current_level < self.max_levels:
-            # 计算新尺寸
-            new_height = current_image.shape[0] // self.downsample_factor
-            new_width = current_image.shape[1] // self.downsample_factor
+        # 只按尺寸推算级别数，限制条件与逐级生成时相同
+        height, width = self.original_image.shape[:2]
+        self.deepest_level = 0
+        while self.deepest_level + 1 < self.max_levels:
+            height //= self.downsample_factor
+            width //= self.downsample_factor
             
             # 检查最小尺寸限制
-            if new_height < self.min_image_size or new_width < self.min_image_size:
+            if height < self.min_image_size or width < self.min_image_size:
                 break
             
             # 检查内存限制
-            if self._estimate_memory_usage(new_height, new_width) > self.max_memory_mb * 1024 * 1024:
+            if self._estimate_memory_usage(height, width) > self.max_memory_mb * 1024 * 1024:
                 break
             
-            # 下采样图像
-            downsampled = self._downsample_image(current_image, (new_width, new_height))
+            self.deepest_level += 1
+    
+    def _ensure_level(self, target_level: int):
+        """按需生成金字塔级别
+        
+        从已缓存的最近较精细级别开始逐级下采样，中间级别一并放入缓存，
+        目标级别最后插入，位于LRU队尾
+        
+        Args:
+            target_level: 目标级别（不超过deepest_level）
+        """
+        start_time = time.time()
+        
+        current_level = max(level for level in self.pyramid_levels if level < target_level)
+        current_image = self.pyramid_levels[current_level].image_data
+        
+        while current_level < target_level:
+            new_height = current_image.shape[0] // self.downsample_factor
+            new_width = current_image.shape[1] // self.downsample_factor
+            current_image = self._read_only(
+                self._downsample_image(current_image, (new_width, new_height)))
+            current_level += 1
             
-            # 创建金字塔级别
-            scale_factor = 1.0 / (self.downsample_factor ** current_level)
-            pyramid_level = PyramidLevel(
+            self.pyramid_levels[current_level] = PyramidLevel(
                 level=current_level,
-                scale_factor=scale_factor,
-                image_data=downsampled
+                scale_factor=1.0 / (self.downsample_factor ** current_level),
+                image_data=current_image
             )
             
-            self.pyramid_levels[current_level] = pyramid_level
-            
             # 更新内存使用统计
-            self.total_memory_usage += downsampled.nbytes
-            
-            # 准备下一级别
-            current_image = downsampled
-            current_level += 1
+            self.total_memory_usage += current_image.nbytes
         
         # 记录创建时间
         creation_time = time.time() - start_time
@@ -220,6 +229,13 @@ class ImagePyramid(QObject):
         if len(self.creation_times) > 10:
             self.creation_times.pop(0)
     
+    @staticmethod
+    def _read_only(image: np.ndarray) -> np.ndarray:
+        """返回共享数据的只读视图（不拷贝）"""
+        view = image.view()
+        view.setflags(write=False)
+        return view
+    
     def _downsample_image(self, image: np.ndarray, new_size: Tuple[int, int]) -> np.ndarray:
         """下采样图像
         
@@ -230,7 +246,11 @@ class ImagePyramid(QObject):
         Returns:
             np.ndarray: 下采样后的图像
         """
-        # 使用OpenCV进行高质量下采样
+        # 恰好减半时用pyrDown：5x5高斯平滑与隔点采样一次完成，抗混叠优于INTER_AREA
+        if new_size == (image.shape[1] // 2, image.shape[0] // 2):
+            return cv2.pyrDown(image, dstsize=new_size)
+        
+        # 其他比例使用OpenCV进行高质量下采样
         if len(image.shape) == 2:
             # 灰度图像
             downsampled = cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
@@ -287,33 +307,33 @@ class ImagePyramid(QObject):
         self.pyramid_levels.clear()
         self.original_image = None
         self.original_size = (0, 0)
+        self.deepest_level = 0
         self.total_memory_usage = 0
         self.cache_hits = 0
         self.cache_misses = 0
     
     def optimize_cache(self):
-        """优化缓存，移除不常用的级别"""
+        """优化缓存，按LRU顺序移除最久未使用的级别"""
         if len(self.pyramid_levels) <= 2:
             return  # 保留至少2个级别
         
-        # 按访问频率排序
-        levels_by_usage = sorted(
-            self.pyramid_levels.items(),
-            key=lambda x: (x[1].access_count, x[1].last_access_time),
-            reverse=True
-        )
+        keep_count = max(2, len(self.pyramid_levels) // 2)
         
-        # 保留最常用的级别
-        keep_count = max(2, len(levels_by_usage) // 2)
-        levels_to_keep = dict(levels_by_usage[:keep_count])
+        # 级别0引用原始图像，不占额外内存，始终保留
+        level_0 = self.pyramid_levels.pop(0, None)
+        if level_0 is not None:
+            keep_count -= 1
         
-        # 移除不常用的级别
+        # 队首是最久未使用的级别
         removed_count = 0
-        for level_id in list(self.pyramid_levels.keys()):
-            if level_id not in levels_to_keep:
-                removed_level = self.pyramid_levels.pop(level_id)
-                self.total_memory_usage -= removed_level.image_data.nbytes
-                removed_count += 1
+        while len(self.pyramid_levels) > keep_count:
+            _, removed_level = self.pyramid_levels.popitem(last=False)
+            self.total_memory_usage -= removed_level.image_data.nbytes
+            removed_count += 1
+        
+        if level_0 is not None:
+            self.pyramid_levels[0] = level_0
+            self.pyramid_levels.move_to_end(0, last=False)
         
         if removed_count > 0:
             self._emit_cache_stats()
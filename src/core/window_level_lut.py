@@ -6,10 +6,13 @@
 """
 
 import numpy as np
+import cv2
 from typing import Dict, Tuple, Optional
 import time
 from collections import OrderedDict
 
+from ._kernels import apply_lut_u16
+
 
 class WindowLevelLUT:
     """窗宽窗位查找表类
@@ -25,7 +28,7 @@ class WindowLevelLUT:
             max_cache_size: 最大缓存数量，默认50个
         """
         self.max_cache_size = max_cache_size
-        self.lut_cache: OrderedDict[Tuple[float, float], np.ndarray] = OrderedDict()
+        self.lut_cache: OrderedDict[Tuple[float, float, bool], np.ndarray] = OrderedDict()
         self.cache_hits = 0
         self.cache_misses = 0
         
@@ -33,18 +36,18 @@ class WindowLevelLUT:
         self.total_lut_creation_time = 0.0
         self.lut_creation_count = 0
         
-    def get_lut(self, window_width: float, window_level: float) -> np.ndarray:
+    def get_lut(self, window_width: float, window_level: float, invert: bool = False) -> np.ndarray:
         """获取或创建查找表
         
         Args:
             window_width: 窗宽值
             window_level: 窗位值
+            invert: 是否反相（反相直接做进查找表）
             
         Returns:
-            np.ndarray: 查找表数组，大小为65536，数据类型为uint8
+            np.ndarray: 只读查找表数组，大小为65536，数据类型为uint8
         """
-        # 创建缓存键，使用四舍五入避免浮点精度问题
-        key = (round(window_width, 2), round(window_level, 2))
+        key = self.cache_key(window_width, window_level, invert)
         
         # 检查缓存
         if key in self.lut_cache:
@@ -56,28 +59,39 @@ class WindowLevelLUT:
         
         # 缓存未命中，创建新的查找表
         self.cache_misses += 1
-        lut = self._create_lut(window_width, window_level)
+        lut = self._create_lut(window_width, window_level, invert)
         
         # 添加到缓存
         self._add_to_cache(key, lut)
         
         return lut
     
-    def _create_lut(self, window_width: float, window_level: float) -> np.ndarray:
+    @staticmethod
+    def cache_key(window_width: float, window_level: float, invert: bool = False) -> Tuple[float, float, bool]:
+        """查找表缓存键，窗宽窗位四舍五入到0.01避免浮点精度问题
+
+        键相同的设置共用同一张查找表，显示结果相同
+        """
+        return (round(window_width, 2), round(window_level, 2), bool(invert))
+    
+    def _create_lut(self, window_width: float, window_level: float, invert: bool = False) -> np.ndarray:
         """创建窗宽窗位查找表
 
         Args:
             window_width: 窗宽值
             window_level: 窗位值
+            invert: 是否反相
 
         Returns:
-            np.ndarray: 查找表数组
+            np.ndarray: 查找表数组（只读，缓存中共享）
         """
         start_time = time.time()
 
         if window_width <= 0:
-            # 窗宽无效，返回全黑图像
-            return np.zeros(65536, dtype=np.uint8)
+            # 窗宽无效，返回全黑图像（反相时全白）
+            lut = np.full(65536, 255 if invert else 0, dtype=np.uint8)
+            lut.setflags(write=False)
+            return lut
 
         # 计算窗宽窗位范围
         min_val = window_level - window_width / 2
@@ -98,6 +112,11 @@ class WindowLevelLUT:
         # 裁剪到有效范围
         lut[:] = np.clip(values, 0, 255)
 
+        # 反相在65536项的表上做一次，应用时只剩一次查表
+        if invert:
+            np.subtract(255, lut, out=lut)
+        lut.setflags(write=False)
+
         # 统计性能
         creation_time = time.time() - start_time
         self.total_lut_creation_time += creation_time
@@ -109,7 +128,7 @@ class WindowLevelLUT:
         """添加查找表到缓存
         
         Args:
-            key: 缓存键 (window_width, window_level)
+            key: 缓存键 (window_width, window_level, invert)
             lut: 查找表数组
         """
         # 检查缓存大小限制
@@ -120,13 +139,15 @@ class WindowLevelLUT:
         # 添加新的缓存项（不需要copy，LUT是只读的）
         self.lut_cache[key] = lut
     
-    def apply_lut(self, image_data: np.ndarray, window_width: float, window_level: float) -> np.ndarray:
+    def apply_lut(self, image_data: np.ndarray, window_width: float, window_level: float,
+                  invert: bool = False) -> np.ndarray:
         """应用查找表到图像数据
 
         Args:
             image_data: 原始图像数据
             window_width: 窗宽值
             window_level: 窗位值
+            invert: 是否反相显示
 
         Returns:
             np.ndarray: 处理后的8位图像数据
@@ -134,13 +155,23 @@ class WindowLevelLUT:
         if image_data is None or image_data.size == 0:
             return np.zeros((100, 100), dtype=np.uint8)
 
+        # 浮点图像直接线性映射，一次遍历，不经过截断到16位再查表
+        if image_data.dtype in (np.float32, np.float64) and image_data.ndim == 2 and window_width > 0:
+            return self._apply_linear(image_data, window_width, window_level, invert)
+
         # 获取查找表
-        lut = self.get_lut(window_width, window_level)
+        lut = self.get_lut(window_width, window_level, invert)
 
         # 高性能实现 - 平衡内存和速度
-        if image_data.dtype == np.uint16:
+        if image_data.dtype == np.uint8 and image_data.ndim == 2:
+            # 8位图像只用到查找表前256项，OpenCV的LUT有SIMD实现
+            return cv2.LUT(image_data, lut[:256])
+        elif image_data.dtype == np.uint16:
             # 已经是正确类型，直接使用（零拷贝）
             indices = image_data
+            if apply_lut_u16 is not None and indices.ndim == 2:
+                # Numba按行并行查表，比NumPy花式索引快数倍（拖动窗宽窗位滑块的热点）
+                return apply_lut_u16(indices, lut, np.empty(indices.shape, dtype=np.uint8))
         else:
             # 需要转换类型，智能选择策略
             if image_data.size > 4 * 1024 * 1024:  # 大于4M像素才分块
@@ -152,6 +183,19 @@ class WindowLevelLUT:
         # 直接使用数组索引，这是最快的方法
         return lut[indices]
 
+    @staticmethod
+    def _apply_linear(image_data: np.ndarray, window_width: float, window_level: float,
+                      invert: bool = False) -> np.ndarray:
+        """浮点图像的窗宽窗位：(x - (窗位 - 窗宽/2)) * 255/窗宽，饱和转换到0-255
+
+        与查找表相比不先截断到整数，OpenCV的饱和转换四舍五入，两者最多相差1个灰度级
+        """
+        scale = 255.0 / window_width
+        offset = -(window_level - window_width / 2) * scale
+        if invert:
+            scale, offset = -scale, 255.0 - offset
+        return cv2.addWeighted(image_data, scale, image_data, 0.0, offset, dtype=cv2.CV_8U)
+
     def _apply_lut_optimized(self, image_data: np.ndarray, lut: np.ndarray) -> np.ndarray:
         """优化的LUT应用 - 平衡内存和性能"""
         # 获取图像形状
@@ -7,7 +7,7 @@ import numpy as np
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QHBoxLayout, QVBoxLayout,
                            QSplitter, QMenuBar, QMenu, QFileDialog, QStatusBar,
                            QMessageBox, QApplication, QProgressBar, QLabel)
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtCore import Qt, pyqtSignal, QTimer
 from PyQt6.QtGui import QAction, QIcon
 
 from .image_view import ImageView
@@ -35,6 +35,11 @@ class MainWindow(QMainWindow):
         # 当前处理任务ID
         self.current_task_id = None
 
+        # 进度轮询定时器（约30Hz读取处理线程记录的最新进度）
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(33)
+        self.progress_timer.timeout.connect(self._poll_task_progress)
+
         # 初始化平滑窗宽窗位控制器
         self.smooth_controller = SmoothWindowLevelController()
         self.smooth_controller.values_changed.connect(self._apply_smooth_window_level)
@@ -189,7 +194,6 @@ class MainWindow(QMainWindow):
 
         # 多线程处理信号
         self.processing_thread.task_started.connect(self.on_task_started)
-        self.processing_thread.task_progress.connect(self.on_task_progress)
         self.processing_thread.task_completed.connect(self.on_task_completed)
         self.processing_thread.task_failed.connect(self.on_task_failed)
         self.processing_thread.queue_status_changed.connect(self.on_queue_status_changed)
@@ -243,8 +247,7 @@ class MainWindow(QMainWindow):
             )
 
             # 更新图像信息显示
-            data_min = int(self.image_manager.original_image.data.min())
-            data_max = int(self.image_manager.original_image.data.max())
+            data_min, data_max = self.image_manager.original_image.data_range
             data_mean = float(self.image_manager.original_image.data.mean())
             self.control_panel.update_image_info(data_min, data_max, data_mean)
 
@@ -389,8 +392,7 @@ class MainWindow(QMainWindow):
 
         # 获取图像数据
         data = self.image_manager.current_image.data
-        data_min = int(data.min())
-        data_max = int(data.max())
+        data_min, data_max = self.image_manager.current_image.data_range
         data_mean = float(data.mean())
         total_pixels = data.size
 
@@ -695,8 +697,15 @@ class MainWindow(QMainWindow):
         """任务开始处理"""
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
+        self.progress_timer.start()
         self.status_bar.showMessage("正在处理...")
 
+    def _poll_task_progress(self):
+        """定时读取当前任务的最新进度"""
+        progress = self.processing_thread.get_progress_snapshot().get(self.current_task_id)
+        if progress is not None:
+            self.on_task_progress(self.current_task_id, progress)
+
     def on_task_progress(self, task_id: str, progress: float):
         """任务进度更新"""
         self.progress_bar.setValue(int(progress * 100))
@@ -731,6 +740,7 @@ class MainWindow(QMainWindow):
                 self.control_panel.update_history(self.image_manager.processing_history)
 
             # 隐藏进度条
+            self.progress_timer.stop()
             self.progress_bar.setVisible(False)
 
             # 重新启用控制面板
@@ -748,6 +758,7 @@ class MainWindow(QMainWindow):
     def on_task_failed(self, task_id: str, error_message: str):
         """任务失败处理"""
         # 隐藏进度条
+        self.progress_timer.stop()
         self.progress_bar.setVisible(False)
 
         # 重新启用控制面板
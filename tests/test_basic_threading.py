@@ -59,6 +59,132 @@ def test_basic_functionality():
     print("基础测试完成")
 
 
+def test_add_task_takes_ownership():
+    """测试任务默认直接引用只读的图像数据，own=False时复制"""
+    print("\n测试任务数据所有权...")
+    
+    test_image = np.random.randint(0, 4096, (64, 64), dtype=np.uint16)
+    thread = ImageProcessingThread()
+    
+    thread.add_task('gamma_correction', {'gamma': 1.5}, test_image, "接管数据")
+    assert thread.task_queue[-1].image_data is test_image
+    assert not test_image.flags.writeable
+    
+    caller_buffer = np.random.randint(0, 4096, (64, 64), dtype=np.uint16)
+    thread.add_task('gamma_correction', {'gamma': 1.5}, caller_buffer, "复制数据", own=False)
+    assert thread.task_queue[-1].image_data is not caller_buffer
+    assert np.array_equal(thread.task_queue[-1].image_data, caller_buffer)
+    assert caller_buffer.flags.writeable
+    print("任务数据所有权测试完成")
+
+
+def test_task_ids_unique():
+    """测试任务ID由递增计数生成，互不重复"""
+    print("\n测试任务ID...")
+    
+    test_image = np.zeros((8, 8), dtype=np.uint16)
+    thread = ImageProcessingThread()
+    task_ids = [thread.add_task('gamma_correction', {'gamma': 1.5}, test_image) for _ in range(5)]
+    print(f"任务ID: {task_ids}")
+    assert task_ids == ['t1', 't2', 't3', 't4', 't5']
+    assert list(thread.pending_tasks) == task_ids
+
+
+def test_task_queue_bounded():
+    """测试队列满时丢弃最旧的任务，取消的任务从待处理索引中移除并标记"""
+    print("\n测试任务队列上限...")
+    
+    test_image = np.zeros((8, 8), dtype=np.uint16)
+    thread = ImageProcessingThread()
+    task_ids = [thread.add_task('gamma_correction', {'gamma': 1.0}, test_image)
+                for _ in range(thread.max_queue_size + 5)]
+    
+    assert len(thread.task_queue) == thread.max_queue_size
+    assert thread.task_queue[0].task_id == task_ids[5]
+    
+    assert thread.get_queue_status()['pending_tasks'] == thread.max_queue_size
+    assert set(thread.pending_tasks) == set(task_ids[5:])
+    
+    assert thread.cancel_task(task_ids[10])
+    assert not thread.cancel_task(task_ids[10])
+    assert not thread.cancel_task(task_ids[0])
+    assert task_ids[10] not in thread.pending_tasks
+    assert thread.task_queue[5].status == TaskStatus.CANCELLED
+    assert thread.get_queue_status()['pending_tasks'] == thread.max_queue_size - 1
+    print(f"待处理任务数: {len(thread.pending_tasks)}")
+
+
+def test_queue_signal_emitted_after_unlock():
+    """测试队列状态信号在解锁后发出，槽函数里可以再查询队列状态"""
+    print("\n测试队列状态信号...")
+    
+    test_image = np.zeros((8, 8), dtype=np.uint16)
+    thread = ImageProcessingThread()
+    seen = []
+    thread.queue_status_changed.connect(
+        lambda pending, total: seen.append(thread.get_queue_status()['pending_tasks']))
+    
+    for _ in range(3):
+        thread.add_task('gamma_correction', {'gamma': 1.0}, test_image)
+    thread.clear_queue()
+    
+    print(f"槽函数看到的待处理任务数: {seen}")
+    assert seen == [1, 2, 3, 0]
+
+
+def test_execute_algorithm_dispatch():
+    """测试按分派表执行算法与直接调用处理器结果一致，未知算法报错"""
+    print("\n测试算法分派...")
+    
+    import pytest
+    from core.image_processing_thread import ProcessingTask
+    
+    test_image = np.random.randint(0, 4096, (64, 64), dtype=np.uint16)
+    thread = ImageProcessingThread()
+    processor = thread.processor
+    cases = [
+        ('gamma_correction', {'gamma': 1.5}, processor.gamma_correction(test_image, 1.5)),
+        ('unsharp_mask', {'radius': 1.0, 'amount': 0.5}, processor.unsharp_mask(test_image, 1.0, 0.5)),
+        ('morphological_operation', {'operation': 'opening', 'disk_size': 2},
+         processor.morphological_operation(test_image, 'opening', 2)),
+        ('window_based_enhance', {}, processor.window_based_enhance(test_image, 1500, 2500)),
+    ]
+    for name, parameters, expected in cases:
+        task = ProcessingTask(task_id=name, algorithm_name=name, parameters=parameters, image_data=test_image)
+        result = thread._execute_algorithm(task)
+        print(f"{name}: {result.shape}, dtype: {result.dtype}, 进度={task.progress}")
+        assert np.array_equal(result, expected)
+        assert task.progress == 1.0
+    
+    with pytest.raises(ValueError):
+        thread._execute_algorithm(ProcessingTask(task_id='x', algorithm_name='invalid_algorithm',
+                                                 parameters={}, image_data=test_image))
+    print("算法分派测试完成")
+
+
+def test_progress_recorded_without_signal():
+    """测试进度回调只记录最新值而不逐次发信号，快照是独立副本"""
+    print("\n测试进度快照...")
+    
+    from core.image_processing_thread import ProcessingTask
+    
+    thread = ImageProcessingThread()
+    emitted = []
+    thread.task_progress.connect(lambda task_id, progress: emitted.append(progress))
+    task = ProcessingTask(task_id='t', algorithm_name='paper_enhance', parameters={},
+                          image_data=np.zeros((4, 4), dtype=np.uint16))
+    for i in range(1000):
+        thread._paper_progress(task, i / 1000)
+    
+    snapshot = thread.get_progress_snapshot()
+    print(f"快照: {snapshot}, 信号次数: {len(emitted)}")
+    assert snapshot == {'t': 0.999}
+    assert emitted == []
+    snapshot.clear()
+    assert thread.get_progress_snapshot() == {'t': 0.999}
+    print("进度快照测试完成")
+
+
 def test_image_processor_directly():
     """直接测试图像处理器"""
     print("\n直接测试图像处理器...")
@@ -121,6 +247,12 @@ def test_lut_performance():
 
 if __name__ == '__main__':
     try:
+        test_add_task_takes_ownership()
+        test_task_ids_unique()
+        test_task_queue_bounded()
+        test_queue_signal_emitted_after_unlock()
+        test_execute_algorithm_dispatch()
+        test_progress_recorded_without_signal()
         test_image_processor_directly()
         test_lut_performance()
         test_basic_functionality()
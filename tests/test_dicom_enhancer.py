@@ -0,0 +1,255 @@
+"""
+DICOM增强器测试
+
+验证四个增强级别的输出形状、类型和范围
+"""
+
+import sys
+import os
+import numpy as np
+import cv2
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.dicom_enhancer import DicomEnhancer
+from core._gpu import HAS_CUDA
+
+
+def _make_test_image(shape=(256, 200)):
+    """生成带纹理和噪声的16位测试图像"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:shape[0], 0:shape[1]]
+    img = 20000 + 8000 * np.sin(x / 17.0) * np.cos(y / 23.0) + rng.normal(0, 600, shape)
+    return np.clip(img, 0, 65535).astype(np.uint16)
+
+
+def test_enhance_levels_output():
+    """测试各增强级别输出"""
+    print("=== DICOM增强级别测试 ===")
+
+    image = _make_test_image()
+
+    for name in ['basic_enhance', 'advanced_enhance', 'super_enhance', 'auto_enhance']:
+        result = getattr(DicomEnhancer, name)(image)
+        print(f"{name}: {result.shape}, dtype={result.dtype}, 范围={result.min()}-{result.max()}")
+
+        assert result.shape == image.shape
+        assert result.dtype == np.uint16
+        assert result.max() > result.min()
+
+
+def test_enhance_does_not_modify_input():
+    """测试增强不修改输入数据"""
+    print("\n=== 输入数据保护测试 ===")
+
+    image = _make_test_image()
+    original = image.copy()
+
+    DicomEnhancer.advanced_enhance(image)
+    DicomEnhancer.super_enhance(image)
+
+    assert np.array_equal(image, original)
+    print("✅ 输入数据未被修改")
+
+
+def test_progress_callback():
+    """测试进度回调单调递增并以100结束"""
+    print("\n=== 进度回调测试 ===")
+
+    progress = []
+    DicomEnhancer.super_enhance(_make_test_image((64, 64)), progress.append)
+
+    print(f"进度序列: {progress}")
+    assert progress == sorted(progress)
+    assert progress[-1] == 100
+
+
+def test_enhance_series_matches_sequential():
+    """测试多进程批量增强与逐张处理结果一致"""
+    print("\n=== 序列批量增强测试 ===")
+
+    volumes = [_make_test_image((96, 80)) + i * 100 for i in range(4)]
+    results = DicomEnhancer.enhance_series(volumes, 'basic_enhance', workers=2)
+
+    assert len(results) == len(volumes)
+    for volume, result in zip(volumes, results):
+        assert np.array_equal(result, DicomEnhancer.basic_enhance(volume))
+    print(f"✅ {len(volumes)}张切片处理结果一致")
+
+
+def test_normalize_non_native_input():
+    """测试大端字节序和非连续输入的归一化结果与本机数组一致"""
+    print("\n=== 非本机字节序归一化测试 ===")
+
+    image = _make_test_image()
+    expected = DicomEnhancer._normalize_image(image)
+
+    for variant in [image.astype('>u2'), np.asfortranarray(image)]:
+        result = DicomEnhancer._normalize_image(variant)
+        max_diff = np.abs(result - expected).max()
+        print(f"dtype={variant.dtype}, C连续={variant.flags.c_contiguous}, 最大差异={max_diff:.2e}")
+        assert max_diff < 1e-6
+
+
+def test_numpy_fallback_matches_kernels(monkeypatch):
+    """
+    测试未安装Numba时的NumPy回退路径与内核路径一致
+
+    逐个比较内核支撑的步骤：浮点结果允许1e-5的舍入差异，转16位允许1个灰度级；
+    uint8权重图在舍入边界处可能相差1级，融合结果允许1e-3。
+    不比较最终输出，因为16位CLAHE在小tile上的查找表是阶梯状的，1个灰度级的
+    输入差异会被放大到几十个灰度级
+    """
+    print("\n=== NumPy回退一致性测试 ===")
+
+    from core import dicom_enhancer
+
+    image = _make_test_image()
+
+    def run_steps():
+        img = DicomEnhancer._normalize_image(image)
+        boosted = DicomEnhancer._boost_detail(img, 2.0, 0.3)
+        var_map = DicomEnhancer._scale_to_unit(DicomEnhancer._local_variance(img, 7))
+        hf_small = img - cv2.GaussianBlur(img, (0, 0), 1)
+        hf_large = img - cv2.GaussianBlur(img, (0, 0), 5)
+        fused = DicomEnhancer._combine_detail(img, hf_small, hf_large, var_map,
+                                              0.5, 1.0, 0.3, 0.5, np.empty_like(img))
+        weight_u8 = DicomEnhancer._variance_weight_u8(img, 7)
+        fused_u8 = DicomEnhancer._combine_detail(img, hf_small, hf_large, weight_u8,
+                                                 0.5, 1.0 / 255, 0.3, 0.5 / 255, np.empty_like(img))
+        return img, boosted, fused, fused_u8, DicomEnhancer._to_uint16(fused)
+
+    expected = run_steps()
+    for kernel in ['normalize_unit', 'fuse_detail', 'boost_detail', 'unit_to_uint16']:
+        monkeypatch.setattr(dicom_enhancer, kernel, None)
+    result = run_steps()
+
+    for name, a, b, tol in zip(['normalize', 'boost', 'combine', 'combine_u8', 'to_uint16'],
+                               expected, result, [1e-5, 1e-5, 1e-5, 1e-3, 1]):
+        max_diff = np.abs(a.astype(np.float64) - b.astype(np.float64)).max()
+        print(f"{name}: 最大差异={max_diff:.2e} (容差{tol})")
+        assert max_diff <= tol
+
+
+def test_variance_weight_u8_matches_float():
+    """测试uint8方差权重图与float32版本相差不超过半个量化级"""
+    print("\n=== uint8方差权重测试 ===")
+
+    img = DicomEnhancer._normalize_image(_make_test_image())
+    expected = DicomEnhancer._scale_to_unit(DicomEnhancer._local_variance(img, 7))
+    weight = DicomEnhancer._variance_weight_u8(img, 7)
+
+    max_diff = np.abs(weight / 255.0 - expected).max()
+    print(f"dtype={weight.dtype}, 最大差异={max_diff:.4f}")
+    assert weight.dtype == np.uint8
+    assert max_diff <= 0.5 / 255 + 1e-6
+
+
+def test_constant_image():
+    """测试常数图像不产生NaN，内核与回退路径输出一致"""
+    print("\n=== 常数图像测试 ===")
+
+    image = np.full((64, 64), 1000, dtype=np.uint16)
+    for name in ['basic_enhance', 'advanced_enhance', 'super_enhance', 'auto_enhance']:
+        result = getattr(DicomEnhancer, name)(image)
+        print(f"{name}: 范围={result.min()}-{result.max()}")
+        assert result.shape == image.shape
+        assert result.dtype == np.uint16
+
+    var_map = np.zeros((8, 8), dtype=np.float32)
+    assert not np.isnan(DicomEnhancer._scale_to_unit(var_map)).any()
+
+
+def test_concurrent_enhance_matches_sequential():
+    """测试多线程同时增强的结果与逐张处理一致（CLAHE缓存不能跨线程共享）"""
+    print("\n=== 多线程并发增强测试 ===")
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    images = [_make_test_image((128, 96)) + i * 500 for i in range(16)]
+    expected = [DicomEnhancer.basic_enhance(image) for image in images]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(DicomEnhancer.basic_enhance, images))
+
+    mismatches = sum(not np.array_equal(r, e) for r, e in zip(results, expected))
+    print(f"不一致图像数: {mismatches}/{len(images)}")
+    assert mismatches == 0
+
+
+def test_flat_noise_not_amplified():
+    """
+    测试平坦噪声图像不被CLAHE过度放大
+
+    降噪后量化为256级再做CLAHE，输出标准差应与8位双边滤波时的水平相当
+    （约13000/5800/6500），连续16位输入或缩略图统计偏低选错分支时会升到18000以上
+    """
+    print("\n=== 平坦噪声回归测试 ===")
+
+    rng = np.random.default_rng(1)
+    image = np.clip(rng.normal(20000, 300, (512, 512)), 0, 65535).astype(np.uint16)
+
+    for name, max_std in [('advanced_enhance', 15000), ('super_enhance', 9000),
+                          ('auto_enhance', 9000)]:
+        std = getattr(DicomEnhancer, name)(image).std()
+        print(f"{name}: 标准差={std:.0f} (上限{max_std})")
+        assert std < max_std
+
+
+def test_super_enhance_gpu_failure_falls_back_to_cpu(monkeypatch):
+    """测试CUDA路径抛出cv2.error时回退到CPU，结果与CPU路径一致"""
+    print("\n=== CUDA失败回退测试 ===")
+
+    from core import dicom_enhancer
+
+    image = _make_test_image((600, 520))
+    monkeypatch.setattr(dicom_enhancer, 'HAS_CUDA', False)
+    expected = DicomEnhancer.super_enhance(image)
+
+    def failing_gpu(img_norm, progress_callback=None):
+        raise cv2.error("模拟CUDA失败")
+
+    monkeypatch.setattr(dicom_enhancer, 'HAS_CUDA', True)
+    monkeypatch.setattr(dicom_enhancer, 'super_enhance_gpu', failing_gpu)
+    result = DicomEnhancer.super_enhance(image)
+
+    assert np.array_equal(result, expected)
+    print("✅ 回退结果与CPU一致")
+
+
+@pytest.mark.skipif(not HAS_CUDA, reason="没有可用的CUDA设备")
+def test_super_enhance_gpu_matches_cpu(monkeypatch):
+    """
+    测试CUDA超级增强与CPU结果接近
+
+    GPU路径对大sigma模糊做降采样近似，且CUDA双边滤波实现不同，不要求逐像素一致：
+    平均绝对差不超过满量程的2%，相关系数不低于0.95
+    """
+    print("\n=== CUDA与CPU一致性测试 ===")
+
+    from core import dicom_enhancer
+
+    image = _make_test_image((1024, 1024))
+    gpu_result = DicomEnhancer.super_enhance(image).astype(np.float64)
+    monkeypatch.setattr(dicom_enhancer, 'HAS_CUDA', False)
+    cpu_result = DicomEnhancer.super_enhance(image).astype(np.float64)
+
+    mean_diff = np.abs(gpu_result - cpu_result).mean()
+    corr = np.corrcoef(gpu_result.ravel(), cpu_result.ravel())[0, 1]
+    print(f"平均绝对差={mean_diff:.1f}, 相关系数={corr:.4f}")
+    assert mean_diff <= 0.02 * 65535
+    assert corr >= 0.95
+
+
+if __name__ == "__main__":
+    test_enhance_levels_output()
+    test_enhance_does_not_modify_input()
+    test_progress_callback()
+    test_enhance_series_matches_sequential()
+    test_normalize_non_native_input()
+    test_variance_weight_u8_matches_float()
+    test_constant_image()
+    test_concurrent_enhance_matches_sequential()
+    test_flat_noise_not_amplified()
@@ -0,0 +1,87 @@
+"""
+边缘检测处理器测试
+
+验证OpenCV实现与原skimage实现的结果一致
+"""
+
+import sys
+import os
+import numpy as np
+from skimage import filters
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.edge_processor import EdgeProcessor
+
+
+def _make_test_image(shape=(128, 96)):
+    """生成带边缘和噪声的16位测试图像"""
+    rng = np.random.default_rng(0)
+    img = rng.normal(20000, 800, shape)
+    img[shape[0] // 3:, shape[1] // 2:] += 15000
+    return np.clip(img, 0, 65535).astype(np.uint16)
+
+
+def _skimage_responses(data):
+    """原skimage实现的未归一化边缘响应"""
+    data_float = data.astype(np.float32)
+    return {
+        'sobel_edge': np.sqrt(filters.sobel_h(data_float) ** 2 + filters.sobel_v(data_float) ** 2),
+        'laplacian_edge': np.abs(filters.laplace(data_float)),
+        'roberts_edge': filters.roberts(data_float),
+    }
+
+
+def test_edges_match_skimage():
+    """测试未归一化输出与skimage一致（float32舍入后截断，允许1个灰度级）"""
+    print("=== 边缘检测skimage一致性测试 ===")
+
+    image = _make_test_image()
+    for name, expected in _skimage_responses(image).items():
+        expected = np.clip(expected, 0, 65535).astype(np.uint16)
+        result = getattr(EdgeProcessor, name)(image, normalize=False)
+
+        max_diff = np.abs(result.astype(np.int32) - expected.astype(np.int32)).max()
+        print(f"{name}: 最大差异={max_diff}")
+        assert result.dtype == np.uint16
+        assert max_diff <= 1
+
+
+def test_normalized_edges_match_skimage():
+    """测试归一化到原始数据范围后与skimage一致（舍入方式不同，允许1个灰度级）"""
+    print("\n=== 归一化边缘skimage一致性测试 ===")
+
+    image = _make_test_image()
+    data_min, data_max = float(image.min()), float(image.max())
+    for name, expected in _skimage_responses(image).items():
+        expected = (expected - expected.min()) / (expected.max() - expected.min())
+        expected = np.clip(expected * (data_max - data_min) + data_min, 0, 65535).astype(np.uint16)
+        result = getattr(EdgeProcessor, name)(image)
+
+        max_diff = np.abs(result.astype(np.int32) - expected.astype(np.int32)).max()
+        print(f"{name}: 最大差异={max_diff}")
+        assert max_diff <= 1
+
+
+def test_canny_matches_skimage():
+    """测试OpenCV Canny与skimage实现的边缘重合度（Dice系数不低于0.95）"""
+    print("\n=== Canny skimage一致性测试 ===")
+
+    image = _make_test_image((256, 256))
+    for sigma, low, high in [(1.0, 0.1, 0.2), (2.0, 0.01, 0.03)]:
+        expected = EdgeProcessor.canny_edge(image, sigma, low, high, engine='skimage') > 0
+        result = EdgeProcessor.canny_edge(image, sigma, low, high)
+
+        edges = result > 0
+        dice = 2 * (edges & expected).sum() / (edges.sum() + expected.sum())
+        print(f"sigma={sigma}: 边缘像素 {expected.sum()} / {edges.sum()}, Dice={dice:.3f}")
+        assert result.dtype == np.uint16
+        assert set(np.unique(result)) <= {0, 65535}
+        assert dice >= 0.95
+
+
+if __name__ == "__main__":
+    test_edges_match_skimage()
+    test_normalized_edges_match_skimage()
+    test_canny_matches_skimage()
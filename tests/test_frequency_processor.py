@@ -0,0 +1,185 @@
+"""
+频域增强处理器测试
+
+验证rfft实现与原numpy.fft全平面实现的结果一致
+"""
+
+import sys
+import os
+import numpy as np
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.frequency_processor import FrequencyProcessor
+
+
+FILTERS = ['ideal_low_pass', 'ideal_high_pass', 'gaussian_low_pass', 'gaussian_high_pass']
+
+
+def _make_test_image(shape=(200, 161)):
+    """生成带纹理和噪声的16位测试图像（奇数列覆盖rfft半平面边界）"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:shape[0], 0:shape[1]]
+    img = 20000 + 8000 * np.sin(x / 7.0) * np.cos(y / 11.0) + rng.normal(0, 600, shape)
+    img[shape[0] // 3:, shape[1] // 2:] += 10000
+    return np.clip(img, 0, 65535).astype(np.uint16)
+
+
+def _reference_filter(data, cutoff_ratio, filter_type):
+    """原实现：中心化全平面滤波器 + numpy.fft复数变换"""
+    rows, cols = data.shape
+    crow, ccol = rows // 2, cols // 2
+    y, x = np.ogrid[:rows, :cols]
+    distance = np.sqrt((x - ccol) ** 2 + (y - crow) ** 2)
+    cutoff_frequency = cutoff_ratio * np.sqrt(crow ** 2 + ccol ** 2)
+
+    if filter_type == 'ideal_low':
+        filter_mask = (distance <= cutoff_frequency).astype(np.float32)
+    elif filter_type == 'ideal_high':
+        filter_mask = (distance > cutoff_frequency).astype(np.float32)
+    elif filter_type == 'gaussian_low':
+        filter_mask = np.exp(-(distance ** 2) / (2 * cutoff_frequency ** 2))
+    else:
+        filter_mask = 1 - np.exp(-(distance ** 2) / (2 * cutoff_frequency ** 2))
+
+    f_shift = np.fft.fftshift(np.fft.fft2(data.astype(np.float32)))
+    result = np.abs(np.fft.ifft2(np.fft.ifftshift(f_shift * filter_mask)))
+
+    result_min, result_max = result.min(), result.max()
+    result = (result - result_min) / (result_max - result_min)
+    result = result * (data.max() - data.min()) + data.min()
+    return np.clip(result, 0, 65535).astype(np.uint16)
+
+
+def test_filters_match_reference():
+    """测试四种滤波器与原实现一致（float32变换的舍入误差，允许2个灰度级）"""
+    print("=== 频域滤波一致性测试 ===")
+
+    for shape in [(200, 161), (128, 128)]:
+        image = _make_test_image(shape)
+        for name in FILTERS:
+            for cutoff_ratio in [0.05, 0.2]:
+                expected = _reference_filter(image, cutoff_ratio, name.rsplit('_', 1)[0])
+                result = getattr(FrequencyProcessor, name)(image, cutoff_ratio)
+
+                max_diff = np.abs(result.astype(np.int32) - expected.astype(np.int32)).max()
+                print(f"{shape} {name} cutoff={cutoff_ratio}: 最大差异={max_diff}")
+                assert result.shape == image.shape
+                assert result.dtype == np.uint16
+                assert max_diff <= 2
+
+
+def test_filter_mask_cached_read_only():
+    """测试相同参数的滤波器复用缓存且不可写"""
+    print("\n=== 滤波器缓存测试 ===")
+
+    first = FrequencyProcessor._create_frequency_filter((64, 48), 0.1, 'gaussian_low')
+    second = FrequencyProcessor._create_frequency_filter((64, 48), 0.1, 'gaussian_low')
+    other = FrequencyProcessor._create_frequency_filter((64, 48), 0.2, 'gaussian_low')
+
+    assert first is second
+    assert other is not first
+    assert not first.flags.writeable
+
+    from core.frequency_processor import _radial_distance
+    distance = _radial_distance(64, 48)
+    assert distance is _radial_distance(64, 48)
+    assert not distance.flags.writeable
+    print("✅ 滤波器和距离矩阵缓存命中且只读")
+
+
+def test_rfft_layout_matches_centered():
+    """测试rfft半平面布局的滤波器与中心化滤波器移位截取后一致"""
+    print("\n=== 滤波器布局测试 ===")
+
+    for shape in [(64, 48), (63, 49)]:
+        for filter_type in ['ideal_low', 'ideal_high', 'gaussian_low', 'gaussian_high']:
+            centered = FrequencyProcessor._create_frequency_filter(shape, 0.2, filter_type)
+            half = FrequencyProcessor._create_frequency_filter(shape, 0.2, filter_type, layout='rfft')
+            expected = np.fft.ifftshift(centered)[:, :shape[1] // 2 + 1]
+            assert half.shape == expected.shape
+            assert np.array_equal(half, expected)
+    print("✅ rfft布局与中心化布局一致")
+
+
+def test_spectrum_stays_single_precision():
+    """测试滤波器为float32、频谱为complex64，整个频域乘法不升级到双精度"""
+    print("\n=== 单精度频谱测试 ===")
+
+    from core.frequency_processor import _fft_context
+
+    image = _make_test_image()
+    context = _fft_context(image.shape)
+    spectrum = context.forward(image)
+    print(f"频谱类型: {spectrum.dtype}, 乘积缓冲区类型: {context.product.dtype}")
+    assert spectrum.dtype == np.complex64
+    assert context.product.dtype == np.complex64
+
+    for name in FILTERS:
+        filter_type = name.rsplit('_', 1)[0]
+        mask = FrequencyProcessor._create_frequency_filter(image.shape, 0.1, filter_type, layout='rfft')
+        assert mask.dtype == np.float32
+        assert np.result_type(spectrum, mask) == np.complex64
+
+
+def test_fft_context_reused_per_thread():
+    """测试同尺寸调用复用FFT工作区，不同线程使用各自的工作区"""
+    print("\n=== FFT工作区复用测试 ===")
+
+    from concurrent.futures import ThreadPoolExecutor
+    from core.frequency_processor import _fft_context
+
+    image = _make_test_image()
+    FrequencyProcessor.gaussian_low_pass(image)
+    context = _fft_context(image.shape)
+    FrequencyProcessor.gaussian_high_pass(image)
+    assert _fft_context(image.shape) is context
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        other = executor.submit(_fft_context, image.shape).result()
+    assert other is not context
+
+    # 多线程同时滤波结果与单线程一致
+    images = [_make_test_image() + i * 100 for i in range(8)]
+    expected = [FrequencyProcessor.gaussian_low_pass(img) for img in images]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(FrequencyProcessor.gaussian_low_pass, images))
+    assert all(np.array_equal(r, e) for r, e in zip(results, expected))
+    print("✅ 工作区按线程复用")
+
+
+def test_constant_image_returned_unchanged():
+    """测试常数图像滤波后保持原值"""
+    print("\n=== 常数图像测试 ===")
+
+    image = np.full((32, 40), 1234, dtype=np.uint16)
+    for name in FILTERS:
+        result = getattr(FrequencyProcessor, name)(image, 0.1)
+        print(f"{name}: 范围={result.min()}-{result.max()}")
+        assert result.dtype == np.uint16
+        assert np.array_equal(result, image)
+
+
+def test_apply_filters_matches_individual():
+    """测试批量滤波与逐个调用滤波方法结果一致"""
+    print("\n=== 批量滤波测试 ===")
+
+    image = _make_test_image()
+    specs = [(name.rsplit('_', 1)[0], cutoff) for name in FILTERS for cutoff in (0.05, 0.2)]
+    results = FrequencyProcessor.apply_filters(image, specs)
+
+    assert len(results) == len(specs)
+    for (filter_type, cutoff), result in zip(specs, results):
+        expected = getattr(FrequencyProcessor, filter_type + '_pass')(image, cutoff)
+        assert np.array_equal(result, expected)
+    print(f"✅ {len(specs)}个滤波结果一致")
+
+
+if __name__ == "__main__":
+    test_filters_match_reference()
+    test_filter_mask_cached_read_only()
+    test_rfft_layout_matches_centered()
+    test_fft_context_reused_per_thread()
+    test_constant_image_returned_unchanged()
+    test_apply_filters_matches_individual()
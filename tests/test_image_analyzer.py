@@ -0,0 +1,224 @@
+"""
+图像质量分析器测试
+
+验证向量化实现与原逐像素/逐块实现的指标一致
+"""
+
+import sys
+import os
+import numpy as np
+from scipy import ndimage
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.image_analyzer import ImageQualityAnalyzer
+
+
+def _make_test_image(shape=(200, 168)):
+    """生成带块状纹理和噪声的0-1浮点测试图像"""
+    rng = np.random.default_rng(0)
+    img = rng.random(shape).astype(np.float32) * 0.2 + 0.4
+    img[shape[0] // 2:, shape[1] // 3:] += 0.3
+    return img
+
+
+def test_local_variance_matches_generic_filter():
+    """测试盒式滤波局部方差与generic_filter(np.var)一致"""
+    print("=== 局部方差一致性测试 ===")
+
+    img = _make_test_image()
+    for size in (3, 5):
+        expected = ndimage.generic_filter(img, np.var, size=size)
+        result = ImageQualityAnalyzer._local_variance(img, size)
+
+        max_diff = np.abs(result - expected).max()
+        print(f"size={size}: 最大差异={max_diff:.2e}")
+        assert result.shape == img.shape
+        assert max_diff < 1e-6
+
+
+def _reference_block_stats(img, block_size=8):
+    """原逐块循环实现：块内方差均值、块间方差、相邻块相关系数标准差"""
+    h_blocks = img.shape[0] // block_size
+    w_blocks = img.shape[1] // block_size
+    block_means = np.zeros((h_blocks, w_blocks))
+    intra_vars = []
+    for i in range(h_blocks):
+        for j in range(w_blocks):
+            block = img[i*block_size:(i+1)*block_size, j*block_size:(j+1)*block_size]
+            block_means[i, j] = np.mean(block)
+            intra_vars.append(np.var(block))
+
+    correlations = []
+    for i in range(h_blocks - 1):
+        for j in range(w_blocks - 1):
+            block1 = img[i*block_size:(i+1)*block_size, j*block_size:(j+1)*block_size]
+            block2 = img[(i+1)*block_size:(i+2)*block_size, j*block_size:(j+1)*block_size]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                corr = np.corrcoef(block1.flatten(), block2.flatten())[0, 1]
+            if not np.isnan(corr):
+                correlations.append(corr)
+
+    return np.mean(intra_vars), np.var(block_means), np.std(correlations) if correlations else 0
+
+
+def test_block_statistics_match_loops():
+    """测试向量化块统计与逐块循环结果一致（相对误差1e-5，平坦块的块内方差允许1e-12的绝对误差）"""
+    print("\n=== 块统计一致性测试 ===")
+
+    rng = np.random.default_rng(1)
+    mosaic = np.kron(rng.random((25, 21)), np.ones((8, 8))).astype(np.float32)
+    mosaic[:40, :40] = 0.5
+
+    for img in [_make_test_image(), _make_test_image((203, 171)), mosaic]:
+        intra, inter, corr_std = _reference_block_stats(img)
+        mosaic_stats = ImageQualityAnalyzer._mosaic_detection(img)
+        spatial_stats = ImageQualityAnalyzer._spatial_correlation(img)
+
+        print(f"{img.shape}: 块内方差={mosaic_stats['avg_intra_block_variance']:.3e}, "
+              f"块间方差={mosaic_stats['inter_block_variance']:.3e}, "
+              f"相关系数标准差={spatial_stats['block_correlation_std']:.3e}")
+        assert np.isclose(mosaic_stats['avg_intra_block_variance'], intra, rtol=1e-5, atol=1e-12)
+        assert np.isclose(mosaic_stats['inter_block_variance'], inter, rtol=1e-5)
+        assert np.isclose(spatial_stats['block_correlation_std'], corr_std, rtol=1e-5)
+
+
+def test_block_statistics_numpy_fallback(monkeypatch):
+    """测试未安装Numba时的NumPy块统计与内核结果一致（1e-9）"""
+    print("\n=== 块统计NumPy回退测试 ===")
+
+    from core import image_analyzer
+
+    img = _make_test_image((203, 171))
+    expected = ImageQualityAnalyzer._block_statistics(img, 8)
+    monkeypatch.setattr(image_analyzer, 'block_stats', None)
+    result = ImageQualityAnalyzer._block_statistics(img, 8)
+
+    for name, a, b in zip(['均值', '块内方差', '相关系数'], expected, result):
+        max_diff = np.nanmax(np.abs(a - b))
+        print(f"{name}: 形状={b.shape}, 最大差异={max_diff:.2e}")
+        assert a.shape == b.shape
+        assert np.array_equal(np.isnan(a), np.isnan(b))
+        assert max_diff < 1e-9
+
+
+def test_shift_correlations_match_corrcoef():
+    """测试平移自相关与np.corrcoef一致（1e-9）"""
+    print("\n=== 平移自相关一致性测试 ===")
+
+    img = _make_test_image()
+    expected = {
+        'horizontal_correlation': np.corrcoef(img[:-1].flatten(), img[1:].flatten())[0, 1],
+        'vertical_correlation': np.corrcoef(img[:, :-1].flatten(), img[:, 1:].flatten())[0, 1],
+        'diagonal_correlation_1': np.corrcoef(img[:-1, :-1].flatten(), img[1:, 1:].flatten())[0, 1],
+        'diagonal_correlation_2': np.corrcoef(img[:-1, 1:].flatten(), img[1:, :-1].flatten())[0, 1],
+    }
+    result = ImageQualityAnalyzer._spatial_correlation(img)
+
+    for key, value in expected.items():
+        print(f"{key}: {result[key]:.6f} / {value:.6f}")
+        assert abs(result[key] - value) < 1e-9
+
+    flat = ImageQualityAnalyzer._spatial_correlation(np.full((32, 32), 0.5, dtype=np.float32))
+    assert flat['horizontal_correlation'] == 0.0
+
+
+def test_analyze_does_not_modify_input():
+    """测试分析不修改输入，uint16与float32输入的归一化统计一致"""
+    print("\n=== 输入保护与归一化测试 ===")
+
+    rng = np.random.default_rng(2)
+    image_u16 = rng.integers(1000, 60000, (96, 80)).astype(np.uint16)
+    image_f32 = image_u16.astype(np.float32)
+    original = image_f32.copy()
+
+    result_u16 = ImageQualityAnalyzer.analyze_image_quality(image_u16, "uint16")
+    result_f32 = ImageQualityAnalyzer.analyze_image_quality(image_f32, "float32")
+
+    expected = (original - original.min()) / (original.max() - original.min())
+    assert np.array_equal(image_f32, original)
+    assert abs(result_f32['mean'] - expected.mean()) < 1e-6
+    assert abs(result_u16['mean'] - result_f32['mean']) < 1e-6
+    assert result_u16['range'] == result_f32['range']
+
+
+def test_edge_quality_matches_skimage():
+    """测试OpenCV Canny+膨胀的边缘指标与skimage实现接近"""
+    print("\n=== 边缘质量一致性测试 ===")
+
+    from skimage import feature, morphology
+
+    img = _make_test_image((400, 300))
+    edges = feature.canny(img, sigma=1.0)
+    expected_density = np.sum(edges) / edges.size
+    expected_continuity = np.sum(morphology.dilation(edges, morphology.disk(2))) / np.sum(edges)
+
+    result = ImageQualityAnalyzer._edge_quality(img)
+    print(f"边缘密度: {result['edge_density']:.5f} vs {expected_density:.5f}")
+    print(f"边缘连续性: {result['edge_continuity']:.3f} vs {expected_continuity:.3f}")
+    assert abs(result['edge_density'] - expected_density) <= 0.05 * expected_density
+    assert abs(result['edge_continuity'] - expected_continuity) <= 0.05 * expected_continuity
+
+
+def _reference_frequency_analysis(img):
+    """原实现：复数取模后分别对三个掩码区域求平方和"""
+    magnitude = np.abs(np.fft.fftshift(np.fft.fft2(img.astype(np.float64))))
+    h, w = img.shape
+    center_h, center_w = h // 2, w // 2
+    y, x = np.ogrid[:h, :w]
+    dist_from_center = np.sqrt((x - center_w)**2 + (y - center_h)**2)
+    max_dist = min(center_h, center_w)
+    total_energy = np.sum(magnitude**2)
+    low = np.sum(magnitude[dist_from_center <= max_dist * 0.1]**2) / total_energy
+    high = np.sum(magnitude[dist_from_center > max_dist * 0.5]**2) / total_energy
+    return low, 1.0 - low - high, high
+
+
+def test_frequency_analysis_matches_reference():
+    """测试频域能量分布与原实现一致"""
+    print("\n=== 频域能量分布一致性测试 ===")
+
+    for shape in [(200, 168), (127, 96)]:
+        img = _make_test_image(shape)
+        expected = _reference_frequency_analysis(img)
+        result = ImageQualityAnalyzer._frequency_analysis(img)
+        actual = (result['low_freq_energy'], result['mid_freq_energy'], result['high_freq_energy'])
+
+        max_diff = np.abs(np.array(actual) - np.array(expected)).max()
+        print(f"shape={shape}: 最大差异={max_diff:.2e}")
+        assert max_diff < 1e-5
+
+
+def test_analysis_decorator_gated(monkeypatch):
+    """测试分析装饰器默认不做分析，启用后才分析处理前后图像"""
+    print("\n=== 分析装饰器开关测试 ===")
+
+    from core import image_analyzer
+
+    calls = []
+    monkeypatch.setattr(ImageQualityAnalyzer, 'analyze_image_quality',
+                        staticmethod(lambda img, name="": calls.append(name) or {}))
+    monkeypatch.setattr(ImageQualityAnalyzer, 'compare_analyses',
+                        staticmethod(lambda before, after: None))
+
+    decorated = image_analyzer.image_analysis_decorator(lambda img: img + 1)
+    img = _make_test_image((32, 32))
+
+    monkeypatch.setattr(image_analyzer, 'ANALYSIS_ENABLED', False)
+    assert np.array_equal(decorated(img), img + 1)
+    assert calls == []
+
+    monkeypatch.setattr(image_analyzer, 'ANALYSIS_ENABLED', True)
+    assert np.array_equal(decorated(img), img + 1)
+    print(f"启用后分析次数: {len(calls)}")
+    assert len(calls) == 2
+
+
+if __name__ == "__main__":
+    test_local_variance_matches_generic_filter()
+    test_block_statistics_match_loops()
+    test_shift_correlations_match_corrcoef()
+    test_analyze_does_not_modify_input()
+    test_edge_quality_matches_skimage()
+    test_frequency_analysis_matches_reference()
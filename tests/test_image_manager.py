@@ -0,0 +1,292 @@
+"""
+图像管理器测试
+
+验证窗宽窗位显示在GPU和CPU路径间的一致性
+"""
+
+import sys
+import os
+import numpy as np
+import cv2
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.image_manager import ImageManager, ImageData
+from core._gpu import HAS_CUDA
+
+
+def _make_image_data(shape=(768, 704)):
+    """生成16位测试图像数据"""
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 4096, shape, dtype=np.uint16)
+    return ImageData(data=data, metadata={}, window_width=1500.0, window_level=300.0, id=1)
+
+
+def _write_dicom(path, pixels, transfer_syntax, bits_stored):
+    """写一个单帧灰度DICOM文件"""
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import generate_uid
+
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.TransferSyntaxUID = transfer_syntax
+    ds.file_meta.MediaStorageSOPClassUID = generate_uid()
+    ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.Rows, ds.Columns = pixels.shape
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.BitsAllocated = pixels.dtype.itemsize * 8
+    ds.BitsStored = bits_stored
+    ds.HighBit = bits_stored - 1
+    ds.PixelRepresentation = 1 if pixels.dtype.kind == 'i' else 0
+    ds.WindowWidth = 1000
+    ds.WindowCenter = 500
+    ds.PixelData = pixels.tobytes()
+    ds.save_as(path, enforce_file_format=True)
+
+
+def test_native_pixel_read_matches_pydicom(tmp_path):
+    """测试直接读取未压缩像素数据与pydicom的pixel_array一致（含未用高位的处理）"""
+    print("\n=== 未压缩像素直接读取测试 ===")
+
+    import pydicom
+    from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian
+
+    rng = np.random.default_rng(0)
+    cases = [(np.uint16, 16), (np.uint16, 12), (np.int16, 12), (np.int16, 16), (np.uint8, 8)]
+    for transfer_syntax in (ExplicitVRLittleEndian, ImplicitVRLittleEndian):
+        for dtype, bits_stored in cases:
+            info = np.iinfo(dtype)
+            pixels = rng.integers(info.min, info.max, (37, 29), dtype=dtype, endpoint=True)
+            path = str(tmp_path / f"{transfer_syntax}_{np.dtype(dtype).name}_{bits_stored}.dcm")
+            _write_dicom(path, pixels, transfer_syntax, bits_stored)
+
+            with open(path, 'rb') as f:
+                ds = pydicom.dcmread(f, stop_before_pixels=True)
+                result = ImageManager._read_native_pixels(f, ds)
+            expected = pydicom.dcmread(path).pixel_array
+
+            print(f"{transfer_syntax.name} {np.dtype(dtype).name} BitsStored={bits_stored}")
+            assert result is not None
+            assert result.dtype == expected.dtype
+            assert np.array_equal(result, expected)
+
+    path = str(tmp_path / "load.dcm")
+    pixels = rng.integers(0, 4096, (37, 29), dtype=np.uint16)
+    _write_dicom(path, pixels, ExplicitVRLittleEndian, 12)
+    manager = ImageManager()
+    assert manager.load_dicom(path)
+    assert np.array_equal(manager.original_image.data, pixels)
+    assert manager.original_image.window_width == 1000
+
+    # 8位数据左移8位转换为16位
+    pixels = rng.integers(0, 256, (37, 29), dtype=np.uint8)
+    _write_dicom(path, pixels, ExplicitVRLittleEndian, 8)
+    assert manager.load_dicom(path)
+    assert manager.original_image.data.dtype == np.uint16
+    assert np.array_equal(manager.original_image.data, pixels.astype(np.uint16) * 256)
+    print("✅ 直接读取结果与pydicom一致")
+
+
+def test_load_dicom_metadata_skips_pixels(tmp_path):
+    """测试只读元数据与完整加载得到的元数据一致，且不读取像素数据"""
+    print("\n=== 元数据加载测试 ===")
+
+    from pydicom.uid import ExplicitVRLittleEndian
+
+    pixels = np.random.default_rng(0).integers(0, 4096, (64, 48), dtype=np.uint16)
+    path = tmp_path / "meta.dcm"
+    _write_dicom(str(path), pixels, ExplicitVRLittleEndian, 12)
+
+    manager = ImageManager()
+    assert manager.load_dicom(str(path))
+    metadata = ImageManager.load_dicom_metadata(str(path))
+    print(f"元数据: {metadata}")
+    assert metadata == manager.original_image.metadata
+
+    # 截掉像素数据后元数据仍可读取
+    raw = path.read_bytes()
+    truncated = tmp_path / "truncated.dcm"
+    truncated.write_bytes(raw[:len(raw) - pixels.nbytes // 2])
+    assert ImageManager.load_dicom_metadata(str(truncated)) == metadata
+
+
+def test_loaded_data_shared_read_only(tmp_path):
+    """测试加载后原始图像和当前图像共用只读数组和只读元数据，处理结果替换当前图像且不影响原始图像"""
+    print("\n=== 加载数据共享测试 ===")
+
+    from pydicom.uid import ExplicitVRLittleEndian
+
+    pixels = np.random.default_rng(0).integers(0, 4096, (64, 48), dtype=np.uint16)
+    path = str(tmp_path / "shared.dcm")
+    _write_dicom(path, pixels, ExplicitVRLittleEndian, 12)
+
+    manager = ImageManager()
+    assert manager.load_dicom(path)
+    assert manager.current_image.data is manager.original_image.data
+    assert not manager.original_image.data.flags.writeable
+    with pytest.raises(ValueError):
+        manager.current_image.data[0, 0] = 1
+
+    manager.apply_processing('test', {}, manager.current_image.data + 1)
+    assert np.array_equal(manager.original_image.data, pixels)
+    assert np.array_equal(manager.current_image.data, pixels + 1)
+
+    manager.reset_to_original()
+    assert manager.current_image.data is manager.original_image.data
+    assert manager.current_image.metadata is manager.original_image.metadata
+    with pytest.raises(TypeError):
+        manager.current_image.metadata['window_width'] = 1.0
+    print("✅ 原始图像数据未被修改")
+
+
+def test_processing_history_timestamps():
+    """测试处理历史的时间戳为纳秒整数且按追加顺序不减"""
+    print("\n=== 处理历史时间戳测试 ===")
+
+    manager = ImageManager()
+    manager.current_image = _make_image_data()
+    for i in range(3):
+        manager.apply_processing(f'step{i}', {}, manager.current_image.data)
+
+    timestamps = [record['timestamp'] for record in manager.processing_history]
+    print(f"时间戳: {timestamps}")
+    assert all(isinstance(t, int) for t in timestamps)
+    assert timestamps == sorted(timestamps)
+
+
+def test_effective_range_bincount_matches_histogram():
+    """测试整数数据的计数直方图与直接对全图分箱得到相同的有效范围（含过曝背景）"""
+    print("\n=== 有效范围计算测试 ===")
+
+    rng = np.random.default_rng(0)
+    data = np.clip(rng.normal(2000, 300, (300, 256)), 0, 65535).astype(np.uint16)
+    overexposed = data.copy()
+    overexposed[:100] = 60000
+
+    manager = ImageManager()
+    for case in [data, overexposed, (data >> 4).astype(np.uint8), data[::3, ::2]]:
+        result = manager._detect_effective_range(case)
+        # int32数据走原来的全图分箱路径
+        expected = manager._detect_effective_range(case.astype(np.int32))
+        print(f"dtype={case.dtype}: {result} vs {expected}")
+        assert result == expected
+
+
+def test_data_range_cached_until_data_replaced():
+    """测试最小/最大值缓存与NumPy结果一致，数据替换后重新计算"""
+    print("\n=== 数据范围缓存测试 ===")
+
+    image_data = _make_image_data()
+    expected = (int(image_data.data.min()), int(image_data.data.max()))
+    assert image_data.data_range == expected
+
+    new_data = np.full((16, 16), 70000, dtype=np.int64)
+    new_data[0, 0] = -5
+    image_data.data = new_data
+    assert image_data.data_range == (-5, 70000)
+
+    image_data.data = np.arange(24, dtype=np.uint16).reshape(2, 3, 4)
+    print(f"三维数据范围: {image_data.data_range}")
+    assert image_data.data_range == (0, 23)
+
+    # 使用__slots__，缓存字段也在槽中
+    assert not hasattr(image_data, '__dict__')
+
+
+def test_display_cache_per_image_settings(tmp_path):
+    """测试显示缓存按图像各自的设置命中：双窗口切换反相时两幅图都重新计算"""
+    print("\n=== 显示缓存测试 ===")
+
+    from pydicom.uid import ExplicitVRLittleEndian
+
+    pixels = np.random.default_rng(0).integers(0, 4096, (64, 48), dtype=np.uint16)
+    path = str(tmp_path / "cache.dcm")
+    _write_dicom(path, pixels, ExplicitVRLittleEndian, 12)
+
+    manager = ImageManager()
+    assert manager.load_dicom(path)
+    original, current = manager.original_image, manager.current_image
+
+    # 加载时不预先计算；两幅图共用数组和设置，显示数据只算一次
+    assert manager.original_display_cache is None and manager.current_display_cache is None
+    assert manager.get_windowed_image(current) is manager.get_windowed_image(original)
+    assert manager.get_windowed_image(current) is manager.get_windowed_image(current)
+
+    for invert in (True, False, True):
+        original_display = manager.get_windowed_image(original, invert=invert)
+        current_display = manager.get_windowed_image(current, invert=invert)
+        expected = manager._calculate_windowed_display(current, invert)
+        assert np.array_equal(original_display, expected)
+        assert np.array_equal(current_display, expected)
+
+    # 落在同一张查找表上的微小变化直接命中缓存
+    cached = manager.get_windowed_image(current, invert=True)
+    manager.update_window_settings(current.window_width + 0.001, current.window_level - 0.001)
+    assert manager.get_windowed_image(current, invert=True) is cached
+
+    manager.update_window_settings(200.0, 100.0)
+    assert not np.array_equal(manager.get_windowed_image(current, invert=True),
+                              manager.get_windowed_image(original, invert=True))
+    print("✅ 显示缓存与直接计算一致")
+
+
+def test_windowed_display_gpu_failure_falls_back_to_cpu(monkeypatch):
+    """测试CUDA加窗抛出cv2.error时回退到CPU查找表"""
+    print("\n=== CUDA加窗失败回退测试 ===")
+
+    from core import image_manager
+
+    manager = ImageManager()
+    image_data = _make_image_data()
+    monkeypatch.setattr(image_manager, 'HAS_CUDA', False)
+    expected = manager._calculate_windowed_display(image_data, invert=True)
+
+    def failing_gpu(gpu_data, window_width, window_level, invert=False):
+        raise cv2.error("模拟CUDA失败")
+
+    monkeypatch.setattr(image_manager, 'HAS_CUDA', True)
+    monkeypatch.setattr(image_manager, 'window_level_gpu', failing_gpu)
+    monkeypatch.setattr(manager, '_get_gpu_image', lambda image: None)
+    result = manager._calculate_windowed_display(image_data, invert=True)
+
+    assert np.array_equal(result, expected)
+    print("✅ 回退结果与CPU一致")
+
+
+@pytest.mark.skipif(not HAS_CUDA, reason="没有可用的CUDA设备")
+def test_windowed_display_gpu_matches_cpu(monkeypatch):
+    """测试CUDA加窗与CPU查找表最多相差1个灰度级（四舍五入与截断的差别）"""
+    print("\n=== CUDA与CPU加窗一致性测试 ===")
+
+    from core import image_manager
+
+    manager = ImageManager()
+    image_data = _make_image_data()
+
+    for invert in (False, True):
+        gpu_result = manager._calculate_windowed_display(image_data, invert)
+        with monkeypatch.context() as m:
+            m.setattr(image_manager, 'HAS_CUDA', False)
+            cpu_result = manager._calculate_windowed_display(image_data, invert)
+
+        max_diff = np.abs(gpu_result.astype(np.int16) - cpu_result.astype(np.int16)).max()
+        print(f"invert={invert}: 最大差异={max_diff}")
+        assert gpu_result.dtype == np.uint8
+        assert max_diff <= 1
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_native_pixel_read_matches_pydicom(Path(tmp_dir))
+        test_load_dicom_metadata_skips_pixels(Path(tmp_dir))
+        test_loaded_data_shared_read_only(Path(tmp_dir))
+        test_display_cache_per_image_settings(Path(tmp_dir))
+    test_processing_history_timestamps()
+    test_effective_range_bincount_matches_histogram()
+    test_data_range_cached_until_data_replaced()
+    test_windowed_display_gpu_failure_falls_back_to_cpu(pytest.MonkeyPatch())
@@ -0,0 +1,300 @@
+"""
+图像处理算法测试
+
+验证ImageProcessor各算法与原skimage实现的结果一致
+"""
+
+import sys
+import os
+import numpy as np
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core.image_processor import ImageProcessor
+
+
+def _make_test_image(shape=(256, 200)):
+    """生成带纹理和噪声的16位测试图像"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:shape[0], 0:shape[1]]
+    img = 20000 + 8000 * np.sin(x / 17.0) * np.cos(y / 23.0) + rng.normal(0, 600, shape)
+    return np.clip(img, 0, 65535).astype(np.uint16)
+
+
+def test_median_filter_matches_skimage():
+    """测试中值滤波与skimage圆形结构元素的中值滤波一致"""
+    print("\n=== 中值滤波测试 ===")
+
+    from skimage import filters, morphology
+
+    image = _make_test_image()
+    for disk_size in [1, 2, 3, 5]:
+        result = ImageProcessor.median_filter(image, disk_size)
+        expected = filters.median(image, morphology.disk(disk_size)).astype(np.uint16)
+        print(f"disk_size={disk_size}: dtype={result.dtype}")
+        assert result.dtype == np.uint16
+        assert np.array_equal(result, expected)
+
+
+def test_median_filter_row_strips_match_whole_image(monkeypatch):
+    """测试大图按行条带多线程中值滤波与整幅处理逐像素一致（含条带数不整除行数）"""
+    print("\n=== 条带并行中值滤波测试 ===")
+
+    from core import image_processor
+
+    image = _make_test_image((257, 200))
+    expected = ImageProcessor.median_filter(image, 3, workers=1)
+    monkeypatch.setattr(image_processor, 'PARALLEL_MIN_PIXELS', 0)
+    for workers in [2, 3, 8]:
+        result = ImageProcessor.median_filter(image, 3, workers=workers)
+        print(f"workers={workers}: 一致={np.array_equal(result, expected)}")
+        assert result.dtype == np.uint16
+        assert np.array_equal(result, expected)
+
+
+def test_morphological_operation_cached_disk():
+    """测试形态学操作（OpenCV实现）使用缓存的只读结构元素，各尺寸结果与skimage逐像素一致"""
+    print("\n=== 形态学操作测试 ===")
+
+    from skimage import morphology
+    from core.image_processor import _disk
+
+    image = _make_test_image()
+    for disk_size in [1, 2, 5]:
+        for operation in ['erosion', 'dilation', 'opening', 'closing']:
+            result = ImageProcessor.morphological_operation(image, operation, disk_size)
+            expected = getattr(morphology, operation)(image, morphology.disk(disk_size))
+            print(f"{operation}(disk={disk_size}): dtype={result.dtype}")
+            assert np.array_equal(result, expected)
+
+    assert _disk(2) is _disk(2)
+    assert not _disk(2).flags.writeable
+
+
+def test_gamma_correction_lut_matches_float():
+    """测试16位Gamma校正查找表与逐像素float32计算结果完全一致，常数图像保持不变"""
+    print("\n=== Gamma校正查找表测试 ===")
+
+    def float_gamma(data, gamma):
+        normalized = data.astype(np.float32)
+        normalized = (normalized - normalized.min()) / (normalized.max() - normalized.min())
+        corrected = np.power(normalized, gamma) * (data.max() - data.min()) + data.min()
+        return corrected.astype(np.uint16)
+
+    image = _make_test_image()
+    for gamma in [0.3, 1.0, 2.2]:
+        for data in [image, image[::2, 1::3]]:
+            result = ImageProcessor.gamma_correction(data, gamma)
+            print(f"gamma={gamma}, 形状={data.shape}: dtype={result.dtype}")
+            assert result.dtype == np.uint16
+            assert np.array_equal(result, float_gamma(data, gamma))
+
+    constant = np.full((16, 16), 1000, dtype=np.uint16)
+    assert np.array_equal(ImageProcessor.gamma_correction(constant, 2.0), constant)
+
+
+def test_rescale_to_range_matches_numpy():
+    """测试滤波结果的一次性拉伸与逐步NumPy归一化最多相差1个灰度级，常数结果返回原图"""
+    print("\n=== 范围拉伸测试 ===")
+
+    from skimage import filters
+
+    image = _make_test_image()
+    filtered = filters.gaussian(image.astype(np.float32), sigma=2.0)
+    for result in [filtered, filtered.astype(np.float64), filtered[:, :, np.newaxis]]:
+        rescaled = ImageProcessor._rescale_to_range(result, image)
+        expected = (result - result.min()) / (result.max() - result.min())
+        expected = (expected * (image.max() - image.min()) + image.min()).astype(np.uint16)
+        max_diff = np.abs(rescaled.astype(np.int32) - expected).max()
+        print(f"dtype={result.dtype}, 形状={result.shape}: 最大差异={max_diff}")
+        assert rescaled.dtype == np.uint16
+        assert rescaled.shape == result.shape
+        assert max_diff <= 1
+
+    constant = np.full((16, 16), 1000, dtype=np.uint16)
+    for name in ['gaussian_filter', 'unsharp_mask', 'low_pass_filter']:
+        assert np.array_equal(getattr(ImageProcessor, name)(constant), constant)
+
+
+def test_gaussian_filter_uint16_matches_skimage():
+    """
+    测试16位高斯滤波直接输出uint16，与skimage浮点结果最多相差1个灰度级；
+    preserve_range=True时拉伸回输入范围
+    """
+    print("\n=== 16位高斯滤波测试 ===")
+
+    from skimage import filters
+
+    image = _make_test_image()
+    for sigma in [0.5, 1.0, 3.0]:
+        result = ImageProcessor.gaussian_filter(image, sigma)
+        expected = filters.gaussian(image.astype(np.float32), sigma=sigma, preserve_range=True)
+        max_diff = np.abs(result - expected).max()
+        print(f"sigma={sigma}: dtype={result.dtype}, 最大差异={max_diff:.3f}")
+        assert result.dtype == np.uint16
+        assert max_diff <= 1
+
+    stretched = ImageProcessor.gaussian_filter(image, 2.0, preserve_range=True)
+    assert (stretched.min(), stretched.max()) == (image.min(), image.max())
+
+
+def test_min_max_single_pass():
+    """测试一次遍历的最小/最大值与NumPy一致（含非连续、多维和cv2不支持的类型）"""
+    print("\n=== 最小/最大值测试 ===")
+
+    from core.image_processor import _min_max
+
+    image = _make_test_image()
+    for data in [image, image[::2, ::3], image.astype(np.float32)[:, :, np.newaxis],
+                 image.astype(np.uint32), image.ravel()]:
+        result = _min_max(data)
+        print(f"dtype={data.dtype}, 形状={data.shape}: {result}")
+        assert result == (data.min(), data.max())
+
+
+def test_frequency_filters_match_full_spectrum():
+    """
+    测试频域路径的半频谱高斯低通/高通与全平面fft2+fftshift实现最多相差1个灰度级（含奇数尺寸）
+
+    cutoff=0.02和0.3对应的空间sigma分别过大和过小，都走频域路径
+    """
+    print("\n=== 频域高斯滤波测试 ===")
+
+    def full_spectrum_filter(data, cutoff, highpass):
+        rows, cols = data.shape
+        f_shifted = np.fft.fftshift(np.fft.fft2(data.astype(np.float32)))
+        y, x = np.ogrid[:rows, :cols]
+        mask = np.exp(-((x - cols // 2) ** 2 + (y - rows // 2) ** 2) / (2 * (cutoff * min(rows, cols)) ** 2))
+        if highpass:
+            mask = 1 - mask
+        result = np.real(np.fft.ifft2(np.fft.ifftshift(f_shifted * mask)))
+        return ImageProcessor._rescale_to_range(result, data)
+
+    for shape in [(256, 200), (255, 201)]:
+        image = _make_test_image(shape)
+        for cutoff in [0.02, 0.3]:
+            low = ImageProcessor.low_pass_filter(image, cutoff)
+            high = ImageProcessor.high_pass_filter(image, cutoff)
+            low_diff = np.abs(low.astype(np.int32) - full_spectrum_filter(image, cutoff, False)).max()
+            high_diff = np.abs(high.astype(np.int32) - full_spectrum_filter(image, cutoff, True)).max()
+            print(f"形状={shape}, cutoff={cutoff}: 低通差异={low_diff}, 高通差异={high_diff}")
+            assert low.dtype == np.uint16 and high.dtype == np.uint16
+            assert low_diff <= 1 and high_diff <= 1
+
+    # 同尺寸连续调用复用FFT工作区，先前的结果不受后续调用影响
+    image = _make_test_image()
+    first = ImageProcessor.low_pass_filter(image, 0.3)
+    expected = first.copy()
+    ImageProcessor.high_pass_filter(image[::-1].copy(), 0.3)
+    assert np.array_equal(first, expected)
+
+    # 相同参数的滤波器取自缓存且只读
+    from core.image_processor import _gaussian_frequency_mask
+    mask = _gaussian_frequency_mask(256, 200, 0.1, False)
+    assert mask is _gaussian_frequency_mask(256, 200, 0.1, False)
+    assert mask.shape == (256, 101) and not mask.flags.writeable
+
+
+def test_spatial_pass_filters_match_frequency_gaussian():
+    """
+    测试sigma适中时的空间域高斯低通/高通
+
+    与ndimage按等效sigma卷积后拉伸的结果最多相差1个灰度级；
+    远离边界处，等效sigma的空间卷积与频域高斯滤波的差异不超过数据范围的0.1%
+    """
+    print("\n=== 空间域高斯低通/高通测试 ===")
+
+    from scipy import ndimage
+
+    for shape in [(256, 200), (255, 201)]:
+        image = _make_test_image(shape)
+        rows, cols = shape
+        data_float = image.astype(np.float64)
+        for cutoff in [0.05, 0.1]:
+            scale = 2 * np.pi * cutoff * min(rows, cols)
+            sigma = (rows / scale, cols / scale)
+            low_ref = ndimage.gaussian_filter(data_float, sigma, mode='nearest')
+
+            low = ImageProcessor.low_pass_filter(image, cutoff)
+            high = ImageProcessor.high_pass_filter(image, cutoff)
+            low_diff = np.abs(low.astype(np.int32) - ImageProcessor._rescale_to_range(low_ref, image)).max()
+            high_diff = np.abs(high.astype(np.int32)
+                               - ImageProcessor._rescale_to_range(data_float - low_ref, image)).max()
+
+            # 等效sigma与频域滤波器一致（只比较不受边界处理影响的内部区域）
+            y, x = np.ogrid[:rows, :cols]
+            mask = np.exp(-((x - cols // 2) ** 2 + (y - rows // 2) ** 2) / (2 * (cutoff * min(rows, cols)) ** 2))
+            low_fft = np.real(np.fft.ifft2(np.fft.ifftshift(np.fft.fftshift(np.fft.fft2(data_float)) * mask)))
+            margin = int(np.ceil(4 * max(sigma))) + 1
+            inner_diff = np.abs(low_ref - low_fft)[margin:-margin, margin:-margin].max()
+
+            print(f"形状={shape}, cutoff={cutoff}: 低通差异={low_diff}, 高通差异={high_diff}, "
+                  f"内部与频域差异={inner_diff:.2f}")
+            assert low_diff <= 1 and high_diff <= 1
+            assert inner_diff <= 1e-3 * np.ptp(data_float)
+
+
+def test_unsharp_mask_sharpens_without_rescaling(monkeypatch):
+    """
+    测试非锐化掩模为 clip(f + amount*(f - blur), 0, 65535)，与ndimage高斯模糊的参考实现
+    最多相差1个灰度级（核采样与舍入差异），Numba内核与NumPy回退路径一致
+    """
+    print("\n=== 非锐化掩模测试 ===")
+
+    from scipy import ndimage
+    from core import image_processor
+
+    image = _make_test_image()
+    data_float = image.astype(np.float32)
+    for radius, amount in [(1.0, 1.0), (2.0, 0.5), (0.5, 3.0)]:
+        blurred = ndimage.gaussian_filter(data_float, radius, mode='nearest')
+        expected = np.clip(data_float + amount * (data_float - blurred), 0, 65535).astype(np.uint16)
+
+        result = ImageProcessor.unsharp_mask(image, radius, amount)
+        with monkeypatch.context() as m:
+            m.setattr(image_processor, 'sharpen_uint16', None)
+            fallback = ImageProcessor.unsharp_mask(image, radius, amount)
+
+        max_diff = np.abs(result.astype(np.int32) - expected).max()
+        fallback_diff = np.abs(result.astype(np.int32) - fallback).max()
+        print(f"radius={radius}, amount={amount}: 最大差异={max_diff}, 回退差异={fallback_diff}, "
+              f"灰度级数={len(np.unique(result))}")
+        assert result.dtype == np.uint16
+        assert max_diff <= 1 and fallback_diff <= 1
+
+
+def test_histogram_equalization_lut_matches_skimage():
+    """
+    测试整数图像的累计直方图查找表与skimage的equalize_hist一致
+
+    查找表先减去最小灰度的计数使输出从0开始，与skimage的差异不超过该偏移加1个灰度级的截断
+    """
+    print("\n=== 直方图均衡化测试 ===")
+
+    from skimage import exposure
+
+    image = _make_test_image()
+    for data in [image, image[::2, 1::3], (image >> 8).astype(np.uint8)]:
+        result = ImageProcessor.histogram_equalization(data, 'global')
+        expected = exposure.equalize_hist(data) * 65535
+        max_diff = np.abs(result - expected).max()
+        print(f"dtype={data.dtype}, 形状={data.shape}: 范围={result.min()}-{result.max()}, 最大差异={max_diff:.2f}")
+        assert result.dtype == np.uint16
+        assert result.min() == 0 and result.max() == 65535
+        assert max_diff <= 65535 * np.count_nonzero(data == data.min()) / data.size + 1
+
+
+if __name__ == "__main__":
+    test_median_filter_matches_skimage()
+    test_median_filter_row_strips_match_whole_image(pytest.MonkeyPatch())
+    test_morphological_operation_cached_disk()
+    test_gamma_correction_lut_matches_float()
+    test_rescale_to_range_matches_numpy()
+    test_gaussian_filter_uint16_matches_skimage()
+    test_min_max_single_pass()
+    test_frequency_filters_match_full_spectrum()
+    test_spatial_pass_filters_match_frequency_gaussian()
+    test_unsharp_mask_sharpens_without_rescaling(pytest.MonkeyPatch())
+    test_histogram_equalization_lut_matches_skimage()
@@ -0,0 +1,150 @@
+"""
+论文算法测试
+
+验证变分重建的GPU路径与CPU路径一致，以及GPU失败时的回退
+"""
+
+import sys
+import os
+import types
+import numpy as np
+import pytest
+
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from core import paper_enhance
+from core._gpu import HAS_CUPY
+
+
+def _make_test_image(shape=(96, 80)):
+    """生成带纹理和噪声的16位测试图像"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:shape[0], 0:shape[1]]
+    img = 20000 + 8000 * np.sin(x / 17.0) * np.cos(y / 23.0) + rng.normal(0, 600, shape)
+    return np.clip(img, 0, 65535).astype(np.uint16)
+
+
+def _fake_cupy(calls):
+    """用NumPy模拟CuPy的上传/下载接口，记录调用次数"""
+    def asarray(a, dtype=None):
+        calls.append('asarray')
+        return np.asarray(a, dtype=dtype)
+    return types.SimpleNamespace(asarray=asarray, asnumpy=np.asarray)
+
+
+def test_gpu_reconstruct_path_matches_cpu(monkeypatch):
+    """
+    测试GPU重建路径（上传、迭代、下载）与CPU结果一致
+
+    GPU路径把NLM输出的float64梯度场按float32上传，转16位后最多相差1个灰度级
+    """
+    print("=== 变分重建GPU路径测试 ===")
+
+    image = _make_test_image()
+    expected = paper_enhance.enhance_xray_poisson_nlm_strict(image, use_gpu=False)[0]
+
+    calls = []
+    monkeypatch.setattr(paper_enhance, 'cp', _fake_cupy(calls))
+    result = paper_enhance.enhance_xray_poisson_nlm_strict(image, use_gpu=True)[0]
+
+    print(f"上传次数: {len(calls)}")
+    max_diff = np.abs(result.astype(np.int32) - expected).max()
+    print(f"最大差异={max_diff}")
+    assert calls == ['asarray'] * 3
+    assert max_diff <= 1
+
+
+def test_gpu_failure_falls_back_to_cpu(monkeypatch):
+    """测试GPU路径抛出异常时回退到CPU，结果与CPU路径一致"""
+    print("\n=== 变分重建GPU失败回退测试 ===")
+
+    image = _make_test_image()
+    expected = paper_enhance.enhance_xray_poisson_nlm_strict(image, use_gpu=False)[0]
+
+    def failing_asarray(a, dtype=None):
+        raise RuntimeError("模拟显存不足")
+
+    monkeypatch.setattr(paper_enhance, 'cp', types.SimpleNamespace(asarray=failing_asarray))
+    result = paper_enhance.enhance_xray_poisson_nlm_strict(image, use_gpu=True)[0]
+
+    assert np.array_equal(result, expected)
+    print("✅ 回退结果与CPU一致")
+
+
+def _reference_nlm(Gx_prime, Gy_prime, lam_map, search_radius, patch_radius, rho, lam_quant, topk):
+    """逐像素的泊松NLM参考实现（式(7)-(12)，用截断求和的poisson_L2_distance）"""
+    H, W = Gx_prime.shape
+    pr, sr = patch_radius, search_radius
+    Gx = Gx_prime.astype(np.float32)
+    Gy = Gy_prime.astype(np.float32)
+    quant = lambda v: round(float(v) / lam_quant) * lam_quant
+    for y in range(pr, H - pr):
+        for x in range(pr, W - pr):
+            patch_x = lam_map[y-pr:y+pr+1, x-pr:x+pr+1]
+            ds, coords = [], []
+            for yy in range(max(pr, y-sr), min(H-pr, y+sr+1)):
+                for xx in range(max(pr, x-sr), min(W-pr, x+sr+1)):
+                    patch_y = lam_map[yy-pr:yy+pr+1, xx-pr:xx+pr+1]
+                    ds.append(sum(paper_enhance.poisson_L2_distance(quant(a), quant(b))
+                                  for a, b in zip(patch_x.ravel(), patch_y.ravel())))
+                    coords.append((yy, xx))
+            ds = np.array(ds, dtype=np.float32)
+            if topk is not None and len(ds) > topk:
+                idx = np.argpartition(ds, topk)[:topk]
+                ds = ds[idx]
+                coords = [coords[i] for i in idx]
+            ws = np.exp(-ds / (rho * max(float(np.mean(patch_x)), 1e-8))).astype(np.float32)
+            ws /= ws.sum()
+            Gx[y, x] = sum(w * Gx_prime[c] for w, c in zip(ws, coords))
+            Gy[y, x] = sum(w * Gy_prime[c] for w, c in zip(ws, coords))
+    return Gx, Gy
+
+
+def test_vectorized_nlm_matches_reference():
+    """测试按偏移向量化的泊松NLM与逐像素参考实现一致（闭式距离与截断求和差异在1e-6以内）"""
+    print("\n=== 泊松NLM向量化测试 ===")
+
+    rng = np.random.default_rng(2)
+    y, x = np.mgrid[0:24, 0:20]
+    R_unit = (0.5 + 0.3 * np.sin(x / 5) * np.cos(y / 7) + rng.normal(0, 0.05, (24, 20))).astype(np.float32)
+    Gx_p, Gy_p = paper_enhance.adaptive_gradient_enhance_unit(R_unit)
+
+    # 与实现相同的λ映射
+    Gmag = np.sqrt(Gx_p * Gx_p + Gy_p * Gy_p)
+    counts = np.clip(Gmag * (30.0 / (float(np.mean(Gmag)) + 1e-12)), 0.0, None).astype(np.float32)
+    lam_map = paper_enhance.estimate_lambda_map(counts, ksize=3)
+
+    for sr, pr, topk in [(1, 1, 5), (2, 1, None), (2, 2, 7)]:
+        result = paper_enhance.poisson_nlm_on_gradient_exact(
+            Gx_p, Gy_p, search_radius=sr, patch_radius=pr, count_target_mean=30.0, topk=topk)
+        expected = _reference_nlm(Gx_p, Gy_p, lam_map, sr, pr, 1.5, 0.02, topk)
+        max_diff = max(np.abs(r - e).max() for r, e in zip(result, expected))
+        print(f"search_radius={sr}, patch_radius={pr}, topk={topk}: 最大差异={max_diff:.2e}")
+        assert max_diff < 1e-5
+
+
+@pytest.mark.skipif(not HAS_CUPY, reason="没有可用的CuPy设备")
+def test_cupy_reconstruct_matches_cpu():
+    """测试CuPy变分重建与CPU结果在float32舍入范围内一致"""
+    print("\n=== CuPy与CPU一致性测试 ===")
+
+    import cupy as cp
+
+    rng = np.random.default_rng(1)
+    R_unit = rng.random((256, 256), dtype=np.float32)
+    Gx, Gy = paper_enhance.grad2d(R_unit)
+
+    expected = paper_enhance.variational_reconstruct_unit(R_unit, Gx, Gy)
+    result = cp.asnumpy(paper_enhance.variational_reconstruct_unit(
+        cp.asarray(R_unit), cp.asarray(Gx), cp.asarray(Gy)))
+
+    max_diff = np.abs(result - expected).max()
+    print(f"最大差异={max_diff:.2e}")
+    assert max_diff < 1e-4
+
+
+if __name__ == "__main__":
+    test_vectorized_nlm_matches_reference()
+    if HAS_CUPY:
+        test_cupy_reconstruct_matches_cpu()
@@ -175,6 +175,102 @@ def test_cache_optimization():
     print(f"内存节省: {memory_saved:.2f}MB")
 
 
+def test_lazy_level_generation():
+    """测试级别按需生成：set_image只放入级别0，访问时逐级生成且与逐级下采样结果一致"""
+    print("\n=== 按需生成级别测试 ===")
+    
+    import cv2
+    
+    test_image = np.random.randint(0, 255, (1024, 768), dtype=np.uint8)
+    pyramid = ImagePyramid(max_levels=6)
+    pyramid.set_image(test_image)
+    
+    print(f"set_image后级别: {list(pyramid.pyramid_levels.keys())}, 最深级别: {pyramid.deepest_level}")
+    assert list(pyramid.pyramid_levels.keys()) == [0]
+    assert pyramid.deepest_level == 3  # 768 -> 384 -> 192 -> 96，再减半低于64
+    
+    level = pyramid.get_optimal_level(0.25)
+    print(f"访问0.25后级别: {list(pyramid.pyramid_levels.keys())}")
+    assert level.level == 2
+    assert list(pyramid.pyramid_levels.keys()) == [0, 1, 2]
+    
+    expected = test_image
+    for i in range(1, 3):
+        expected = cv2.pyrDown(expected, dstsize=(expected.shape[1] // 2, expected.shape[0] // 2))
+        assert np.array_equal(pyramid.pyramid_levels[i].image_data, expected)
+    
+    # 超过最深级别时取最深级别
+    assert pyramid.get_optimal_level(0.01).level == 3
+    stats = pyramid.get_cache_stats()
+    print(f"命中: {stats['cache_hits']}, 未命中: {stats['cache_misses']}")
+    assert stats['cache_misses'] == 2
+    assert pyramid.get_optimal_level(0.25).level == 2
+    assert pyramid.get_cache_stats()['cache_hits'] == 1
+
+
+def test_lru_eviction():
+    """测试optimize_cache按LRU顺序淘汰，保留级别0，淘汰后可重新生成"""
+    print("\n=== LRU淘汰测试 ===")
+    
+    test_image = np.random.randint(0, 255, (1024, 1024), dtype=np.uint8)
+    pyramid = ImagePyramid(max_levels=6)
+    pyramid.set_image(test_image)
+    
+    pyramid.get_optimal_level(1 / 16)   # 生成级别1-4
+    pyramid.get_optimal_level(0.5)      # 级别1变为最近使用
+    print(f"LRU顺序: {list(pyramid.pyramid_levels.keys())}")
+    assert list(pyramid.pyramid_levels.keys()) == [0, 2, 3, 4, 1]
+    
+    pyramid.optimize_cache()
+    print(f"淘汰后: {list(pyramid.pyramid_levels.keys())}")
+    assert list(pyramid.pyramid_levels.keys()) == [0, 1]  # 5级保留一半（至少2级）
+    expected_bytes = sum(level.image_data.nbytes for key, level in pyramid.pyramid_levels.items() if key)
+    assert pyramid.total_memory_usage == expected_bytes
+    
+    assert pyramid.get_optimal_level(0.25).level == 2
+    assert list(pyramid.pyramid_levels.keys()) == [0, 1, 2]
+
+
+def test_downsample_odd_size():
+    """测试奇数尺寸减半时按向下取整的尺寸输出，非减半尺寸回退到INTER_AREA"""
+    print("\n=== 奇数尺寸下采样测试 ===")
+    
+    import cv2
+    
+    pyramid = ImagePyramid()
+    for dtype in [np.uint8, np.uint16]:
+        image = np.random.randint(0, 255, (301, 257)).astype(dtype)
+        half = pyramid._downsample_image(image, (128, 150))
+        print(f"{np.dtype(dtype).name}: {image.shape} -> {half.shape}")
+        assert half.shape == (150, 128)
+        assert half.dtype == dtype
+        
+        third = pyramid._downsample_image(image, (85, 100))
+        assert np.array_equal(third, cv2.resize(image, (85, 100), interpolation=cv2.INTER_AREA))
+
+
+def test_levels_share_and_protect_data():
+    """测试级别0与原图共享数据且所有级别只读，调用方数组仍可写"""
+    print("\n=== 级别数据共享测试 ===")
+    
+    test_image = np.random.randint(0, 255, (512, 512), dtype=np.uint8)
+    pyramid = ImagePyramid()
+    pyramid.set_image(test_image)
+    pyramid.get_optimal_level(0.25)
+    
+    level_0 = pyramid.pyramid_levels[0].image_data
+    print(f"级别0共享内存: {np.shares_memory(level_0, test_image)}")
+    assert np.shares_memory(level_0, test_image)
+    assert level_0 is pyramid.original_image
+    assert test_image.flags.writeable
+    for level in pyramid.pyramid_levels.values():
+        assert not level.image_data.flags.writeable
+    
+    # 非连续输入只拷贝一次，得到C连续数据
+    pyramid.set_image(test_image[:, ::2])
+    assert pyramid.original_image.flags.c_contiguous
+
+
 def benchmark_downsample_methods():
     """基准测试下采样方法"""
     print("\n=== 下采样方法基准测试 ===")
@@ -185,6 +281,13 @@ def benchmark_downsample_methods():
     # 测试不同的下采样方法
     import cv2
     
+    times = []
+    for _ in range(5):
+        start_time = time.time()
+        result = cv2.pyrDown(test_image)
+        times.append(time.time() - start_time)
+    print(f"  pyrDown: {np.mean(times) * 1000:.3f}ms")
+    
     methods = [
         ('INTER_AREA', cv2.INTER_AREA),
         ('INTER_LINEAR', cv2.INTER_LINEAR),
@@ -242,6 +345,10 @@ if __name__ == '__main__':
         test_performance_core()
         test_memory_efficiency()
         test_cache_optimization()
+        test_lazy_level_generation()
+        test_lru_eviction()
+        test_downsample_odd_size()
+        test_levels_share_and_protect_data()
         benchmark_downsample_methods()
         test_global_pyramid_management()
         
@@ -241,6 +241,63 @@ class WindowLevelPerformanceTest(unittest.TestCase):
             except Exception as e:
                 print(f"边界情况 窗宽{ww}, 窗位{wl} 出错: {e}")
 
+    def test_invert_folded_into_lut(self):
+        """测试反相查找表与先加窗再反相的结果一致，且查找表只读"""
+        print("\n=== 反相查找表测试 ===")
+        
+        image_data = self.test_images[(512, 512)]
+        lut = WindowLevelLUT()
+        
+        for ww, wl in self.test_window_settings + [(0, 40)]:
+            expected = 255 - lut.apply_lut(image_data, ww, wl)
+            result = lut.apply_lut(image_data, ww, wl, invert=True)
+            np.testing.assert_array_equal(result, expected)
+        
+        self.assertIsNot(lut.get_lut(400, 40), lut.get_lut(400, 40, invert=True))
+        self.assertFalse(lut.get_lut(400, 40, invert=True).flags.writeable)
+        print("✅ 反相查找表结果一致")
+
+
+    def test_numba_lut_matches_numpy(self):
+        """测试Numba查表与NumPy索引结果一致（包括非连续输入）"""
+        print("\n=== Numba查表一致性测试 ===")
+        
+        from unittest import mock
+        from core import window_level_lut
+        
+        image_data = self.test_images[(512, 512)]
+        lut = WindowLevelLUT()
+        variants = [image_data, image_data[::2, 1::3], np.asfortranarray(image_data)]
+        
+        for ww, wl in self.test_window_settings:
+            results = [lut.apply_lut(data, ww, wl) for data in variants]
+            with mock.patch.object(window_level_lut, 'apply_lut_u16', None):
+                expected = [lut.apply_lut(data, ww, wl) for data in variants]
+            for result, exp in zip(results, expected):
+                np.testing.assert_array_equal(result, exp)
+        print("✅ Numba查表结果一致")
+    
+    def test_dtype_paths_match_uint16_lut(self):
+        """测试8位图像的OpenCV查表和浮点图像的线性映射与16位查表一致（浮点最多差1级）"""
+        print("\n=== 按类型分派一致性测试 ===")
+        
+        lut = WindowLevelLUT()
+        image_u8 = (self.test_images[(512, 512)] >> 8).astype(np.uint8)
+        image_float = self.test_images[(512, 512)].astype(np.float32)
+        
+        for ww, wl in self.test_window_settings:
+            for invert in (False, True):
+                expected = lut.apply_lut(image_u8.astype(np.uint16), ww, wl, invert)
+                np.testing.assert_array_equal(lut.apply_lut(image_u8, ww, wl, invert), expected)
+                
+                expected = lut.apply_lut(image_float.astype(np.uint16), ww, wl, invert).astype(np.int16)
+                for data in (image_float, image_float.astype(np.float64)):
+                    result = lut.apply_lut(data, ww, wl, invert)
+                    self.assertEqual(result.dtype, np.uint8)
+                    self.assertLessEqual(np.abs(result.astype(np.int16) - expected).max(), 1)
+        print("✅ 各类型结果一致")
+
+
 
 def run_performance_benchmark():
     """运行性能基准测试"""